@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .job_store import get_job_store
+from .utils import normalize_question
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", 0.05))  # cosine distance to count as the same question
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))  # seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))  # per collection
+
+
+class AnswerCache:
+    """In-process semantic cache of chat answers, one LRU per collection.
+
+    A question is answered from the cache when its embedding is within
+    max_distance (cosine) of a previously answered question in the same
+    collection. Entries expire after ttl seconds, the least recently used ones
+    are evicted beyond max_entries, and a collection is dropped entirely when
+    it is re-ingested. Ingests may run in other processes (queue workers):
+    `updated_at(collection)` returns when the collection last changed, and
+    answers older than that are dropped on lookup.
+    """
+
+    def __init__(self, max_distance: float = ANSWER_CACHE_MAX_DISTANCE, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 updated_at: Optional[Callable[[str], Optional[float]]] = None):
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.updated_at = updated_at
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        self._collections: Dict[str, "OrderedDict[str, Dict[str, Any]]"] = {}
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def lookup(self, collection: str, question: str, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the cached {"answer", "sources", "question"} closest to the question, or None."""
+        now = time.time()
+        changed_at = None
+        if self.updated_at is not None:
+            try:
+                changed_at = self.updated_at(collection)
+            except Exception as e:
+                print(f"Warning: could not check when '{collection}' was last updated: {e}")
+        with self._lock:
+            entries = self._collections.get(collection)
+            if entries:
+                for key in [k for k, e in entries.items() if now - e["created_at"] > self.ttl]:
+                    del entries[key]
+                    self.evictions += 1
+                if changed_at is not None:
+                    stale = [k for k, e in entries.items() if e["created_at"] < changed_at]
+                    for key in stale:
+                        del entries[key]
+                    if stale:
+                        self.invalidations += 1
+            if not entries:
+                self.misses += 1
+                return None
+
+            key = normalize_question(question)
+            if key not in entries:
+                keys = list(entries)
+                matrix = np.stack([entries[k]["vector"] for k in keys])
+                similarities = matrix @ self._unit(embedding)
+                best = int(np.argmax(similarities))
+                if 1.0 - float(similarities[best]) > self.max_distance:
+                    self.misses += 1
+                    return None
+                key = keys[best]
+
+            entries.move_to_end(key)
+            self.hits += 1
+            entry = entries[key]
+            return {"answer": entry["answer"], "sources": entry["sources"], "question": entry["question"]}
+
+    def store(self, collection: str, question: str, embedding: List[float], answer: str,
+              sources: Optional[List[str]] = None) -> None:
+        if not answer:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            entries = self._collections.setdefault(collection, OrderedDict())
+            entries[key] = {
+                "question": question,
+                "vector": self._unit(embedding),
+                "answer": answer,
+                "sources": sources or [],
+                "created_at": time.time(),
+            }
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, collection: str) -> None:
+        """Forget every answer of a collection (its content changed)."""
+        with self._lock:
+            if self._collections.pop(collection, None):
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = sum(len(e) for e in self._collections.values())
+            collections = len(self._collections)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "collections": collections,
+            "max_entries_per_collection": self.max_entries,
+            "max_distance": self.max_distance,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_cache = None
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Process-wide answer cache, or None if disabled."""
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = AnswerCache(updated_at=lambda collection: get_job_store().collection_updated_at(collection))
+    return _cache
+
+
+def invalidate_answers(collection: str) -> None:
+    """Drop the collection's answers here, and in other processes through the shared job store."""
+    cache = get_answer_cache()
+    if cache is None:
+        return
+    try:
+        get_job_store().mark_collection_updated(collection)
+    except Exception as e:
+        print(f"Warning: could not record the update of '{collection}': {e}")
+    cache.invalidate(collection)
@@ -0,0 +1,144 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional
+
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", 4))  # tabs open at the same time
+BROWSER_RECYCLE_AFTER = int(os.getenv("BROWSER_RECYCLE_AFTER", 200))  # navigations before Chromium is relaunched
+
+
+class _Browser:
+    """One Chromium process with its reusable contexts."""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.contexts: List[Any] = []  # idle contexts ready for a new page
+        self.active = 0
+        self.navigations = 0
+        self.retired = False
+
+    async def close(self) -> None:
+        try:
+            await self.browser.close()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """Long-lived headless Chromium shared by all Playwright fetches.
+
+    The browser is launched on first use, pages are opened in reusable
+    browser contexts and at most max_pages are open at once. After
+    recycle_after navigations (in any of its tabs) the browser is retired: new pages go to a fresh
+    process and the old one is closed once its last page is released, which
+    keeps Chromium memory leaks from piling up in long-running workers.
+    """
+
+    def __init__(self, max_pages: int = BROWSER_MAX_PAGES, recycle_after: int = BROWSER_RECYCLE_AFTER):
+        self.max_pages = max(1, max_pages)
+        self.recycle_after = recycle_after
+        self.launches = 0
+        self._semaphore = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._current: Optional[_Browser] = None
+
+    async def _launch(self) -> _Browser:
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch()
+        self.launches += 1
+        print(f"🌐 Launched pooled Chromium (#{self.launches})")
+        return _Browser(browser)
+
+    async def _acquire(self):
+        async with self._lock:
+            current = self._current
+            if current is not None and self.recycle_after and current.navigations >= self.recycle_after:
+                current.retired = True
+                if not current.active:
+                    await current.close()
+                current = self._current = None
+            if current is None:
+                current = self._current = await self._launch()
+            current.active += 1
+            context = current.contexts.pop() if current.contexts else None
+        if context is None:
+            try:
+                context = await current.browser.new_context()
+            except Exception:
+                await self._release(current, None)
+                raise
+        return current, context
+
+    @staticmethod
+    def _navigated(holder: _Browser, frame) -> None:
+        if frame.parent_frame is None:  # top-level document, not an iframe
+            holder.navigations += 1
+
+    async def _release(self, holder: _Browser, context) -> None:
+        async with self._lock:
+            holder.active -= 1
+            if context is not None and not holder.retired:
+                holder.contexts.append(context)
+            if holder.retired and not holder.active:
+                await holder.close()
+
+    @asynccontextmanager
+    async def page(self):
+        """Open a tab in a pooled context; waits while max_pages tabs are in use."""
+        async with self._semaphore:
+            holder, context = await self._acquire()
+            page = None
+            try:
+                page = await context.new_page()
+                # Tabs of the runtime crawl stay open for many pages: count navigations, not leases
+                page.on("framenavigated", lambda frame: self._navigated(holder, frame))
+                yield page
+            finally:
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        try:
+                            await context.close()  # unusable, do not hand it out again
+                        except Exception:
+                            pass
+                        context = None
+                await self._release(holder, context)
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._current is not None:
+                await self._current.close()
+                self._current = None
+            if self._playwright is not None:
+                try:
+                    await self._playwright.stop()
+                except Exception:
+                    pass
+                self._playwright = None
+
+
+_pool = None
+_pool_loop = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Shared browser pool, bound to the running event loop (Chromium starts lazily)."""
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop:
+        _pool = BrowserPool()
+        _pool_loop = loop
+    return _pool
+
+
+async def close_browser_pool() -> None:
+    global _pool, _pool_loop
+    if _pool is not None:
+        await _pool.close()
+    _pool = None
+    _pool_loop = None
@@ -0,0 +1,220 @@
+import heapq
+import itertools
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from .utils import estimate_tokens
+
+INGEST_MAX_CHUNKS = int(os.getenv("INGEST_MAX_CHUNKS", 100))  # default chunk budget of a crawl job (0 = unlimited)
+INGEST_MAX_TOKENS = int(os.getenv("INGEST_MAX_TOKENS", 0))  # default embedding token budget of a job (0 = unlimited)
+INGEST_MAX_COST = float(os.getenv("INGEST_MAX_COST", 0))  # default embedding budget of a job in USD (0 = unlimited)
+EMBED_COST_PER_MILLION_TOKENS = float(os.getenv("EMBED_COST_PER_MILLION_TOKENS", 0.02))  # USD, used for cost budgets
+BUDGET_EAGER_SHARE = float(os.getenv("BUDGET_EAGER_SHARE", 0.5))  # share of a page's fair budget embedded right away
+BUDGET_DEPTH_DECAY = float(os.getenv("BUDGET_DEPTH_DECAY", 0.15))  # score penalty per level of crawl depth
+BUDGET_RESERVE_SIZE = int(os.getenv("BUDGET_RESERVE_SIZE", 2000))  # best held-back chunks kept for the final pass
+
+Chunk = Dict[str, Any]
+
+
+def _terms(text: str) -> set:
+    return {t for t in re.findall(r"\w+", text.lower()) if len(t) > 2}
+
+
+def url_depth(url: str) -> int:
+    """Path depth, the fallback for crawl depth when the page was not reached by following links."""
+    return len([s for s in urlparse(url).path.split("/") if s])
+
+
+class Budget:
+    """Per-job embedding budget in chunks and/or tokens (None = unlimited).
+
+    A cost budget is converted to tokens with EMBED_COST_PER_MILLION_TOKENS.
+    """
+
+    def __init__(self, max_chunks: Optional[int] = None, max_tokens: Optional[int] = None):
+        self.max_chunks = max_chunks or None
+        self.max_tokens = max_tokens or None
+
+    @classmethod
+    def from_limits(cls, max_chunks: Optional[int] = None, max_tokens: Optional[int] = None,
+                    max_cost: Optional[float] = None) -> "Budget":
+        if max_cost:
+            cost_tokens = round(max_cost / EMBED_COST_PER_MILLION_TOKENS * 1_000_000)
+            max_tokens = min(max_tokens, cost_tokens) if max_tokens else cost_tokens
+        return cls(max_chunks, max_tokens)
+
+    @classmethod
+    def default(cls) -> "Budget":
+        return cls.from_limits(INGEST_MAX_CHUNKS, INGEST_MAX_TOKENS, INGEST_MAX_COST)
+
+    def to_dict(self) -> Dict[str, Optional[int]]:
+        """JSON form for queued jobs; Budget(**d) restores it."""
+        return {"max_chunks": self.max_chunks, "max_tokens": self.max_tokens}
+
+    @property
+    def limited(self) -> bool:
+        return self.max_chunks is not None or self.max_tokens is not None
+
+    def describe(self) -> str:
+        parts = []
+        if self.max_chunks:
+            parts.append(f"{self.max_chunks} chunks")
+        if self.max_tokens:
+            parts.append(f"{self.max_tokens} tokens (~${self.max_tokens * EMBED_COST_PER_MILLION_TOKENS / 1e6:.4f})")
+        return ", ".join(parts) or "unlimited"
+
+
+class ChunkScheduler:
+    """Spends a job's embedding budget on the chunks that add the most retrieval value.
+
+    Chunks are scored by information density (distinct terms), novelty (share
+    of terms not yet indexed in this job) and crawl depth (pages close to the
+    start URL rank higher). The budget is divided over the pages as they
+    stream in: each page embeds its best chunks right away, up to
+    eager_share of its fair share, and holds the rest back in a bounded
+    reserve. Once the crawl is over, `drain` spends what is left on the best
+    held-back chunks across the whole site, so long pages get more than short
+    ones and repeated content loses to new information. Without a limit every
+    chunk is admitted as it comes.
+    """
+
+    def __init__(self, budget: Optional[Budget] = None, eager_share: float = BUDGET_EAGER_SHARE,
+                 depth_decay: float = BUDGET_DEPTH_DECAY, reserve_size: int = BUDGET_RESERVE_SIZE):
+        self.budget = budget or Budget()
+        self.eager_share = min(1.0, max(0.0, eager_share))
+        self.depth_decay = depth_decay
+        self.reserve_size = max(1, reserve_size)
+        self.spent_chunks = 0
+        self.spent_tokens = 0
+        self.held_back = 0
+        self._seen_terms: set = set()
+        self._reserve: List[Tuple[float, int, str, Chunk, int, float]] = []  # (-score, seq, url, chunk, tokens, depth factor)
+        self._left_out: Dict[str, int] = {}  # page -> chunks held back and not admitted (yet)
+        self._seq = itertools.count()
+
+    # -- budget -----------------------------------------------------------
+
+    def exhausted(self) -> bool:
+        b = self.budget
+        return ((b.max_chunks is not None and self.spent_chunks >= b.max_chunks)
+                or (b.max_tokens is not None and self.spent_tokens >= b.max_tokens))
+
+    def _fits(self, tokens: int, chunks_left: Optional[float] = None, tokens_left: Optional[float] = None) -> bool:
+        b = self.budget
+        if b.max_chunks is not None and self.spent_chunks + 1 > b.max_chunks:
+            return False
+        if b.max_tokens is not None and self.spent_tokens + tokens > b.max_tokens:
+            return False
+        if chunks_left is not None and chunks_left < 1:
+            return False
+        return tokens_left is None or tokens <= tokens_left
+
+    def _spend(self, chunk: Chunk, tokens: int) -> None:
+        self.spent_chunks += 1
+        self.spent_tokens += tokens
+        self._seen_terms |= _terms(chunk["text"])
+
+    # -- scoring ----------------------------------------------------------
+
+    def score(self, chunk: Chunk, tokens: int, depth_factor: float) -> float:
+        """Value per unit of budget: new distinct terms count fully, already indexed ones a quarter."""
+        terms = _terms(chunk["text"])
+        new = len(terms - self._seen_terms)
+        value = (new + 0.25 * (len(terms) - new)) * depth_factor
+        # A token budget pays per token, a chunk budget per chunk
+        return value / tokens if self.budget.max_tokens is not None else value
+
+    def _depth_factor(self, depth: int) -> float:
+        return 1.0 / (1.0 + self.depth_decay * max(0, depth))
+
+    # -- selection --------------------------------------------------------
+
+    def select(self, page_url: str, chunks: List[Chunk], depth: int, expected_pages: int,
+               accept: Callable[[Chunk], bool]) -> List[Chunk]:
+        """Admit the page's best chunks within its eager share, hold the rest back.
+
+        `expected_pages` counts this page and those still to come; `accept` is
+        called on each chunk before it is admitted (False = skip it, e.g. a
+        duplicate). Admitted chunks keep their page order.
+        """
+        if not self.budget.limited:
+            return [c for c in chunks if accept(c)]
+        if self.exhausted():
+            if chunks:
+                self._left_out[page_url] = self._left_out.get(page_url, 0) + len(chunks)
+            return []
+
+        b = self.budget
+        expected = max(1, expected_pages)
+        chunks_left = tokens_left = None
+        if b.max_chunks is not None:
+            chunks_left = max(1.0, (b.max_chunks - self.spent_chunks) / expected * self.eager_share)
+        if b.max_tokens is not None:
+            tokens_left = (b.max_tokens - self.spent_tokens) / expected * self.eager_share
+
+        depth_factor = self._depth_factor(depth)
+        sized = [(i, c, estimate_tokens(c["text"])) for i, c in enumerate(chunks)]
+        ranked = sorted(sized, key=lambda s: -self.score(s[1], s[2], depth_factor))
+        admitted = []
+        for i, chunk, tokens in ranked:
+            if self._fits(tokens, chunks_left, tokens_left):
+                if not accept(chunk):
+                    continue
+                self._spend(chunk, tokens)
+                admitted.append((i, chunk))
+                if chunks_left is not None:
+                    chunks_left -= 1
+                if tokens_left is not None:
+                    tokens_left -= tokens
+            else:
+                self._hold(page_url, chunk, tokens, depth_factor)
+        return [chunk for _, chunk in sorted(admitted, key=lambda a: a[0])]
+
+    def _hold(self, page_url: str, chunk: Chunk, tokens: int, depth_factor: float) -> None:
+        self._left_out[page_url] = self._left_out.get(page_url, 0) + 1
+        score = self.score(chunk, tokens, depth_factor)
+        heapq.heappush(self._reserve, (-score, next(self._seq), page_url, chunk, tokens, depth_factor))
+        if len(self._reserve) > 2 * self.reserve_size:
+            self.held_back += len(self._reserve) - self.reserve_size
+            self._reserve = heapq.nsmallest(self.reserve_size, self._reserve)  # keeps the best scores
+            heapq.heapify(self._reserve)
+
+    def drain(self, accept: Callable[[Chunk], bool]) -> List[Tuple[str, Chunk]]:
+        """Spend the rest of the budget on the best held-back chunks, as (page_url, chunk) pairs.
+
+        Scores only go down as terms get indexed, so a popped chunk is
+        re-scored and admitted if it still beats the next best one (lazy greedy).
+        """
+        admitted = []
+        while self._reserve and not self.exhausted():
+            neg_score, seq, page_url, chunk, tokens, depth_factor = heapq.heappop(self._reserve)
+            score = self.score(chunk, tokens, depth_factor)
+            if self._reserve and score < -self._reserve[0][0]:
+                heapq.heappush(self._reserve, (-score, seq, page_url, chunk, tokens, depth_factor))
+                continue
+            if not self._fits(tokens):
+                self.held_back += 1
+                continue
+            self._left_out[page_url] -= 1  # admitted, or dropped as a duplicate: not missing
+            if not accept(chunk):
+                continue
+            self._spend(chunk, tokens)
+            admitted.append((page_url, chunk))
+        self.held_back += len(self._reserve)
+        self._reserve = []
+        return admitted
+
+    def incomplete_pages(self) -> Set[str]:
+        """Pages some chunks of which were left out for lack of budget."""
+        return {url for url, count in self._left_out.items() if count > 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "budget": self.budget.describe(),
+            "budget_chunks_used": self.spent_chunks,
+            "budget_tokens_used": self.spent_tokens,
+            "estimated_embedding_cost": round(self.spent_tokens * EMBED_COST_PER_MILLION_TOKENS / 1e6, 6),
+            "chunks_over_budget": self.held_back,
+        }
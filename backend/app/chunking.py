@@ -0,0 +1,90 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+from .utils import CHARS_PER_TOKEN, Block, estimate_tokens
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 300))  # token budget per chunk
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", 60))  # smaller sections are merged with the next one
+
+# Sentence end followed by whitespace and an upper-case letter, digit or opening quote/bracket
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s+(?=[A-ZА-ЯЁ0-9"«(\[])')
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_END.split(text) if s]
+
+
+def _split_words(text: str, max_tokens: int) -> List[str]:
+    """Last resort for a single sentence over budget: cut between words."""
+    pieces, current = [], []
+    for word in text.split():
+        if current and estimate_tokens(" ".join(current + [word])) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _pieces(paragraph: str, max_tokens: int) -> List[str]:
+    """A paragraph as is, or its sentences (then words) when it is over budget."""
+    if estimate_tokens(paragraph) <= max_tokens:
+        return [paragraph]
+    pieces = []
+    for sentence in split_sentences(paragraph):
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+        else:
+            pieces.extend(_split_words(sentence, max_tokens))
+    return pieces
+
+
+def truncate_blocks(blocks: Iterable[Block], max_words: int) -> List[Block]:
+    """Keep blocks up to max_words words in total (the last one is cut)."""
+    kept, words = [], 0
+    for section, paragraph in blocks:
+        n = len(paragraph.split())
+        if words + n > max_words:
+            rest = max_words - words
+            if rest > 0:
+                kept.append((section, " ".join(paragraph.split()[:rest])))
+            break
+        kept.append((section, paragraph))
+        words += n
+    return kept
+
+
+def chunk_blocks(blocks: Iterable[Block], max_tokens: int = CHUNK_MAX_TOKENS,
+                 min_tokens: int = CHUNK_MIN_TOKENS) -> List[Dict[str, str]]:
+    """Pack paragraphs into chunks of at most max_tokens, without overlap.
+
+    Chunks follow the page structure: a new section (heading) starts a new
+    chunk unless the current one is still below min_tokens, paragraphs are only
+    split when they do not fit on their own, and then at sentence boundaries.
+    Each chunk is {"text", "section"}, where section is the heading the chunk
+    starts under ("" before the first heading).
+    """
+    chunks: List[Dict[str, str]] = []
+    current: List[str] = []
+    current_chars = 0  # length of " ".join(current)
+    section: Optional[str] = None
+
+    def emit():
+        if current:
+            chunks.append({"text": " ".join(current), "section": section or ""})
+
+    for block_section, paragraph in blocks:
+        for piece in _pieces(paragraph, max_tokens):
+            new_section = block_section != section and current_chars // CHARS_PER_TOKEN >= min_tokens
+            too_long = (current_chars + 1 + len(piece)) // CHARS_PER_TOKEN > max_tokens
+            if current and (new_section or too_long):
+                emit()
+                current, current_chars = [], 0
+            if not current:
+                section = block_section
+            current_chars += len(piece) + (1 if current else 0)
+            current.append(piece)
+    emit()
+    return chunks
@@ -0,0 +1,101 @@
+import os
+from typing import Any, Dict, List
+
+from .utils import CHARS_PER_TOKEN, estimate_tokens
+
+RAG_CONTEXT_MAX_TOKENS = int(os.getenv("RAG_CONTEXT_MAX_TOKENS", 2000))  # token budget of the context in the prompt
+RAG_CONTEXT_MIN_TOKENS = 50  # a passage cut shorter than this to fit the budget is left out instead
+MAX_OVERLAP_WORDS = 100  # longest chunk overlap looked for when merging neighbours
+
+Snippet = Dict[str, Any]
+
+
+def _rank_score(snippet: Snippet) -> float:
+    score = snippet.get("rerank_score")
+    if score is None:
+        score = snippet.get("score")
+    return score or 0.0
+
+
+def _overlap(left: List[str], right: List[str]) -> int:
+    """Number of words at the start of `right` that repeat the end of `left`."""
+    for n in range(min(len(left), len(right), MAX_OVERLAP_WORDS), 0, -1):
+        if left[-n:] == right[:n]:
+            return n
+    return 0
+
+
+def _merge(words: List[str], text: str) -> List[str]:
+    new = text.split()
+    if " ".join(new) in " ".join(words):
+        return words  # already contained
+    return words + new[_overlap(words, new):]
+
+
+def merge_passages(snippets: List[Snippet]) -> List[Snippet]:
+    """Group hits by page and merge neighbouring chunks into contiguous passages.
+
+    Chunks of the same URL whose position (place in the page) follow each
+    other are joined, with the words they share (overlap of older chunkers)
+    kept once, and repeated texts are dropped. A passage keeps the best score
+    of its chunks and their "positions". Chunks indexed before positions were
+    stored are not merged.
+    """
+    seen = set()
+    by_url: Dict[Any, List[Snippet]] = {}
+    loose = []
+    for snippet in snippets:
+        key = " ".join((snippet.get("text") or "").lower().split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if snippet.get("position") is None:
+            loose.append({**snippet, "positions": []})
+        else:
+            by_url.setdefault(snippet.get("url"), []).append(snippet)
+
+    passages = []
+    for url, hits in by_url.items():
+        hits.sort(key=lambda s: s["position"])
+        run = None
+        for hit in hits:
+            if run is not None and hit["position"] == run["positions"][-1] + 1:
+                run["words"] = _merge(run["words"], hit["text"])
+                run["positions"].append(hit["position"])
+                run["score"] = max(run["score"], _rank_score(hit))
+                continue
+            if run is not None:
+                passages.append(run)
+            run = {"url": url, "section": hit.get("section", ""), "positions": [hit["position"]],
+                   "words": hit["text"].split(), "score": _rank_score(hit)}
+        passages.append(run)
+
+    merged = [{"url": p["url"], "section": p["section"], "positions": p["positions"], "text": " ".join(p["words"]),
+               "score": p["score"]} for p in passages]
+    merged += [{**s, "score": _rank_score(s)} for s in loose]
+    return merged
+
+
+def build_context(snippets: List[Snippet], max_tokens: int = RAG_CONTEXT_MAX_TOKENS) -> List[Snippet]:
+    """Merged passages in score order, within max_tokens (0 = no limit).
+
+    A passage over the remaining budget is cut at a word boundary, or left
+    out when less than RAG_CONTEXT_MIN_TOKENS would remain; smaller passages
+    further down can still fill the rest.
+    """
+    passages = sorted(merge_passages(snippets), key=lambda p: -p["score"])
+    if max_tokens <= 0:
+        return passages
+
+    context, left = [], max_tokens
+    for passage in passages:
+        tokens = estimate_tokens(passage["text"])
+        if tokens > left:
+            text = passage["text"][:left * CHARS_PER_TOKEN].rsplit(" ", 1)[0]
+            if estimate_tokens(text) < RAG_CONTEXT_MIN_TOKENS:
+                continue
+            passage = {**passage, "text": text, "truncated": True}
+            tokens = estimate_tokens(text)
+        context.append(passage)
+        left -= tokens
+    return context
@@ -0,0 +1,107 @@
+import hashlib
+import os
+import re
+from typing import Dict, List, Set
+
+import numpy as np
+
+from .utils import Block
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", 0.8))  # estimated Jaccard similarity for a near-duplicate
+DEDUP_BOILERPLATE_MIN_PAGES = int(os.getenv("DEDUP_BOILERPLATE_MIN_PAGES", 2))  # pages a block must appear on to be stripped
+DEDUP_MIN_WORDS = 8  # shorter chunks are only compared exactly
+
+# MinHash: 64 hash permutations, LSH with 8 bands of 8 rows (candidate pairs from ~0.75 Jaccard up)
+_PERMUTATIONS = 64
+_BANDS = 8
+_ROWS = _PERMUTATIONS // _BANDS
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240501)
+_A = _rng.integers(1, _PRIME, size=_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, size=_PERMUTATIONS, dtype=np.uint64)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def minhash(text: str, shingle: int = 3) -> np.ndarray:
+    """MinHash signature over word shingles; the share of equal values estimates Jaccard similarity."""
+    words = _normalize(text).split()
+    shingles = {" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1))}
+    values = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big") % _PRIME
+         for s in shingles],
+        dtype=np.uint64,
+    )
+    return ((np.outer(values, _A) + _B) % _PRIME).min(axis=0)
+
+
+class Deduplicator:
+    """Crawl-wide filter that keeps repeated content out of the index.
+
+    - Paragraph blocks that already appeared on other pages of the crawl
+      (navigation, footers, cookie banners) are stripped before chunking.
+    - Chunks whose normalized text was already seen are dropped.
+    - Chunks whose estimated Jaccard similarity (MinHash over word shingles)
+      with an earlier chunk reaches threshold are dropped as near-duplicates;
+      candidates are found through locality-sensitive hashing of the bands.
+    """
+
+    def __init__(self, threshold: float = DEDUP_NEAR_THRESHOLD,
+                 boilerplate_min_pages: int = DEDUP_BOILERPLATE_MIN_PAGES):
+        self.threshold = threshold
+        self.boilerplate_min_pages = max(2, boilerplate_min_pages)
+        self.blocks_stripped = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._block_pages: Dict[str, int] = {}  # block hash -> number of pages it appeared on
+        self._chunk_hashes: Set[str] = set()
+        self._signatures: List[np.ndarray] = []
+        self._bands: List[Dict[bytes, List[int]]] = [{} for _ in range(_BANDS)]
+
+    def strip_boilerplate(self, blocks: List[Block]) -> List[Block]:
+        """Record the page's blocks and return those not yet seen on enough other pages."""
+        kept = []
+        seen_here = set()
+        for section, paragraph in blocks:
+            key = hashlib.sha1(_normalize(paragraph).encode("utf-8")).hexdigest()
+            if key not in seen_here:
+                seen_here.add(key)
+                self._block_pages[key] = self._block_pages.get(key, 0) + 1
+            if self._block_pages[key] >= self.boilerplate_min_pages:
+                self.blocks_stripped += 1
+                continue
+            kept.append((section, paragraph))
+        return kept
+
+    def is_duplicate(self, text: str) -> bool:
+        """True if the chunk repeats an earlier one; otherwise remember it and return False."""
+        normalized = _normalize(text)
+        key = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        if key in self._chunk_hashes:
+            self.exact_duplicates += 1
+            return True
+        self._chunk_hashes.add(key)
+
+        if len(normalized.split()) < DEDUP_MIN_WORDS:
+            return False
+        signature = minhash(normalized)
+        bands = [signature[i * _ROWS:(i + 1) * _ROWS].tobytes() for i in range(_BANDS)]
+        candidates = {i for index, band in zip(self._bands, bands) for i in index.get(band, ())}
+        for i in candidates:
+            if np.mean(self._signatures[i] == signature) >= self.threshold:
+                self.near_duplicates += 1
+                return True
+        self._signatures.append(signature)
+        for index, band in zip(self._bands, bands):
+            index.setdefault(band, []).append(len(self._signatures) - 1)
+        return False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "boilerplate_blocks_removed": self.blocks_stripped,
+            "duplicate_chunks_removed": self.exact_duplicates,
+            "near_duplicate_chunks_removed": self.near_duplicates,
+        }
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "/app/data/embedding_cache.sqlite3")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", 200000))
+QUERY_EMBED_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_EMBED_CACHE_MAX_ENTRIES", 10000))  # 0 disables
+
+# SQLite limits the number of bound parameters per statement
+_SQL_CHUNK = 500
+_EVICT_HEADROOM = 0.05  # evict down to 95% of max_entries, so a full cache is counted once per 5% of inserts
+
+
+class EmbeddingCache:
+    """On-disk, content-addressed embedding cache backed by SQLite.
+
+    Keys are sha256(model, text), vectors are stored as float32 blobs and the
+    least recently used entries are evicted once max_entries is exceeded.
+    Safe to share between threads and between processes (WAL mode).
+
+    The table is only counted when a running estimate of its size (rows
+    counted at open plus rows written since) goes over max_entries, not on
+    every write.
+    """
+
+    def __init__(self, path: str, max_entries: int = EMBED_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._estimate = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order (None for misses) and refresh their LRU stamp."""
+        keys = [self.make_key(model, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_CHUNK):
+                part = keys[i:i + _SQL_CHUNK]
+                marks = ",".join("?" * len(part))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", part
+                ):
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+            result = [found.get(k) for k in keys]
+            hits = sum(1 for v in result if v is not None)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return result
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]) -> None:
+        now = time.time()
+        rows = [
+            (self.make_key(model, t), array("f", v).tobytes(), now)
+            for t, v in zip(texts, vectors) if v
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+                )
+                self._estimate += len(rows)  # replaced rows and other processes make it an upper bound
+                if self._estimate > self.max_entries:
+                    self._evict()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> None:
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._estimate = count
+        if count <= self.max_entries:
+            return
+        excess = count - self.max_entries + int(self.max_entries * _EVICT_HEADROOM)
+        self._estimate -= excess
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self.evictions += excess
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_cache = None
+_cache_failed = False
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache instance, or None if disabled or the file cannot be opened."""
+    global _cache, _cache_failed
+    if not EMBED_CACHE_ENABLED or _cache_failed:
+        return None
+    if _cache is None:
+        try:
+            _cache = EmbeddingCache(EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            print(f"Warning: embedding cache disabled, cannot open {EMBED_CACHE_PATH}: {e}")
+            _cache_failed = True
+            return None
+    return _cache
+
+
+class QueryEmbeddingCache:
+    """Bounded in-memory LRU of chat question embeddings.
+
+    Keyed on (model, normalized question), so repeated questions skip the
+    embedding request entirely. Thread-safe; hit/miss counters feed /cache/stats.
+    """
+
+    def __init__(self, max_entries: int = QUERY_EMBED_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, List[float]]" = OrderedDict()
+
+    def get(self, model: str, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get((model, key))
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((model, key))
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, key: str, vector: List[float]) -> None:
+        if not vector:
+            return
+        with self._lock:
+            self._entries[(model, key)] = vector
+            self._entries.move_to_end((model, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            entries = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_query_cache = None
+
+
+def get_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """Process-wide query embedding LRU, or None if QUERY_EMBED_CACHE_MAX_ENTRIES is 0."""
+    global _query_cache
+    if QUERY_EMBED_CACHE_MAX_ENTRIES <= 0:
+        return None
+    if _query_cache is None:
+        _query_cache = QueryEmbeddingCache(QUERY_EMBED_CACHE_MAX_ENTRIES)
+    return _query_cache
@@ -0,0 +1,173 @@
+import asyncio
+import os
+import random
+from typing import Callable, List, Optional
+
+import httpx
+
+from .embedding_cache import get_embedding_cache, get_query_embedding_cache
+from .http_client import get_http_client
+from .utils import estimate_tokens, normalize_question
+
+# Jina AI API for embeddings
+JINA_API_KEY = os.getenv("JINA_API_KEY")
+JINA_EMBEDDING_URL = "https://api.jina.ai/v1/embeddings"
+EMBED_MODEL = os.getenv("EMBED_MODEL", "jina-embeddings-v2-base-en")
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 64))  # max texts per request
+EMBED_BATCH_MAX_TOKENS = int(os.getenv("EMBED_BATCH_MAX_TOKENS", 8000))  # max estimated tokens per request
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 4))  # requests in flight per embed call
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 5))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", 0.5))  # seconds
+EMBED_BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", 20))  # seconds
+EMBED_TIMEOUT = int(os.getenv("EMBED_TIMEOUT", 60))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class EmbeddingError(Exception):
+    """Raised when a batch could not be embedded after all retries."""
+
+
+def make_batches(texts: List[str], batch_size: int = EMBED_BATCH_SIZE,
+                 max_tokens: int = EMBED_BATCH_MAX_TOKENS) -> List[List[int]]:
+    """Group text indices into batches bounded by count and estimated token total.
+
+    A single text larger than max_tokens still gets a batch of its own.
+    """
+    batches = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= batch_size or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Exponential backoff with full jitter, never shorter than a Retry-After hint."""
+    delay = random.uniform(0, min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * (2 ** attempt)))
+    if retry_after:
+        try:
+            delay = max(delay, min(EMBED_BACKOFF_MAX, float(retry_after)))
+        except ValueError:
+            pass
+    return delay
+
+
+async def _embed_batch(client: httpx.AsyncClient, batch: List[str]) -> List[List[float]]:
+    """Embed one batch, retrying 429/5xx and transport errors with jittered backoff."""
+    last_error = None
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            response = await client.post(
+                JINA_EMBEDDING_URL,
+                headers={"Authorization": f"Bearer {JINA_API_KEY}"},
+                json={"model": EMBED_MODEL, "input": batch},
+                timeout=EMBED_TIMEOUT,
+            )
+            if response.status_code == 200:
+                data = response.json().get("data")
+                if not data or len(data) != len(batch):
+                    raise EmbeddingError(f"Jina API returned {len(data or [])} embeddings for {len(batch)} texts")
+                # Jina echoes the input position; do not rely on response order
+                data = sorted(data, key=lambda item: item.get("index", 0))
+                return [item["embedding"] for item in data]
+            last_error = EmbeddingError(f"Jina API error: {response.status_code} - {response.text[:200]}")
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                raise last_error
+            retry_after = response.headers.get("Retry-After")
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            last_error = e
+        if attempt < EMBED_MAX_RETRIES:
+            delay = _backoff_delay(attempt, retry_after)
+            print(f"⏳ Embedding batch failed ({last_error}), retry {attempt + 1}/{EMBED_MAX_RETRIES} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    raise EmbeddingError(f"Embedding batch failed after {EMBED_MAX_RETRIES} retries: {last_error}")
+
+
+async def aembed_texts(texts: List[str], on_progress: Callable[[int], None] | None = None) -> List[List[float]]:
+    """Embed texts using Jina AI API.
+
+    Texts found in the persistent embedding cache are not sent at all. The rest
+    are batched by size and token count, with up to EMBED_CONCURRENCY requests
+    in flight over the shared pooled client. Vectors are returned in input order.
+    `on_progress` is called with the number of texts embedded so far.
+    Raises EmbeddingError instead of returning empty vectors.
+    """
+    if not texts:
+        return []
+
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    cache = get_embedding_cache()
+    if cache is not None:
+        try:
+            results = await asyncio.to_thread(cache.get_many, EMBED_MODEL, texts)
+        except Exception as e:
+            print(f"Warning: embedding cache lookup failed: {e}")
+    missing = [i for i, vec in enumerate(results) if vec is None]
+    done = len(texts) - len(missing)
+    if on_progress and done:
+        on_progress(done)
+    if not missing:
+        return results
+
+    if not JINA_API_KEY:
+        raise EmbeddingError("JINA_API_KEY not set in environment variables")
+
+    client = get_http_client()
+    semaphore = asyncio.Semaphore(max(1, EMBED_CONCURRENCY))
+
+    async def _run(indices: List[int]):
+        nonlocal done
+        async with semaphore:
+            vectors = await _embed_batch(client, [texts[i] for i in indices])
+        for i, vec in zip(indices, vectors):
+            results[i] = vec
+        if cache is not None:
+            try:
+                await asyncio.to_thread(cache.put_many, EMBED_MODEL, [texts[i] for i in indices], vectors)
+            except Exception as e:
+                print(f"Warning: embedding cache write failed: {e}")
+        done += len(indices)
+        if on_progress:
+            on_progress(done)
+
+    batches = [[missing[j] for j in batch] for batch in
+               make_batches([texts[i] for i in missing], EMBED_BATCH_SIZE, EMBED_BATCH_MAX_TOKENS)]
+    tasks = [asyncio.create_task(_run(indices)) for indices in batches]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+
+    print(f"🎉 Embedded {len(missing)} texts in {len(batches)} batch(es) using Jina AI "
+          f"({len(texts) - len(missing)} served from cache)")
+    return results
+
+
+async def aembed_query(question: str) -> List[float]:
+    """Embed a chat question, memoized in memory on the normalized question text."""
+    cache = get_query_embedding_cache()
+    key = normalize_question(question)
+    if cache is not None:
+        vector = cache.get(EMBED_MODEL, key)
+        if vector is not None:
+            return vector
+    vector = (await aembed_texts([question]))[0]
+    if cache is not None:
+        cache.put(EMBED_MODEL, key, vector)
+    return vector
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Synchronous wrapper around aembed_texts for callers outside the event loop."""
+    return asyncio.run(aembed_texts(texts))
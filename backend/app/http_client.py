@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+
+_client = None
+_client_loop = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared pooled async HTTP client.
+
+    httpx connection pools are bound to the event loop that created them, so a
+    new client is created if we are called from a different loop (tests,
+    `asyncio.run` wrappers, worker processes).
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        try:
+            await _client.aclose()
+        except Exception:
+            pass
+    _client = None
+    _client_loop = None
@@ -1,187 +1,103 @@
 import requests
-from .utils import html_to_text, chunk_text
-from .qdrant_client import get_qdrant_client
-import uuid
+import httpx
+from .answer_cache import invalidate_answers
+from .browser_pool import get_browser_pool
+from .budget import Budget
+from .http_client import get_http_client
+from .job_store import ACTIVE_STATUSES, get_job_store
+from .page_state import conditional_headers, response_validators
+from .pipeline import IngestPipeline
+from .processing import get_page_processor
 import os
-from urllib.parse import urljoin, urlparse
-from collections import deque
+from urllib.parse import urlparse
 import asyncio
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Awaitable, Optional
 
 CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 50))
 PLAYWRIGHT_MAX_PAGES = int(os.getenv("PLAYWRIGHT_MAX_PAGES", 30))
 CRAWL_TIMEOUT = int(os.getenv("CRAWL_TIMEOUT", 30))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 10))  # in-flight requests per crawl
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", 4))  # in-flight requests per host
 NAVIGATION_TIMEOUT = int(os.getenv("NAVIGATION_TIMEOUT", 60))
+PLAYWRIGHT_TABS = int(os.getenv("PLAYWRIGHT_TABS", 4))  # parallel tabs per runtime crawl
+PLAYWRIGHT_CLICK_BUDGET = int(os.getenv("PLAYWRIGHT_CLICK_BUDGET", 10))  # element clicks tried per page
+PLAYWRIGHT_CLICK_TIMEOUT = float(os.getenv("PLAYWRIGHT_CLICK_TIMEOUT", 2))  # seconds
+PLAYWRIGHT_IDLE_TIMEOUT = float(os.getenv("PLAYWRIGHT_IDLE_TIMEOUT", 3))  # seconds to wait for network idle after load
+PLAYWRIGHT_BLOCKED_RESOURCE_TYPES = set(
+    os.getenv("PLAYWRIGHT_BLOCKED_RESOURCE_TYPES", "image,media,font").split(",")
+)
+PLAYWRIGHT_BLOCK_THIRD_PARTY = os.getenv("PLAYWRIGHT_BLOCK_THIRD_PARTY", "true").lower() == "true"
+PLAYWRIGHT_BLOCKED_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "facebook.net", "facebook.com",
+    "hotjar.com", "mc.yandex.ru", "yandex.ru", "segment.io", "mixpanel.com", "clarity.ms",
+]
 USE_PLAYWRIGHT = os.getenv("USE_PLAYWRIGHT", "true").lower() == "true"
 INGEST_TIMEOUT_SECONDS = int(os.getenv("INGEST_TIMEOUT_SECONDS", 600))  # global timeout per ingest job
 
-# We'll use Jina AI API for embeddings instead of local model
-import os
-
-# Get Jina API key from environment
-JINA_API_KEY = os.getenv("JINA_API_KEY")
-JINA_EMBEDDING_URL = "https://api.jina.ai/v1/embeddings"
-
-# In-memory job tracker for background ingest tasks
-_ingest_jobs: Dict[str, Dict[str, Any]] = {}
+def _get_collection_active_ingests(collection_name: str | None) -> List[Dict[str, Any]]:
+    """Get all active ingest jobs for a collection (None = all collections), oldest first."""
+    return [job for job in map(_check_timeout, get_job_store().active(collection_name))
+            if job["status"] in ACTIVE_STATUSES]
 
-# Track active ingest jobs per collection (collection -> list of active job_ids)
-_active_collection_ingests: Dict[str, List[str]] = {}
 
+def _get_job_status(job_id: str) -> Dict[str, Any]:
+    """Get status of a background ingest job."""
+    job = get_job_store().get(job_id)
+    if job is None:
+        return {"status": "not_found"}
+    return _check_timeout(job)
 
-def _get_collection_active_ingests(collection_name: str) -> List[Dict[str, Any]]:
-    """Get all active ingest jobs for a collection."""
-    if collection_name not in _active_collection_ingests:
-        return []
-
-    active_jobs = []
-    for job_id in _active_collection_ingests[collection_name][:]:  # copy to avoid iteration issues
-        job_info = _get_job_status(job_id)
-        if job_info.get("status") in ["pending", "running"]:
-            active_jobs.append(job_info)
-        else:
-            # Remove completed/failed jobs from active list
-            _active_collection_ingests[collection_name].remove(job_id)
 
-    return active_jobs
+def _timeout_at(job: Dict[str, Any]) -> Optional[float]:
+    """Time at which a running job exceeds the global ingest timeout (None if not running)."""
+    if job.get("status") != "running":
+        return None
+    return (job.get("started_at") or job["created_at"]) + INGEST_TIMEOUT_SECONDS
 
 
-def _get_job_status(job_id: str) -> Dict[str, Any]:
-    """Get status of a background ingest job."""
-    if job_id not in _ingest_jobs:
-        return {"status": "not_found"}
-    job = _ingest_jobs[job_id]
+def _check_timeout(job: Dict[str, Any]) -> Dict[str, Any]:
     # Safety net: if job is still marked as running but has exceeded the global
-    # ingest timeout since creation, mark it as failed here so that callers
-    # never see an endlessly running job.
+    # ingest timeout since it started running (time spent queued does not
+    # count), mark it as failed here so that callers never see an endlessly
+    # running job (e.g. its worker process died).
     try:
-        if job.get("status") == "running":
-            created_at = job.get("created_at")
-            # Legacy jobs without created_at are treated as stale and failed
-            if created_at is None:
-                created_at = time.time() - (INGEST_TIMEOUT_SECONDS + 1)
-                job["created_at"] = created_at
-            elapsed = time.time() - created_at
-            if elapsed > INGEST_TIMEOUT_SECONDS:
-                msg = (
-                    f"Ingest job {job_id} exceeded {INGEST_TIMEOUT_SECONDS} "
-                    f"seconds (actual ~{int(elapsed)}s); marking as failed by status check"
-                )
-                job["status"] = "failed"
-                job["error"] = msg
-                if "progress" in job and isinstance(job["progress"], dict):
-                    job["progress"]["message"] = msg
+        timeout_at = _timeout_at(job)
+        if timeout_at is not None and time.time() > timeout_at:
+            elapsed = time.time() - (job.get("started_at") or job["created_at"])
+            msg = (
+                f"Ingest job {job['job_id']} exceeded {INGEST_TIMEOUT_SECONDS} "
+                f"seconds (actual ~{int(elapsed)}s); marking as failed by status check"
+            )
+            if get_job_store().set_status(job["job_id"], "failed", error=msg, message=msg, expect="running"):
+                job.update(status="failed", error=msg)
+                job["progress"]["message"] = msg
     except Exception:
         # Never let status retrieval fail because of this safety logic.
         pass
     return job
 
 
-def _create_job(job_id: str, mode: str, target: str, collection: str = None) -> None:
-    """Initialize a new ingest job."""
-    _ingest_jobs[job_id] = {
-        "status": "pending",
-        "mode": mode,  # "url", "urls", or "crawl"
-        "target": target,  # URL or list representation
-        "collection": collection,  # Collection name for this job
-        "created_at": time.time(),  # for safety timeout in status endpoint
-        "progress": {
-            "pages_fetched": 0,
-            "chunks_extracted": 0,
-            "embeddings_created": 0,
-            "points_upserted": 0,
-            "message": "Pending"
-        },
-        "error": None,
-        "result": None
-    }
-
-    # Track active ingests per collection
-    if collection and collection not in _active_collection_ingests:
-        _active_collection_ingests[collection] = []
-    if collection:
-        _active_collection_ingests[collection].append(job_id)
-
-
-def embed_texts(texts):
-    """Embed texts using Jina AI API."""
-    if not JINA_API_KEY:
-        raise Exception("JINA_API_KEY not set in environment variables")
-
-    print(f"🔑 JINA_API_KEY starts with: {JINA_API_KEY[:10]}...")  # Debug log
-
-    try:
-        # Jina AI can handle batches, but let's keep it reasonable
-        batch_size = 5  # Smaller batches for debugging
-        all_embeddings = []
-
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            print(f"📦 Processing batch {i//batch_size + 1} with {len(batch)} texts")
-
-            response = requests.post(
-                JINA_EMBEDDING_URL,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Bearer {JINA_API_KEY}"
-                },
-                json={
-                    "model": "jina-embeddings-v2-base-en",  # Free tier model
-                    "input": batch
-                }
-            )
-
-            print(f"🌐 API Response status: {response.status_code}")
-
-            if response.status_code != 200:
-                print(f"❌ Jina API error: {response.status_code} - {response.text}")
-                # Return empty embeddings for this batch
-                all_embeddings.extend([[] for _ in batch])
-                continue
-
-            data = response.json()
-            print(f"📊 API Response data keys: {list(data.keys())}")
-
-            if "data" not in data:
-                print(f"❌ No 'data' in response: {data}")
-                all_embeddings.extend([[] for _ in batch])
-                continue
+def _update_progress(job_id: str | None, **fields) -> None:
+    """Merge fields into the progress dict of a job, if the job is tracked."""
+    if job_id is not None:
+        get_job_store().update_progress(job_id, fields)
 
-            embeddings = [item["embedding"] for item in data["data"]]
-            print(f"✅ Got {len(embeddings)} embeddings, first vector length: {len(embeddings[0]) if embeddings else 0}")
-            all_embeddings.extend(embeddings)
 
-        print(f"🎉 Successfully embedded {len(texts)} texts using Jina AI, total vectors: {len(all_embeddings)}")
-        return all_embeddings
-
-    except Exception as e:
-        print(f"💥 Jina AI embedding failed: {e}")
-        import traceback
-        traceback.print_exc()
-        # Return empty embeddings for all texts in case of failure
-        return [[] for _ in texts]
+def _create_job(job_id: str, mode: str, target: str, collection: str = None) -> None:
+    """Initialize a new ingest job."""
+    get_job_store().create(job_id, mode, target, collection)
 
 
 async def fetch_with_playwright(url: str, timeout: int = CRAWL_TIMEOUT) -> str:
     """Fetch page content using Playwright Async API (renders JavaScript).
+    Pages are opened in the shared browser pool, so only the first call pays for a browser launch.
     Falls back to requests if Playwright is not available.
     """
     try:
-        from playwright.async_api import async_playwright
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-            try:
-                await page.goto(url, timeout=timeout * 1000, wait_until="networkidle")
-                content = await page.content()
-                return content
-            finally:
-                try:
-                    await browser.close()
-                except Exception:
-                    pass
+        async with get_browser_pool().page() as page:
+            await page.goto(url, timeout=timeout * 1000, wait_until="networkidle")
+            return await page.content()
     except Exception as e:
         print(f"Playwright async fetch failed for {url}, falling back to requests: {e}")
         # Fallback to requests (sync) executed in thread
@@ -193,513 +109,463 @@ async def fetch_with_playwright(url: str, timeout: int = CRAWL_TIMEOUT) -> str:
         return await asyncio.to_thread(_requests_get, url, timeout)
 
 
-async def runtime_crawl(start_url: str, max_pages: int = PLAYWRIGHT_MAX_PAGES, timeout: int = CRAWL_TIMEOUT, job_id: str | None = None):
+async def _block_resources(route, origin: str) -> None:
+    """Playwright route handler: abort requests that do not help rendering the page text."""
+    request = route.request
+    host = urlparse(request.url).netloc
+    blocked = request.resource_type in PLAYWRIGHT_BLOCKED_RESOURCE_TYPES
+    if not blocked and host and host != origin:
+        # Third-party hosts: keep CDN bundles and API calls the app renders from, drop trackers and the rest
+        blocked = PLAYWRIGHT_BLOCK_THIRD_PARTY and (
+            request.resource_type not in ("document", "script", "stylesheet", "xhr", "fetch")
+            or any(host == t or host.endswith("." + t) for t in PLAYWRIGHT_BLOCKED_HOSTS)
+        )
+    try:
+        if blocked:
+            await route.abort()
+        else:
+            await route.continue_()
+    except Exception:
+        pass  # page closed while the request was in flight
+
+
+async def runtime_crawl(start_url: str, max_pages: int = PLAYWRIGHT_MAX_PAGES, timeout: int = CRAWL_TIMEOUT, job_id: str | None = None,
+                        tabs: int = PLAYWRIGHT_TABS, click_budget: int = PLAYWRIGHT_CLICK_BUDGET,
+                        on_page: Callable[[str, str], Awaitable[None]] | None = None):
     """
     Use Playwright to explore a single-page app at runtime.
-    - opens pages in headless browser
-    - collects hrefs and attempts to click link-like elements
+    - opens pages in several tabs of the shared browser, over one frontier
+    - blocks images, fonts, media and third-party trackers
+    - collects hrefs / data-href / data-route and clicks up to click_budget link-like elements per page
     - follows navigation changes (including client-side routing)
 
-    Returns list of (url, html_content) tuples.
+    Returns list of (url, html_content) tuples. With `on_page`, each page is
+    awaited as soon as it is rendered and is not kept in the returned list.
     """
-    try:
-        from playwright.async_api import async_playwright
-    except Exception as e:
-        print(f"Playwright async not available: {e}")
-        return []
-
-    visited = set()
     results = []
-    queue = [start_url]
+    rendered = 0
+    seen = {start_url}
+    frontier: asyncio.Queue = asyncio.Queue()
+    frontier.put_nowait(start_url)
     start_origin = urlparse(start_url).netloc
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch()
-        page = await browser.new_page()
-
-        while queue and len(results) < max_pages:
-            url = queue.pop(0)
-            if url in visited:
+    def _enqueue(candidates):
+        for h in candidates:
+            if not isinstance(h, str) or not h:
                 continue
+            full = h.split('#')[0]
+            if urlparse(full).netloc == start_origin and full not in seen and len(seen) < max_pages:
+                seen.add(full)
+                frontier.put_nowait(full)
+
+    async def _render(page, url):
+        nonlocal rendered
+        _update_progress(job_id, message=f"Playwright: opening {url}...")
+        try:
+            await page.goto(url, timeout=NAVIGATION_TIMEOUT * 1000, wait_until="load")
+        except Exception as e:
+            print(f"Playwright failed to goto {url}: {e}")
+            return
+        # Let client-side rendering settle; blocked trackers no longer keep the network busy
+        try:
+            await page.wait_for_load_state("networkidle", timeout=PLAYWRIGHT_IDLE_TIMEOUT * 1000)
+        except Exception:
+            pass
+
+        try:
+            html = await page.content()
+        except Exception:
+            return
+        rendered += 1
+        _update_progress(job_id, pages_fetched=rendered,
+                         message=f"Playwright: crawled {rendered}/{max_pages} page(s)...")
+
+        # 1) collect anchor hrefs and router targets
+        try:
+            _enqueue(await page.eval_on_selector_all(
+                'a[href], [data-href], [data-route]',
+                'els => els.map(e => e.href || e.dataset.href || e.dataset.route)'
+                '.map(h => { try { return new URL(h, location.href).href } catch (_) { return null } })'
+            ))
+        except Exception:
+            pass
+
+        # 2) click link-like elements that are not plain anchors, within the budget
+        clicks = 0
+        try:
+            elements = await page.query_selector_all('[role=link], button')
+        except Exception:
+            elements = []
+        for el in elements:
+            if clicks >= click_budget or len(seen) >= max_pages:
+                break
+            clicks += 1
             try:
-                # Progress: about to open URL with Playwright
-                if job_id in _ingest_jobs:
-                    _ingest_jobs[job_id]["progress"].update({
-                        "message": f"Playwright: opening {url}...",
-                    })
-                # primary attempt: wait for networkidle
+                before = page.url
+                await el.click(timeout=PLAYWRIGHT_CLICK_TIMEOUT * 1000)
                 try:
-                    await page.goto(url, timeout=NAVIGATION_TIMEOUT * 1000, wait_until="networkidle")
-                except Exception as e:
-                    # fallback: try longer timeout and wait for full load
-                    try:
-                        await page.goto(url, timeout=(NAVIGATION_TIMEOUT * 2) * 1000, wait_until="load")
-                    except Exception as e2:
-                        print(f"Playwright failed to goto {url}: {e} / {e2}")
-                # small pause to allow client-side rendering
-                try:
-                    await asyncio.sleep(0.5)
+                    await page.wait_for_load_state('networkidle', timeout=PLAYWRIGHT_CLICK_TIMEOUT * 1000)
                 except Exception:
                     pass
-            except Exception as e:
-                print(f"Playwright failed to goto {url}: {e}")
-            visited.add(url)
-
-            try:
-                html = await page.content()
-                results.append((page.url, html))
-                # Progress: successfully crawled a page via Playwright
-                if job_id in _ingest_jobs:
-                    _ingest_jobs[job_id]["progress"].update({
-                        "pages_fetched": len(results),
-                        "message": f"Playwright: crawled {len(results)}/{max_pages} page(s)...",
-                    })
+                if page.url and page.url != before:
+                    _enqueue([page.url])
+                    # Come back so the remaining element handles stay valid
+                    await page.goto(before, timeout=NAVIGATION_TIMEOUT * 1000, wait_until="load")
             except Exception:
-                results.append((url, ""))
+                continue
 
-            # 1) collect anchor hrefs
-            try:
-                hrefs = await page.eval_on_selector_all('a[href]', 'els => els.map(e => e.href)')
-            except Exception:
-                hrefs = []
+        if on_page is not None:
+            await on_page(page.url, html)
+        else:
+            results.append((page.url, html))
 
-            for h in hrefs:
+    async def _tab():
+        async with get_browser_pool().page() as page:
+            await page.route("**/*", lambda route: _block_resources(route, start_origin))
+            while True:
+                url = await frontier.get()
                 try:
-                    parsed = urlparse(h)
-                    if parsed.netloc == start_origin:
-                        full = h.split('#')[0]
-                        if full not in visited and full not in queue and len(results) + len(queue) < max_pages:
-                            queue.append(full)
-                except Exception:
-                    continue
-
-            # 2) try clicking interactive elements
-            try:
-                clickable_selectors = [
-                    'a[href]',
-                    '[role=link]',
-                    'button',
-                    '[data-href]',
-                    '[data-route]'
-                ]
-                clicks = 0
-                for sel in clickable_selectors:
-                    elements = await page.query_selector_all(sel)
-                    for el in elements:
-                        if clicks >= 10 or len(results) >= max_pages:
-                            break
-                        try:
-                            before = page.url
-                            await el.click(timeout=2000)
-                            try:
-                                await page.wait_for_load_state('networkidle', timeout=2000)
-                            except Exception:
-                                pass
-                            after = page.url
-                            if after and after != before:
-                                full = after.split('#')[0]
-                                if urlparse(full).netloc == start_origin and full not in visited and full not in queue:
-                                    queue.append(full)
-                                    clicks += 1
-                        except Exception:
-                            continue
-                    if clicks >= 20 or len(results) >= max_pages:
-                        break
-            except Exception:
-                pass
+                    await _render(page, url)
+                except Exception as e:
+                    print(f"Playwright failed on {url}: {e}")
+                finally:
+                    frontier.task_done()
 
-        try:
-            await browser.close()
-        except Exception:
-            pass
+    workers = [asyncio.create_task(_tab()) for _ in range(max(1, tabs))]
+    drained = asyncio.create_task(frontier.join())
+    try:
+        # Tabs that cannot open (no browser) must not leave the frontier waiting forever
+        while not drained.done():
+            alive = [w for w in workers if not w.done()]
+            if not alive:
+                break
+            await asyncio.wait([drained] + alive, return_when=asyncio.FIRST_COMPLETED)
+        for w in workers:
+            if w.done() and not w.cancelled() and w.exception():
+                print(f"Playwright runtime crawl failed: {w.exception()}")
+    finally:
+        for task in [drained] + workers:
+            task.cancel()
+        await asyncio.gather(drained, *workers, return_exceptions=True)
 
     return results
 
 
-async def crawl_site(start_url: str, max_pages: int = CRAWL_MAX_PAGES, timeout: int = CRAWL_TIMEOUT, job_id: str | None = None):
-    """\n+    Crawl a website starting from start_url, following same-domain links.\n+\n+    Strategy:\n+    1) Try simple HTTP crawl via requests (fast, cheap).\n+    2) If it finds no pages and USE_PLAYWRIGHT is enabled, fallback to Playwright runtime crawler.\n+\n+    Returns: list of (url, html_content) tuples, max max_pages pages.\n+    """
-    # 1) Static request-based crawl first
-    visited = set()
-    to_visit = deque([start_url])
-    pages = []
+async def crawl_site(start_url: str, max_pages: int = CRAWL_MAX_PAGES, timeout: int = CRAWL_TIMEOUT, job_id: str | None = None,
+                     concurrency: int = CRAWL_CONCURRENCY, per_host_concurrency: int = CRAWL_PER_HOST_CONCURRENCY,
+                     validators: Dict[str, Dict[str, Any]] | None = None, report: Dict[str, Any] | None = None,
+                     on_page: Callable[..., Awaitable[None]] | None = None):
+    """
+    Crawl a website starting from start_url, following same-domain links.
+
+    Strategy:
+    1) Concurrent static HTTP crawl over the shared pooled httpx client (fast, cheap).
+       Up to `concurrency` requests are in flight overall and `per_host_concurrency`
+       per host, so one slow page does not hold up the rest of the crawl.
+    2) If it finds no pages and USE_PLAYWRIGHT is enabled, fallback to Playwright runtime crawler.
+
+    Incremental crawls pass `validators` (page state records by URL): known pages
+    are requested conditionally, and a 304 reuses the stored links instead of a body.
+    If `report` is given it is filled with "not_modified", "gone" and "failed" URLs,
+    the response "validators", discovered "links" and link "depth" (0 = start_url)
+    per URL, and "exhausted" (the whole site was walked without hitting max_pages).
+    "pending" tracks how many discovered URLs are still waiting to be fetched.
+
+    Streaming callers pass `on_page`: each page is handed to it as soon as its
+    links are queued. It is awaited, so a full downstream queue slows the crawl
+    instead of buffering HTML, and such pages are not kept in the returned list.
+    Static pages come with the document processed in the same parse as the
+    links (`on_page(url, html, doc)`), so the pipeline does not parse them again.
+
+    Returns: list of (url, html_content) tuples, max max_pages pages.
+    """
+    # 1) Static concurrent crawl first
+    client = get_http_client()
+    processor = get_page_processor()
     start_domain = urlparse(start_url).netloc
-
-    print("Trying static HTTP crawl first...")
-
-    while to_visit and len(pages) < max_pages:
-        url = to_visit.popleft()
-        if url in visited:
-            continue
-        if urlparse(url).netloc != start_domain:
-            continue
-        visited.add(url)
-
-        # Update progress before fetching URL
-        if job_id in _ingest_jobs:
-            _ingest_jobs[job_id]["progress"].update({
-                "message": f"Fetching {url}...",
-                "pages_fetched": len(pages)
-            })
-        try:
-            # Run blocking requests.get in a thread so that the async ingest task
-            # remains cancellable by asyncio.wait_for (global ingest timeout).
-            def _fetch(u, t):
-                r = requests.get(u, timeout=t, allow_redirects=True)
+    validators = validators or {}
+    if report is None:
+        report = {}
+    report.update({"not_modified": [], "gone": [], "failed": [], "validators": {}, "links": {},
+                   "depth": {start_url: 0}, "exhausted": False, "pending": 1})
+    seen = {start_url}
+    frontier: asyncio.Queue = asyncio.Queue()
+    frontier.put_nowait(start_url)
+    pages = []
+    fetched = 0
+    capped = False
+    host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    print(f"Trying static HTTP crawl first (concurrency={concurrency}, per host={per_host_concurrency})...")
+
+    def _claimed() -> int:
+        # Unchanged pages count towards max_pages so incremental crawls cover the same pages
+        return fetched + len(report["not_modified"])
+
+    async def _fetch(url: str) -> httpx.Response:
+        host = urlparse(url).netloc
+        if host not in host_limits:
+            host_limits[host] = asyncio.Semaphore(max(1, per_host_concurrency))
+        async with host_limits[host]:
+            r = await client.get(url, timeout=timeout, headers=conditional_headers(validators.get(url)))
+            if r.status_code != 304:
                 r.raise_for_status()
-                return r.text
-
-            html_content = await asyncio.to_thread(_fetch, url, timeout)
-            pages.append((url, html_content))
+            return r
 
-            # After successful fetch, bump pages_fetched
-            if job_id in _ingest_jobs:
-                _ingest_jobs[job_id]["progress"].update({
-                    "pages_fetched": len(pages),
-                    "message": f"Fetched {len(pages)} page(s), discovering links..."
-                })
-            try:
-                from bs4 import BeautifulSoup
-                soup = BeautifulSoup(html_content, 'html.parser')
-                for link in soup.find_all('a', href=True):
-                    href = link['href']
-                    absolute_url = urljoin(url, href)
-                    absolute_url = absolute_url.split('#')[0]
-                    if absolute_url not in visited and absolute_url not in to_visit:
-                        to_visit.append(absolute_url)
-            except Exception as e:
-                print(f"Warning: Failed to extract links from {url}: {e}")
+    async def _extract(url: str, html_content: str):
+        """Parse the page once, in the process pool: same-domain links for the frontier, text and chunks for the pipeline."""
+        try:
+            doc = await processor.process(html_content, url)
         except Exception as e:
-            print(f"Warning: Failed to fetch {url}: {e}")
-            if job_id in _ingest_jobs:
-                _ingest_jobs[job_id]["progress"].update({
-                    "message": f"Failed to fetch {url}: {e}"  # keep pages_fetched as is
-                })
-            continue
-
-    if pages:
+            print(f"Warning: Failed to extract links from {url}: {e}")
+            return None, []
+        return doc, [link for link in doc["links"] if urlparse(link).netloc == start_domain]
+
+    def _enqueue(links: List[str], parent: str) -> None:
+        depth = report["depth"].get(parent, 0) + 1
+        for link in links:
+            if link not in seen:
+                seen.add(link)
+                report["depth"][link] = depth
+                frontier.put_nowait(link)
+                report["pending"] += 1
+
+    async def _worker():
+        nonlocal capped, fetched
+        while True:
+            url = await frontier.get()
+            report["pending"] -= 1
+            try:
+                # Pages already queued when the cap was reached are drained without fetching
+                if _claimed() >= max_pages:
+                    capped = True
+                    continue
+                _update_progress(job_id, message=f"Fetching {url}...", pages_fetched=fetched)
+                try:
+                    r = await _fetch(url)
+                except Exception as e:
+                    print(f"Warning: Failed to fetch {url}: {e}")
+                    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code in (404, 410):
+                        report["gone"].append(url)
+                    else:
+                        report["failed"].append(url)
+                    _update_progress(job_id, message=f"Failed to fetch {url}: {e}")  # keep pages_fetched as is
+                    continue
+                if _claimed() >= max_pages:
+                    capped = True
+                    continue
+                report["validators"][url] = response_validators(r.headers)
+                if r.status_code == 304:
+                    report["not_modified"].append(url)
+                    links = validators[url].get("links") or []
+                    report["links"][url] = links
+                    _enqueue(links, url)
+                else:
+                    html_content = r.text
+                    fetched += 1
+                    _update_progress(
+                        job_id,
+                        pages_fetched=fetched,
+                        message=f"Fetched {fetched} page(s), discovering links...",
+                    )
+                    doc, links = await _extract(url, html_content)
+                    report["links"][url] = links
+                    _enqueue(links, url)
+                    if on_page is not None:
+                        await on_page(url, html_content, doc)
+                    else:
+                        pages.append((url, html_content))
+            finally:
+                frontier.task_done()
+
+    workers = [asyncio.create_task(_worker()) for _ in range(max(1, concurrency))]
+    try:
+        await frontier.join()
+    finally:
+        # Also runs on cancellation (global ingest timeout), so no worker outlives the crawl
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    report["exhausted"] = not capped and _claimed() < max_pages
+
+    if report["not_modified"]:
+        print(f"{len(report['not_modified'])} page(s) not modified since last ingest")
+
+    if fetched or report["not_modified"]:
         return pages
 
     # 2) Fallback to Playwright runtime crawl if static crawl failed to get anything
     if USE_PLAYWRIGHT:
         print("Static crawl found no pages, trying Playwright runtime crawler...")
-        pages = await runtime_crawl(start_url, max_pages=PLAYWRIGHT_MAX_PAGES, timeout=timeout, job_id=job_id)
+        pages = await runtime_crawl(start_url, max_pages=PLAYWRIGHT_MAX_PAGES, timeout=timeout, job_id=job_id,
+                                    on_page=on_page)
 
     return pages
 
 
-async def ingest_url(url: str, collection_name: str = "site_collection", job_id: str | None = None):
+async def ingest_url(url: str, collection_name: str = "site_collection", job_id: str | None = None,
+                     incremental: bool = False, budget: Budget | None = None, profile: str | None = None):
     """
     Crawl site starting from url and index ALL pages to a single collection.
     Collection is created once; subsequent calls add/update pages.
+
+    Pages stream through the IngestPipeline while the crawl is still running:
+    extraction, embedding and upserts overlap with downloads.
+
+    With incremental=True, pages are requested conditionally using the ETag /
+    Last-Modified stored by the previous ingest, and pages that return 304 or
+    whose extracted text hashes the same are skipped. Only pages that changed
+    or disappeared get their Qdrant points replaced or deleted.
+
+    `budget` limits the chunks / tokens embedded by this job (default:
+    INGEST_MAX_CHUNKS, INGEST_MAX_TOKENS, INGEST_MAX_COST); the pipeline's
+    scheduler spends it on the most valuable chunks of the site.
+
+    `profile` names the collection profile (see profiles.py) of the new
+    version; by default the live version's profile is kept.
     """
-    # 1. Crawl the site
     print(f"Starting crawl from {url} (max {CRAWL_MAX_PAGES} pages)...")
-    if job_id in _ingest_jobs:
-        _ingest_jobs[job_id]["progress"].update({
-            "message": f"Crawling from {url}...",
-            "pages_fetched": 0,
-            "chunks_extracted": 0,
-            "embeddings_created": 0,
-            "points_upserted": 0,
-        })
-
-    pages = await crawl_site(url, max_pages=CRAWL_MAX_PAGES, timeout=CRAWL_TIMEOUT, job_id=job_id)
-    
-    if not pages:
-        if job_id in _ingest_jobs:
-            _ingest_jobs[job_id]["progress"].update({
-                "message": "No pages crawled",
-                "pages_fetched": 0
-            })
-        return {"status": "error", "detail": "No pages crawled"}
-    
-    print(f"Crawled {len(pages)} page(s), now processing...")
-    if job_id in _ingest_jobs:
-        _ingest_jobs[job_id]["progress"].update({
-            "pages_fetched": len(pages),
-            "message": f"Processing {len(pages)} page(s)..."
-        })
-    
-    # 2. Collect all chunks and their metadata across all pages
-    all_chunks = []
-    all_urls = []
-
-    # Limit total chunks to avoid excessive API costs and processing time
-    MAX_TOTAL_CHUNKS = 100
-    chunks_per_page = MAX_TOTAL_CHUNKS // len(pages) if pages else MAX_TOTAL_CHUNKS
-
-    for page_url, html_content in pages:
-        if len(all_chunks) >= MAX_TOTAL_CHUNKS:
-            break  # Stop if we've reached the limit
+    _update_progress(
+        job_id,
+        message=f"Crawling from {url}...",
+        pages_fetched=0,
+        chunks_extracted=0,
+        embeddings_created=0,
+        points_upserted=0,
+    )
 
-        try:
-            text = html_to_text(html_content)
+    report: Dict[str, Any] = {}
+    pipeline = IngestPipeline(
+        collection_name,
+        progress=lambda **fields: _update_progress(job_id, **fields),
+        incremental=incremental,
+        report=report,
+        budget=budget or Budget.default(),  # limits embedding API costs and processing time
+        max_pages=CRAWL_MAX_PAGES,
+        profile=profile,
+    )
 
-            # Skip pages that are too short or too long
-            word_count = len(text.split())
-            if word_count < 10:  # Skip nearly empty pages
-                continue
-            if word_count > 5000:  # Limit very large pages
-                # Take first part of long pages only
-                text = ' '.join(text.split()[:5000])
-
-            chunks = chunk_text(text)
-            # Limit chunks per page to distribute evenly
-            chunks = chunks[:chunks_per_page] if chunks else []
-
-            all_chunks.extend(chunks)
-            all_urls.extend([page_url] * len(chunks))
-
-            if job_id in _ingest_jobs:
-                _ingest_jobs[job_id]["progress"].update({
-                    "chunks_extracted": len(all_chunks),
-                    "message": f"Extracting chunks... ({len(all_chunks)}/{MAX_TOTAL_CHUNKS})"
-                })
-        except Exception as e:
-            print(f"Warning: Failed to process {page_url}: {e}")
-            continue
-
-    if not all_chunks:
-        if job_id in _ingest_jobs:
-            _ingest_jobs[job_id]["progress"].update({
-                "message": "No chunks extracted from pages"
-            })
+    async def _crawl(add_page):
+        # Static and Playwright pages are both handed to the pipeline as they arrive
+        await crawl_site(url, max_pages=CRAWL_MAX_PAGES, timeout=CRAWL_TIMEOUT, job_id=job_id,
+                         validators=pipeline.page_state if incremental else None, report=report,
+                         on_page=add_page)
+
+    await pipeline.run(_crawl)
+
+    if not pipeline.pages_fetched and not report.get("not_modified"):
+        _update_progress(job_id, message="No pages crawled", pages_fetched=0)
+        return {"status": "error", "detail": "No pages crawled"}
+
+    if not pipeline.points_upserted and not incremental:
+        _update_progress(job_id, message="No chunks extracted from pages")
         return {"status": "error", "detail": "No chunks extracted from pages"}
 
-    print(f"Total chunks extracted: {len(all_chunks)} (limited to {MAX_TOTAL_CHUNKS} max)")
-
-    # 3. Create embeddings for all chunks (run sync embedding in thread)
-    print("Creating embeddings...")
-    if job_id in _ingest_jobs:
-        _ingest_jobs[job_id]["progress"]["message"] = "Creating embeddings..."
-
-    embeddings = await asyncio.to_thread(embed_texts, all_chunks)
-    vector_size = len(embeddings[0]) if embeddings else 1536
-
-    if job_id in _ingest_jobs:
-        _ingest_jobs[job_id]["progress"].update({
-            "embeddings_created": len(embeddings),
-            "message": "Connecting to Qdrant..."
-        })
-    
-    # 4. Connect to Qdrant
-    client_qdrant = get_qdrant_client()
-    
-    # 5. Create collection if it doesn't exist (don't recreate on each ingest!)
-    try:
-        # Try to get collection to check if it exists
-        collections = client_qdrant.get_collections()
-        collection_exists = any(col.name == collection_name for col in collections.collections)
-
-        if not collection_exists:
-            print(f"Creating new collection '{collection_name}'...")
-            client_qdrant.create_collection(
-                collection_name=collection_name,
-                vectors_config={
-                    "size": vector_size,
-                    "distance": "Cosine"
-                }
-            )
-        else:
-            print(f"Collection '{collection_name}' exists, will add/update points")
+    print(f"Indexed {pipeline.points_upserted} chunk(s) from {pipeline.pages_fetched} page(s)")
+    _update_progress(job_id, message="Completed indexing")
+    return {"pages_crawled": pipeline.pages_fetched + len(report.get("not_modified", [])), **pipeline.result()}
 
-    except Exception as e:
-        print(f"Warning: Collection check/create failed ({e}), attempting upsert anyway")
-        # Collection might already exist or creation is in progress, upsert will work either way
-    
-    # 6. Create points (without vector name)
-    points = []
-    for i, (chunk, page_url, vec) in enumerate(zip(all_chunks, all_urls, embeddings)):
-        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{page_url}-{i}"))
-        points.append({
-            "id": point_id,
-            "vector": vec,  # <— WITHOUT VECTOR NAME
-            "payload": {
-                "text": chunk,
-                "url": page_url,
-                "chunk_id": i
-            }
-        })
-    
-    # 7. Upsert points (update or insert)
-    print(f"Upserting {len(points)} points to Qdrant...")
-    if job_id in _ingest_jobs:
-        _ingest_jobs[job_id]["progress"]["message"] = f"Upserting {len(points)} points to Qdrant..."
-    client_qdrant.upsert(
-        collection_name=collection_name,
-        points=points
-    )
-    
-    # 8. Get final collection stats
-    collection_info = client_qdrant.get_collection(collection_name)
-    points_count = collection_info.points_count
-
-    if job_id in _ingest_jobs:
-        _ingest_jobs[job_id]["progress"].update({
-            "points_upserted": len(points),
-            "message": "Completed indexing"
-        })
-    
-    return {
-        "status": "ok",
-        "pages_crawled": len(pages),
-        "chunks_indexed": len(points),
-        "total_points_in_collection": points_count,
-        "collection": collection_name
-    }
-
-
-async def ingest_urls(urls: list, collection_name: str = "site_collection"):
+
+async def ingest_urls(urls: list, collection_name: str = "site_collection", job_id: str | None = None,
+                      incremental: bool = False, budget: Budget | None = None, profile: str | None = None):
     """
     Index a list of explicitly provided URLs (useful for SPA or when crawling fails).
-    
+
     Args:
         urls: List of full URLs to index
         collection_name: Qdrant collection name
-        
+        job_id: background job to report progress to
+        incremental: skip pages whose extracted text did not change since the last ingest
+        budget: optional limit on the chunks / tokens embedded (unlimited by default)
+        profile: collection profile of the new version (default: keep the current one)
+
     Returns: dict with indexing stats
     """
     if not urls:
         return {"status": "error", "detail": "No URLs provided"}
-    
+
     print(f"Processing {len(urls)} provided URL(s)...")
-    
-    # 1. Fetch and process each URL
-    pages = []
-    for url in urls:
-        try:
-            print(f"Fetching {url}...")
-            # try Playwright fetch first for JS-rendered pages
-            if USE_PLAYWRIGHT:
+
+    pipeline = IngestPipeline(
+        collection_name,
+        progress=lambda **fields: _update_progress(job_id, **fields),
+        incremental=incremental,
+        budget=budget,
+        profile=profile,
+    )
+
+    async def _fetch_all(add_page):
+        client = get_http_client()
+        # Pages render in parallel tabs of the shared browser pool (capped by BROWSER_MAX_PAGES)
+        semaphore = asyncio.Semaphore(max(1, CRAWL_CONCURRENCY))
+
+        async def _fetch(url):
+            async with semaphore:
+                print(f"Fetching {url}...")
+                _update_progress(job_id, message=f"Fetching {url}...")
+                # try Playwright fetch first for JS-rendered pages
+                if USE_PLAYWRIGHT:
+                    try:
+                        html = await fetch_with_playwright(url, timeout=CRAWL_TIMEOUT)
+                        await add_page(url, html)
+                        _update_progress(job_id, pages_fetched=pipeline.pages_fetched)
+                        return
+                    except Exception:
+                        pass
                 try:
-                    html = await fetch_with_playwright(url, timeout=CRAWL_TIMEOUT)
-                    pages.append((url, html))
-                    continue
-                except Exception:
-                    pass
-            r = requests.get(url, timeout=CRAWL_TIMEOUT, allow_redirects=True)
-            r.raise_for_status()
-            pages.append((url, r.text))
-        except requests.RequestException as e:
-            print(f"Warning: Failed to fetch {url}: {e}")
-            continue
-    
-    if not pages:
+                    r = await client.get(url, timeout=CRAWL_TIMEOUT)
+                    r.raise_for_status()
+                except httpx.HTTPError as e:
+                    print(f"Warning: Failed to fetch {url}: {e}")
+                    return
+                await add_page(url, r.text)
+                _update_progress(job_id, pages_fetched=pipeline.pages_fetched)
+
+        await asyncio.gather(*(_fetch(url) for url in urls))
+
+    await pipeline.run(_fetch_all)
+
+    if not pipeline.pages_fetched:
         return {"status": "error", "detail": "Failed to fetch any URLs"}
-    
-    print(f"Successfully fetched {len(pages)} page(s), now processing...")
-    
-    # 2. Collect all chunks across all pages
-    all_chunks = []
-    all_urls = []
-    
-    for page_url, html_content in pages:
-        try:
-            text = html_to_text(html_content)
-            chunks = chunk_text(text)
-            all_chunks.extend(chunks)
-            all_urls.extend([page_url] * len(chunks))
-        except Exception as e:
-            print(f"Warning: Failed to process {page_url}: {e}")
-            continue
-    
-    if not all_chunks:
+
+    if not pipeline.points_upserted and not incremental:
         return {"status": "error", "detail": "No chunks extracted from URLs"}
-    
-    print(f"Total chunks extracted: {len(all_chunks)}")
-    
-    # 3. Create embeddings
-    print("Creating embeddings...")
-    embeddings = await asyncio.to_thread(embed_texts, all_chunks)
-    vector_size = len(embeddings[0]) if embeddings else 1536
-    
-    # 4. Connect to Qdrant
-    client_qdrant = get_qdrant_client()
-    
-    # 5. Create collection if it doesn't exist
-    try:
-        collections = client_qdrant.get_collections()
-        collection_exists = any(col.name == collection_name for col in collections.collections)
-    except Exception:
-        collection_exists = False
-    
-    if collection_exists:
-        print(f"Collection '{collection_name}' exists, will add/update points")
-    else:
-        print(f"Creating new collection '{collection_name}'...")
-        try:
-            client_qdrant.create_collection(
-                collection_name=collection_name,
-                vectors_config={
-                    "size": vector_size,
-                    "distance": "Cosine"
-                }
-            )
-        except Exception as e:
-            print(f"Warning: create_collection failed ({e}), attempting upsert anyway")
-    
-    # 6. Create points
-    points = []
-    for i, (chunk, page_url, vec) in enumerate(zip(all_chunks, all_urls, embeddings)):
-        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{page_url}-{i}"))
-        points.append({
-            "id": point_id,
-            "vector": vec,
-            "payload": {
-                "text": chunk,
-                "url": page_url,
-                "chunk_id": i
-            }
-        })
-    
-    # 7. Upsert points
-    print(f"Upserting {len(points)} points to Qdrant...")
-    client_qdrant.upsert(
-        collection_name=collection_name,
-        points=points
-    )
-    
-    # 8. Get final stats
-    collection_info = client_qdrant.get_collection(collection_name)
-    points_count = collection_info.points_count
-    
-    return {
-        "status": "ok",
-        "pages_indexed": len(pages),
-        "chunks_indexed": len(points),
-        "total_points_in_collection": points_count,
-        "collection": collection_name
-    }
-
-
-async def ingest_background(job_id: str, url: str = None, urls: list = None, collection_name: str = 'site_collection'):
+
+    _update_progress(job_id, message="Completed indexing")
+    return {"pages_indexed": pipeline.pages_fetched, **pipeline.result()}
+
+
+async def ingest_background(job_id: str, url: str = None, urls: list = None, collection_name: str = 'site_collection',
+                            incremental: bool = False, budget: Budget | None = None, profile: str | None = None):
     """
     Background ingest task: crawls/fetches and indexes without blocking the HTTP response.
-    Updates job status in _ingest_jobs as it progresses.
+    Updates the job in the job store as it progresses.
     """
+    store = get_job_store()
     try:
-        _ingest_jobs[job_id]["status"] = "running"
+        store.set_status(job_id, "running")
 
         async def _run_ingest():
             if urls:
-                return await ingest_urls(urls, collection_name=collection_name, job_id=job_id)
+                return await ingest_urls(urls, collection_name=collection_name, job_id=job_id, incremental=incremental,
+                                         budget=budget, profile=profile)
             elif url:
-                return await ingest_url(url, collection_name=collection_name, job_id=job_id)
+                return await ingest_url(url, collection_name=collection_name, job_id=job_id, incremental=incremental,
+                                        budget=budget, profile=profile)
             else:
                 raise ValueError("Either url or urls must be provided")
 
         try:
             res = await asyncio.wait_for(_run_ingest(), timeout=INGEST_TIMEOUT_SECONDS)
-            _ingest_jobs[job_id]["status"] = "completed"
-            _ingest_jobs[job_id]["result"] = res
+            if not store.set_status(job_id, "completed", result=res, expect="running"):
+                print(f"Ingest job {job_id} finished after it was marked as failed; keeping it failed")
         except asyncio.TimeoutError:
             msg = f"Ingest job {job_id} timed out after {INGEST_TIMEOUT_SECONDS} seconds"
             print(msg)
-            _ingest_jobs[job_id]["status"] = "failed"
-            _ingest_jobs[job_id]["error"] = msg
-            if job_id in _ingest_jobs:
-                _ingest_jobs[job_id]["progress"]["message"] = msg
+            store.set_status(job_id, "failed", error=msg, message=msg)
     except Exception as e:
         print(f"Background ingest job {job_id} failed: {e}")
-        _ingest_jobs[job_id]["status"] = "failed"
-        _ingest_jobs[job_id]["error"] = str(e)
+        store.set_status(job_id, "failed", error=str(e))
+    finally:
+        # The collection content changed (even a failed run may have written points)
+        invalidate_answers(collection_name)
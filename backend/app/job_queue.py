@@ -0,0 +1,139 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .job_store import JOB_STORE_PATH
+
+INGEST_MODE = os.getenv("INGEST_MODE", "inline").lower()  # "inline" (BackgroundTasks) or "queue" (app.worker processes)
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", JOB_STORE_PATH)  # SQLite file shared by the API and the workers
+INGEST_MAX_RUNNING = int(os.getenv("INGEST_MAX_RUNNING", 4))  # ingest jobs running at once across all workers
+INGEST_MAX_PER_COLLECTION = int(os.getenv("INGEST_MAX_PER_COLLECTION", 1))  # running jobs per collection
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", 60))  # a job is retried if its lease is not renewed
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", 3))  # leases taken before a job is given up
+
+
+class JobQueue:
+    """Ingest job queue in SQLite, shared by the API (producer) and worker processes.
+
+    A worker claims a job by taking a lease on it and renews the lease while the
+    job runs. If the worker dies, the lease expires and another worker claims
+    the job again, up to max_attempts times. Claims are made in an IMMEDIATE
+    transaction, so the global and per-collection limits on running jobs hold
+    across all workers.
+    """
+
+    def __init__(self, path: str = INGEST_QUEUE_PATH, max_running: int = INGEST_MAX_RUNNING,
+                 max_per_collection: int = INGEST_MAX_PER_COLLECTION, lease_seconds: float = INGEST_LEASE_SECONDS,
+                 max_attempts: int = INGEST_MAX_ATTEMPTS):
+        self.path = path
+        self.max_running = max(1, max_running)
+        self.max_per_collection = max(1, max_per_collection)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_queue ("
+            " job_id TEXT PRIMARY KEY, collection TEXT, params TEXT NOT NULL, enqueued_at REAL NOT NULL,"
+            " lease_owner TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_lease ON job_queue(lease_until)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_collection ON job_queue(collection, lease_until)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_job_queue_enqueued ON job_queue(enqueued_at)")
+
+    def enqueue(self, job_id: str, collection: Optional[str], params: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_queue (job_id, collection, params, enqueued_at) VALUES (?, ?, ?, ?)",
+                (job_id, collection, json.dumps(params), time.time()),
+            )
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest job that the concurrency limits allow to start.
+
+        Returns {"job_id", "collection", "params", "attempts"} or None. Jobs
+        whose lease expired are claimed again; a job over max_attempts is
+        returned with "exhausted": True (and removed) so the caller can fail it.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = self._conn.execute(
+                    "SELECT COUNT(*) FROM job_queue WHERE lease_until > ?", (now,)
+                ).fetchone()[0]
+                if running >= self.max_running:
+                    self._conn.execute("COMMIT")
+                    return None
+                row = self._conn.execute(
+                    "SELECT job_id, collection, params, attempts FROM job_queue q"
+                    " WHERE (lease_until IS NULL OR lease_until <= ?)"
+                    " AND (SELECT COUNT(*) FROM job_queue r WHERE r.collection IS q.collection"
+                    "      AND r.lease_until > ?) < ?"
+                    " ORDER BY enqueued_at LIMIT 1",
+                    (now, now, self.max_per_collection),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job_id, collection, params, attempts = row
+                if attempts >= self.max_attempts:
+                    self._conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+                else:
+                    self._conn.execute(
+                        "UPDATE job_queue SET lease_owner = ?, lease_until = ?, attempts = attempts + 1"
+                        " WHERE job_id = ?",
+                        (owner, now + self.lease_seconds, job_id),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"job_id": job_id, "collection": collection, "params": json.loads(params),
+                "attempts": attempts + 1, "exhausted": attempts >= self.max_attempts}
+
+    def renew(self, job_id: str, owner: str) -> bool:
+        """Extend the lease; False if the job is no longer leased by `owner`."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE job_queue SET lease_until = ? WHERE job_id = ? AND lease_owner = ?",
+                (time.time() + self.lease_seconds, job_id, owner),
+            ).rowcount > 0
+
+    def complete(self, job_id: str, owner: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM job_queue WHERE job_id = ? AND lease_owner = ?", (job_id, owner))
+
+    def release(self, job_id: str, owner: str) -> None:
+        """Give the job back (worker shutting down): it can be claimed again right away."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_queue SET lease_owner = NULL, lease_until = NULL, attempts = MAX(0, attempts - 1)"
+                " WHERE job_id = ? AND lease_owner = ?",
+                (job_id, owner),
+            )
+
+    def stats(self) -> Dict[str, int]:
+        now = time.time()
+        with self._lock:
+            queued, running = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(lease_until > ?), 0) FROM job_queue", (now,)
+            ).fetchone()
+        return {"queued": queued - running, "running": running}
+
+
+_queue = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(INGEST_QUEUE_PATH)
+    return _queue
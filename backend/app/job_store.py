@@ -0,0 +1,382 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_STORE = os.getenv("JOB_STORE", "sqlite").lower()  # "sqlite" (shared by all workers) or "memory"
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "/app/data/jobs.sqlite3")
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))  # finished jobs older than this are evicted
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", 10000))  # finished jobs kept at most (most recent first)
+JOB_EVICT_INTERVAL = 60  # seconds between eviction passes
+
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def _new_job(job_id: str, mode: str, target: str, collection: Optional[str], now: float) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "status": "pending",
+        "mode": mode,  # "url", "urls", or "crawl"
+        "target": target,  # URL or list representation
+        "collection": collection,  # Collection name for this job
+        "created_at": now,
+        "started_at": None,  # when it last moved to running, for the safety timeout in the status endpoint
+        "updated_at": now,
+        "progress": {
+            "pages_fetched": 0,
+            "chunks_extracted": 0,
+            "embeddings_created": 0,
+            "points_upserted": 0,
+            "message": "Pending"
+        },
+        "error": None,
+        "result": None
+    }
+
+
+class _Listeners:
+    """In-process change notifications: listeners are called with the job id after every write.
+
+    Writes made by other processes (queue workers) are not seen here; readers
+    pick those up with changed_since().
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[str], None]] = []
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[str], None]) -> None:
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, job_id: str) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(job_id)
+            except Exception as e:
+                print(f"Warning: job listener failed: {e}")
+
+
+class MemoryJobStore(_Listeners):
+    """Job store for a single process (tests, development).
+
+    Jobs are kept in creation order, with an index of active job ids per
+    collection and a recency list of updates, so lookups are O(1) and
+    listings O(limit).
+    """
+
+    def __init__(self, retention: float = JOB_RETENTION_SECONDS, max_finished: int = JOB_MAX_FINISHED):
+        super().__init__()
+        self.retention = retention
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._updated: "OrderedDict[str, None]" = OrderedDict()  # job ids, least recently updated first
+        self._active: Dict[str, Dict[str, None]] = {}  # collection -> active job ids, oldest first
+        self._collections_updated: Dict[str, float] = {}  # collection -> when its content last changed
+        self._finished = 0
+        self._last_evict = 0.0
+
+    def create(self, job_id: str, mode: str, target: str, collection: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        job = _new_job(job_id, mode, target, collection, now)
+        with self._lock:
+            self._jobs[job_id] = job
+            self._updated[job_id] = None
+            self._active.setdefault(collection, {})[job_id] = None
+            if now - self._last_evict >= JOB_EVICT_INTERVAL:
+                self._evict(now)
+            job = copy.deepcopy(job)
+        self._notify(job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def update_progress(self, job_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job["progress"].update(fields)
+            job["updated_at"] = time.time()
+            self._updated.move_to_end(job_id)
+        self._notify(job_id)
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None, result: Any = None,
+                   message: Optional[str] = None, expect: Optional[str] = None) -> bool:
+        """Change the job status (only if it is currently `expect`, when given); True if it changed."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (expect is not None and job["status"] != expect):
+                return False
+            was_active = job["status"] in ACTIVE_STATUSES
+            now = time.time()
+            job.update(status=status, error=error, result=result, updated_at=now)
+            if status == "running":
+                job["started_at"] = now
+            self._updated.move_to_end(job_id)
+            if message is not None:
+                job["progress"]["message"] = message
+            if was_active and status not in ACTIVE_STATUSES:
+                active = self._active.get(job["collection"], {})
+                active.pop(job_id, None)
+                if not active:
+                    self._active.pop(job["collection"], None)
+                self._finished += 1
+        self._notify(job_id)
+        return True
+
+    def active(self, collection: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            collections = [collection] if collection is not None else list(self._active)
+            return [copy.deepcopy(self._jobs[job_id])
+                    for c in collections for job_id in self._active.get(c, {})]
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = []
+            for job in reversed(self._jobs.values()):
+                if len(jobs) >= limit:
+                    break
+                jobs.append(copy.deepcopy(job))
+            return jobs
+
+    def changed_since(self, since: float, collection: Optional[str] = None,
+                      job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Jobs updated at or after `since`, least recently updated first."""
+        with self._lock:
+            jobs = []
+            for updated_id in reversed(self._updated):
+                job = self._jobs[updated_id]
+                if job["updated_at"] < since:
+                    break
+                if (collection is None or job["collection"] == collection) and job_id in (None, updated_id):
+                    jobs.append(copy.deepcopy(job))
+            return jobs[::-1]
+
+    def mark_collection_updated(self, collection: str) -> None:
+        with self._lock:
+            self._collections_updated[collection] = time.time()
+
+    def collection_updated_at(self, collection: str) -> Optional[float]:
+        with self._lock:
+            return self._collections_updated.get(collection)
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._evict(time.time())
+
+    def _evict(self, now: float) -> int:
+        self._last_evict = now
+        cutoff = now - self.retention
+        evicted = 0
+        for job_id in list(self._jobs):  # oldest first
+            job = self._jobs[job_id]
+            if job["created_at"] >= cutoff and self._finished <= self.max_finished:
+                break
+            if job["status"] not in ACTIVE_STATUSES:
+                del self._jobs[job_id]
+                del self._updated[job_id]
+                self._finished -= 1
+                evicted += 1
+        return evicted
+
+
+class SQLiteJobStore(_Listeners):
+    """Job store in an embedded SQLite database, shared by every worker process.
+
+    Indexed on (collection, status), (status, created_at), created_at and
+    updated_at, so status lookups, active, recent and changed jobs stay cheap
+    with many jobs.
+    Progress updates patch the JSON document in a single UPDATE, so
+    concurrent writers never lose each other's fields. Finished jobs are
+    evicted after `retention` seconds or beyond `max_finished`.
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, retention: float = JOB_RETENTION_SECONDS,
+                 max_finished: int = JOB_MAX_FINISHED):
+        super().__init__()
+        self.path = path
+        self.retention = retention
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " job_id TEXT PRIMARY KEY, status TEXT NOT NULL, mode TEXT, target TEXT, collection TEXT,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL,"
+            " progress TEXT NOT NULL DEFAULT '{}', error TEXT, result TEXT, started_at REAL)"
+        )
+        try:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN started_at REAL")  # databases created before it
+        except sqlite3.OperationalError:
+            pass  # already there
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_collection_status ON jobs(collection, status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs(created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS collection_updates (collection TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+        )
+
+    _COLUMNS = "job_id, status, mode, target, collection, created_at, started_at, updated_at, progress, error, result"
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        job_id, status, mode, target, collection, created_at, started_at, updated_at, progress, error, result = row
+        return {
+            "job_id": job_id, "status": status, "mode": mode, "target": target, "collection": collection,
+            "created_at": created_at, "started_at": started_at, "updated_at": updated_at,
+            "progress": json.loads(progress),
+            "error": error, "result": json.loads(result) if result is not None else None,
+        }
+
+    def create(self, job_id: str, mode: str, target: str, collection: Optional[str] = None) -> Dict[str, Any]:
+        now = time.time()
+        job = _new_job(job_id, mode, target, collection, now)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO jobs ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, NULL, ?, ?, NULL, NULL)",
+                (job_id, job["status"], mode, target, collection, now, now, json.dumps(job["progress"])),
+            )
+            if now - self._last_evict >= JOB_EVICT_INTERVAL:
+                self._evict(now)
+        self._notify(job_id)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def update_progress(self, job_id: str, fields: Dict[str, Any]) -> None:
+        if not fields:
+            return
+        paths = ", ".join("?, json(?)" for _ in fields)
+        params: List[Any] = []
+        for key, value in fields.items():
+            params += [f'$."{key}"', json.dumps(value)]
+        with self._lock:
+            updated = self._conn.execute(
+                f"UPDATE jobs SET progress = json_set(progress, {paths}), updated_at = ? WHERE job_id = ?",
+                (*params, time.time(), job_id),
+            ).rowcount
+        if updated:
+            self._notify(job_id)
+
+    def set_status(self, job_id: str, status: str, error: Optional[str] = None, result: Any = None,
+                   message: Optional[str] = None, expect: Optional[str] = None) -> bool:
+        """Change the job status (only if it is currently `expect`, when given); True if it changed."""
+        now = time.time()
+        sql = "UPDATE jobs SET status = ?, error = ?, result = ?, updated_at = ?"
+        params: List[Any] = [status, error, json.dumps(result) if result is not None else None, now]
+        if status == "running":
+            sql += ", started_at = ?"
+            params.append(now)
+        if message is not None:
+            sql += ", progress = json_set(progress, '$.message', ?)"
+            params.append(message)
+        sql += " WHERE job_id = ?"
+        params.append(job_id)
+        if expect is not None:
+            sql += " AND status = ?"
+            params.append(expect)
+        with self._lock:
+            changed = self._conn.execute(sql, params).rowcount > 0
+        if changed:
+            self._notify(job_id)
+        return changed
+
+    def active(self, collection: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = f"SELECT {self._COLUMNS} FROM jobs WHERE status IN ('pending', 'running')"
+        params: tuple = ()
+        if collection is not None:
+            sql += " AND collection = ?"
+            params = (collection,)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY created_at", params).fetchall()
+        return [self._row(r) for r in rows]
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (max(0, limit),)
+            ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def changed_since(self, since: float, collection: Optional[str] = None,
+                      job_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Jobs updated at or after `since`, least recently updated first."""
+        sql = f"SELECT {self._COLUMNS} FROM jobs WHERE updated_at >= ?"
+        params: List[Any] = [since]
+        if collection is not None:
+            sql += " AND collection = ?"
+            params.append(collection)
+        if job_id is not None:
+            sql += " AND job_id = ?"
+            params.append(job_id)
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY updated_at", params).fetchall()
+        return [self._row(r) for r in rows]
+
+    def mark_collection_updated(self, collection: str) -> None:
+        """Record that the collection's content changed (read by the answer caches of every process)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO collection_updates (collection, updated_at) VALUES (?, ?)",
+                (collection, time.time()),
+            )
+
+    def collection_updated_at(self, collection: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_at FROM collection_updates WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._evict(time.time())
+
+    def _evict(self, now: float) -> int:
+        self._last_evict = now
+        finished = "status NOT IN ('pending', 'running')"
+        evicted = self._conn.execute(
+            f"DELETE FROM jobs WHERE {finished} AND created_at < ?", (now - self.retention,)
+        ).rowcount
+        evicted += self._conn.execute(
+            f"DELETE FROM jobs WHERE job_id IN ("
+            f" SELECT job_id FROM jobs WHERE {finished} ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_finished,),
+        ).rowcount
+        if evicted:
+            print(f"Job store: evicted {evicted} finished job(s)")
+        return evicted
+
+
+_store = None
+
+
+def get_job_store():
+    """Shared job store (JOB_STORE=sqlite by default, memory for a single process)."""
+    global _store
+    if _store is None:
+        if JOB_STORE == "memory":
+            _store = MemoryJobStore()
+        else:
+            _store = SQLiteJobStore(JOB_STORE_PATH)
+    return _store
@@ -0,0 +1,91 @@
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+from qdrant_client import models
+
+RAG_HYBRID = os.getenv("RAG_HYBRID", "true").lower() == "true"  # index BM25 sparse vectors and fuse them with dense search
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))  # term frequency saturation
+BM25_B = float(os.getenv("BM25_B", 0.75))  # document length normalization
+BM25_AVG_LENGTH = float(os.getenv("BM25_AVG_LENGTH", 200))  # expected terms per chunk (chunks are token-budgeted)
+RAG_RERANK_WEIGHT = float(os.getenv("RAG_RERANK_WEIGHT", 0.5))  # share of the lexical score in the reranked order
+
+# Words, plus codes joined by "-", "." or "/" (SKUs, versions, error codes), which are also indexed whole
+_TOKEN = re.compile(r"\w+(?:[-./]\w+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do does for from has have how i in is it its me my of on or our so "
+    "that the their them there these they this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms for lexical matching; "AB-1234" yields "ab-1234", "ab" and "1234"."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        parts = re.split(r"[-./]", token)
+        if len(parts) > 1:
+            terms.append(token)
+        terms.extend(p for p in parts if p and (len(p) > 1 or p.isdigit()) and p not in _STOPWORDS)
+    return terms
+
+
+def _index(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "big")
+
+
+def bm25_vector(text: str) -> models.SparseVector:
+    """Document side of BM25: saturated, length-normalized term frequencies.
+
+    Qdrant multiplies them by the IDF of each term at query time (the sparse
+    vector is configured with Modifier.IDF), so collection statistics never
+    have to be computed at ingest.
+    """
+    counts = Counter(tokenize(text))
+    length = sum(counts.values())
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / BM25_AVG_LENGTH)
+    weights: Dict[int, float] = {}
+    for term, tf in counts.items():
+        index = _index(term)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + norm)
+    return models.SparseVector(indices=list(weights), values=list(weights.values()))
+
+
+def bm25_query(text: str) -> models.SparseVector:
+    """Query side of BM25: each distinct term once."""
+    indices = sorted({_index(term) for term in tokenize(text)})
+    return models.SparseVector(indices=indices, values=[1.0] * len(indices))
+
+
+def rerank(question: str, snippets: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+    """Reorder retrieved snippets by query term coverage and keep the top_k.
+
+    Each snippet gets the share of the question's terms it contains, each term
+    weighted by its rarity among the candidates (codes and numbers count
+    double), blended with its min-max normalized retrieval score. Cheap
+    enough to run on every question on the CPU; it favours chunks that
+    mention the exact names and codes asked about.
+    """
+    query_terms = set(tokenize(question))
+    if len(snippets) <= 1 or not query_terms:
+        return snippets[:top_k]
+
+    doc_terms = [set(tokenize(f"{s.get('section') or ''} {s.get('text') or ''}")) for s in snippets]
+    n = len(snippets)
+    weights = {}
+    for term in query_terms:
+        df = sum(term in terms for terms in doc_terms)
+        weights[term] = math.log(1 + n / (1 + df)) * (2.0 if any(c.isdigit() for c in term) or "-" in term else 1.0)
+    total = sum(weights.values()) or 1.0
+
+    scores = [s.get("score") or 0.0 for s in snippets]
+    low, high = min(scores), max(scores)
+    ranked = []
+    for snippet, terms, score in zip(snippets, doc_terms, scores):
+        coverage = sum(w for term, w in weights.items() if term in terms) / total
+        retrieval = (score - low) / (high - low) if high > low else 1.0
+        ranked.append({**snippet, "rerank_score": (1 - RAG_RERANK_WEIGHT) * retrieval + RAG_RERANK_WEIGHT * coverage})
+    ranked.sort(key=lambda s: -s["rerank_score"])
+    return ranked[:top_k]
@@ -1,19 +1,58 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
 import os
+import json
+import time
 from typing import Optional, List
-from .ingest import ingest_url, ingest_urls, crawl_site, ingest_background, _get_job_status, _create_job, _get_collection_active_ingests, embed_texts, _active_collection_ingests, _ingest_jobs
-from .qdrant_client import get_qdrant_client
+from .ingest import ingest_background, _get_job_status, _create_job, _get_collection_active_ingests, _check_timeout, _timeout_at
+from .job_queue import INGEST_MODE, get_job_queue
+from .job_store import JOB_STORE, get_job_store
+from .embeddings import aembed_query
+from .embedding_cache import get_embedding_cache, get_query_embedding_cache
+from .answer_cache import get_answer_cache
+from .qdrant_client import (
+    get_qdrant_client, get_async_qdrant_client, close_async_qdrant_client, list_collections, resolve_collection,
+    apply_profile, tenant_filter, QDRANT_SHARED_COLLECTION, QDRANT_TENANCY,
+)
+from .http_client import get_http_client, close_http_client
+from .browser_pool import close_browser_pool
+from .budget import Budget
+from .processing import get_page_processor, close_page_processor
+from .profiles import PROFILES, get_profile, profile_of
 import uuid
-from .rag import query_and_build_context, call_llm_with_context
+from contextlib import asynccontextmanager
+from .rag import aquery_and_build_context, acall_llm_with_context, astream_llm_with_context, get_async_llm_client, close_async_llm_client
 
 # Production root path support (set to /iSdelal on server)
 ROOT_PATH = os.getenv("ROOT_PATH", "")  # Default empty for development
+INGEST_EVENTS_POLL_INTERVAL = float(os.getenv("INGEST_EVENTS_POLL_INTERVAL", 1.0))  # seconds; picks up updates from worker processes
+INGEST_EVENTS_KEEPALIVE = 15  # seconds between keep-alive comments on an idle event stream
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared async clients (connection pools) are created once at startup
+    get_http_client()
+    get_async_qdrant_client()
+    get_async_llm_client()
+    if INGEST_MODE != "queue":
+        get_page_processor()  # start extraction worker processes before the first ingest (queue workers start their own)
+    if INGEST_MODE == "queue" and JOB_STORE == "memory":
+        print("Warning: INGEST_MODE=queue needs a shared job store, JOB_STORE=memory is not visible to workers")
+    # Chromium is launched lazily by the first Playwright fetch and shared afterwards
+    yield
+    await close_browser_pool()
+    close_page_processor()
+    await close_async_llm_client()
+    await close_async_qdrant_client()
+    await close_http_client()
 
-app = FastAPI(root_path=ROOT_PATH)
+
+app = FastAPI(root_path=ROOT_PATH, lifespan=lifespan)
 
 # Add CORS middleware - more secure configuration
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:8080,http://localhost:8000,http://localhost:4173,http://localhost:4174").split(",")
@@ -22,7 +61,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"] if os.getenv("ALLOW_ALL_ORIGINS", "false").lower() == "true" else allowed_origins,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "OPTIONS"],  # Added GET for frontend route
+    allow_methods=["GET", "POST", "PUT", "OPTIONS"],  # Added GET for frontend route, PUT for collection profiles
     allow_headers=["*"],
 )
 
@@ -39,11 +78,25 @@ class IngestRequest(BaseModel):
     url: Optional[str] = None
     urls: Optional[List[str]] = None
     collection: str = 'site_collection'
+    incremental: bool = False  # only re-index pages that changed since the last ingest
+    # Embedding budget of this job (0 = unlimited); unset = server defaults (INGEST_MAX_*) for crawls, unlimited for URL lists
+    max_chunks: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_cost: Optional[float] = None  # USD, converted to tokens with EMBED_COST_PER_MILLION_TOKENS
+    profile: Optional[str] = None  # collection profile (quantization, on-disk storage, HNSW); unset = keep the current one
+
+class ProfileRequest(BaseModel):
+    profile: str
 
 class ChatRequest(BaseModel):
     question: str
     collection: str = 'site_collection'
 
+def _job_budget(req: IngestRequest) -> Optional[Budget]:
+    if req.max_chunks is None and req.max_tokens is None and req.max_cost is None:
+        return None
+    return Budget.from_limits(req.max_chunks, req.max_tokens, req.max_cost)
+
 @app.post('/ingest')
 async def ingest(req: IngestRequest, background_tasks: BackgroundTasks = None):
     try:
@@ -59,18 +112,34 @@ async def ingest(req: IngestRequest, background_tasks: BackgroundTasks = None):
             target = req.url
         else:
             raise HTTPException(status_code=400, detail="Either 'url' or 'urls' must be provided")
+        if req.profile is not None and req.profile not in PROFILES:
+            raise HTTPException(status_code=400, detail=f"Unknown profile '{req.profile}' (available: {', '.join(PROFILES)})")
         
         # Create the job record with collection
         _create_job(job_id, mode, target, req.collection)
         
-        # Submit background task
-        if background_tasks:
+        budget = _job_budget(req)
+        if INGEST_MODE == "queue":
+            # Picked up by a worker process (python -m app.worker)
+            get_job_queue().enqueue(job_id, req.collection, {
+                "url": req.url,
+                "urls": req.urls,
+                "collection_name": req.collection,
+                "incremental": req.incremental,
+                "budget": budget.to_dict() if budget else None,
+                "profile": req.profile,
+            })
+        elif background_tasks:
+            # Submit background task
             background_tasks.add_task(
                 ingest_background,
                 job_id,
                 url=req.url,
                 urls=req.urls,
-                collection_name=req.collection
+                collection_name=req.collection,
+                incremental=req.incremental,
+                budget=budget,
+                profile=req.profile,
             )
         
         # Return immediately with 202 Accepted
@@ -95,46 +164,28 @@ async def ingest_status(job_id: str):
 async def get_active_ingestions():
     """Get all active ingestion processes across all collections."""
     active_processes = []
+    for job_info in _get_collection_active_ingests(None):
+        active_processes.append({
+            "job_id": job_info["job_id"],
+            "collection": job_info.get("collection"),
+            "url": job_info.get("target", ""),
+            "status": job_info.get("status", "unknown"),
+            "progress": job_info.get("progress", {}),
+            "created_at": job_info.get("created_at")
+        })
 
-    # Check all collections for active ingests
-    for collection_name in _active_collection_ingests:
-        active_jobs = _get_collection_active_ingests(collection_name)
-        for job_info in active_jobs:
-            process_info = {
-                "job_id": None,  # Find job_id from status
-                "collection": collection_name,
-                "url": job_info.get("target", ""),
-                "status": job_info.get("status", "unknown"),
-                "progress": job_info.get("progress", {}),
-                "created_at": job_info.get("created_at")
-            }
-
-            # Find matching job_id
-            for job_id, job_data in _ingest_jobs.items():
-                if (job_data.get("collection") == collection_name and
-                    job_data.get("status") in ["pending", "running"]):
-                    process_info["job_id"] = job_id
-                    break
-
-            active_processes.append(process_info)
-
-    return {"active_processes": active_processes}
+    response = {"active_processes": active_processes}
+    if INGEST_MODE == "queue":
+        response["queue"] = get_job_queue().stats()
+    return response
 
 @app.get('/ingest/jobs')
 async def get_all_ingestions(limit: int = 10):
     """Get recent ingestion jobs across all collections."""
     recent_jobs = []
-
-    # Sort jobs by creation time (most recent first)
-    sorted_jobs = sorted(
-        _ingest_jobs.items(),
-        key=lambda x: x[1].get("created_at", 0),
-        reverse=True
-    )[:limit]
-
-    for job_id, job_data in sorted_jobs:
+    for job_data in get_job_store().recent(limit):
         recent_jobs.append({
-            "job_id": job_id,
+            "job_id": job_data["job_id"],
             "collection": job_data.get("collection"),
             "url": job_data.get("target", ""),
             "status": job_data.get("status", "unknown"),
@@ -146,57 +197,233 @@ async def get_all_ingestions(limit: int = 10):
 
     return {"jobs": recent_jobs}
 
-@app.post('/chat')
-async def chat(req: ChatRequest):
-    # Check if there are any active ingest processes for this collection
-    active_ingests = _get_collection_active_ingests(req.collection)
+def _job_event(job: dict) -> tuple:
+    event = "done" if job.get("status") in ("completed", "failed") else "progress"
+    data = {
+        "job_id": job.get("job_id"),
+        "collection": job.get("collection"),
+        "url": job.get("target", ""),
+        "status": job.get("status"),
+        "progress": job.get("progress", {}),
+        "created_at": job.get("created_at"),
+    }
+    if event == "done":
+        data.update(error=job.get("error"), result=job.get("result"))
+    return event, data
 
-    if active_ingests:
-        # Return processing status instead of answering
-        active_ingest = active_ingests[0]  # Take first active ingest
-        progress = active_ingest.get("progress", {})
-        pages_fetched = progress.get("pages_fetched", 0)
-        message = progress.get("message", "Processing website content...")
+@app.get('/ingest/events')
+async def ingest_events(request: Request, job_id: Optional[str] = None, collection: Optional[str] = None):
+    """Server-sent events with ingest progress, instead of polling /ingest/status and /ingest/active.
+
+    Streams one job (`job_id`), the jobs of a `collection`, or all jobs. On
+    connect the current state of the job (or of every active job) is sent,
+    then a `progress` event whenever a job's status or counters change and a
+    `done` event (with error / result) when it finishes. A job_id stream
+    closes after its `done` event; an unknown job_id gets an `error` event.
+    """
+    store = get_job_store()
+    changed = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def _wake(_job_id: str) -> None:
+        loop.call_soon_threadsafe(changed.set)
+
+    async def events():
+        store.add_listener(_wake)
+        sent = {}  # job_id -> last (status, progress) sent
+        timeouts = {}  # job_id -> time a job sent as running exceeds the ingest timeout
+        try:
+            since = time.time()
+            if job_id is not None:
+                job = _get_job_status(job_id)
+                if job.get("status") == "not_found":
+                    yield _sse("error", {"detail": f"Job {job_id} not found"})
+                    return
+                jobs = [job]
+            else:
+                jobs = _get_collection_active_ingests(collection)
+            last_sent = time.monotonic()
+            while True:
+                for job in jobs:
+                    snapshot = (job.get("status"), job.get("progress"))
+                    if sent.get(job["job_id"]) == snapshot:
+                        continue
+                    sent[job["job_id"]] = snapshot
+                    timeout_at = _timeout_at(job)
+                    if timeout_at is None:
+                        timeouts.pop(job["job_id"], None)
+                    else:
+                        timeouts[job["job_id"]] = timeout_at
+                    event, data = _job_event(job)
+                    yield _sse(event, data)
+                    last_sent = time.monotonic()
+                    if event == "done" and job_id is not None:
+                        return
+                if await request.is_disconnected():
+                    return
+                # Woken right away by writes in this process, by the poll interval for worker processes
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=INGEST_EVENTS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+                jobs = store.changed_since(since, collection=collection, job_id=job_id)
+                if jobs:
+                    since = jobs[-1]["updated_at"]
+                jobs = [_check_timeout(job) for job in jobs]
+                # A job whose worker died is never written again: time it out here
+                now = time.time()
+                changed_ids = {job["job_id"] for job in jobs}
+                for overdue in [j for j, at in timeouts.items() if at < now and j not in changed_ids]:
+                    del timeouts[overdue]
+                    job = _get_job_status(overdue)
+                    if job.get("status") != "not_found":
+                        jobs.append(job)
+                if not jobs and time.monotonic() - last_sent >= INGEST_EVENTS_KEEPALIVE:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+        finally:
+            store.remove_listener(_wake)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _processing_response(collection: str) -> Optional[dict]:
+    """Processing status to return instead of an answer while the first ingest of a collection runs.
+
+    Only called when the search found nothing: re-ingests build a new version
+    of the collection aside, so chat keeps answering from the live one.
+    """
+    active_ingests = _get_collection_active_ingests(collection)
+    if not active_ingests:
+        return None
+
+    active_ingest = active_ingests[0]  # Take first active ingest
+    progress = active_ingest.get("progress", {})
+    pages_fetched = progress.get("pages_fetched", 0)
+    message = progress.get("message", "Processing website content...")
+
+    return {
+        'answer': f'🕒 AI is currently processing your website content. Status: {message} ({pages_fetched} pages indexed so far). Please check back in a few minutes when training is complete.',
+        'status': 'processing',
+        'progress': progress
+    }
 
-        return {
-            'answer': f'🕒 AI is currently processing your website content. Status: {message} ({pages_fetched} pages indexed so far). Please check back in a few minutes when training is complete.',
-            'status': 'processing',
-            'progress': progress
-        }
 
-    # No active ingest processes - proceed with normal chat
+def _cached_answer(req: ChatRequest, q_emb: List[float]) -> Optional[dict]:
+    cache = get_answer_cache()
+    return cache.lookup(req.collection, req.question, q_emb) if cache is not None else None
+
+
+def _remember_answer(req: ChatRequest, q_emb: List[float], answer: str, snippets: list) -> None:
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.store(req.collection, req.question, q_emb, answer, _sources(snippets))
+
+
+def _sources(snippets: list) -> List[str]:
+    return list(dict.fromkeys(s["url"] for s in snippets if s.get("url")))
+
+
+@app.post('/chat')
+async def chat(req: ChatRequest):
     # 1) embed question
-    embs = embed_texts([req.question])
-    q_emb = embs[0]
-    # 2) query qdrant
-    snippets = query_and_build_context(q_emb, collection_name=req.collection)
-    # 3) call LLM with context
-    res = call_llm_with_context(req.question, snippets)
+    q_emb = await aembed_query(req.question)
+    # 2) answer a semantically identical question from the cache
+    cached = _cached_answer(req, q_emb)
+    if cached:
+        return {'answer': cached['answer'], 'status': 'ready'}
+    # 3) query qdrant (the live version of the collection, also while it is re-ingested)
+    snippets = await aquery_and_build_context(q_emb, collection_name=req.collection, question=req.question)
+    if not snippets:
+        processing = _processing_response(req.collection)
+        if processing:
+            return processing
+    # 4) call LLM with context
+    res = await acall_llm_with_context(req.question, snippets)
+    _remember_answer(req, q_emb, res['answer'], snippets)
     return {'answer': res['answer'], 'status': 'ready'}
 
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post('/chat/stream')
+async def chat_stream(req: ChatRequest):
+    """Streaming /chat: server-sent events with answer tokens as the LLM produces them.
+
+    Events: `token` ({"delta": text}) while generating, then `sources`
+    ({"sources": [urls]}) and `done` ({"status": "ready"}). While the first
+    ingest of the collection runs a single `done` event carries the processing response.
+    Failures are reported as an `error` event.
+    """
+    async def events():
+        try:
+            q_emb = await aembed_query(req.question)
+            cached = _cached_answer(req, q_emb)
+            if cached:
+                yield _sse("token", {"delta": cached["answer"]})
+                yield _sse("sources", {"sources": cached["sources"]})
+                yield _sse("done", {"status": "ready", "cached": True})
+                return
+            snippets = await aquery_and_build_context(q_emb, collection_name=req.collection, question=req.question)
+            processing = None if snippets else _processing_response(req.collection)
+            if processing:
+                yield _sse("done", processing)
+                return
+            parts = []
+            async for delta in astream_llm_with_context(req.question, snippets):
+                parts.append(delta)
+                yield _sse("token", {"delta": delta})
+            _remember_answer(req, q_emb, "".join(parts), snippets)
+            yield _sse("sources", {"sources": _sources(snippets)})
+            yield _sse("done", {"status": "ready"})
+        except Exception as e:
+            print(f"Streaming chat failed: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get('/collections')
 async def get_collections():
-    """Get list of available collections from Qdrant."""
+    """Get list of available collections from Qdrant (aliases, not their versions; tenants in shared tenancy)."""
     try:
         client = get_qdrant_client()
-        collections_response = client.get_collections()
         return {
             "collections": [
-                {"name": col.name} for col in collections_response.collections
+                {"name": name} for name in list_collections(client)
             ]
         }
     except Exception as e:
         print(f"Error getting collections: {e}")
         return {"collections": []}
 
+@app.get('/collections/profiles')
+async def get_collection_profiles():
+    """Collection profiles that /ingest and PUT /collections/{name}/profile accept."""
+    return {"profiles": [p.to_dict() for p in PROFILES.values()], "default": get_profile().name}
+
 @app.get('/collections/{collection_name}')
 async def get_collection_info(collection_name: str):
-    """Get information about a specific collection."""
+    """Get information about a specific collection (or tenant of the shared collection)."""
     try:
         client = get_qdrant_client()
-        collection_info = client.get_collection(collection_name)
+        version = resolve_collection(client, collection_name)
+        if version is None and QDRANT_TENANCY == "shared":
+            return _tenant_info(client, collection_name)
+        if version is None:
+            raise ValueError("no such collection or alias")
+        collection_info = client.get_collection(version)
+        profile = profile_of(collection_info)
         return {
             "name": collection_name,
+            "version": version,
+            "profile": profile.name if profile else None,
             "points_count": collection_info.points_count,
             "indexed_vectors_count": collection_info.indexed_vectors_count if hasattr(collection_info, 'indexed_vectors_count') else 0
         }
@@ -204,6 +431,55 @@ async def get_collection_info(collection_name: str):
         print(f"Error getting collection info for {collection_name}: {e}")
         raise HTTPException(status_code=404, detail=f"Collection {collection_name} not found")
 
+def _tenant_info(client, tenant: str) -> dict:
+    """Collection info of a site stored in the shared collection; ValueError if it has no points there."""
+    points_count = client.count(QDRANT_SHARED_COLLECTION, count_filter=tenant_filter(tenant), exact=True).count
+    if not points_count:
+        raise ValueError("no such tenant")
+    profile = profile_of(client.get_collection(QDRANT_SHARED_COLLECTION))
+    return {
+        "name": tenant,
+        "version": QDRANT_SHARED_COLLECTION,
+        "tenant": tenant,
+        "profile": profile.name if profile else None,
+        "points_count": points_count,
+        "indexed_vectors_count": points_count,  # Qdrant only counts indexed vectors per collection
+    }
+
+@app.put('/collections/{collection_name}/profile')
+async def set_collection_profile(collection_name: str, req: ProfileRequest):
+    """Migrate the live version of a collection to another profile, in place.
+
+    Qdrant re-quantizes and re-indexes in the background; search keeps working meanwhile.
+    """
+    if req.profile not in PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile '{req.profile}' (available: {', '.join(PROFILES)})")
+    client = get_qdrant_client()
+    if QDRANT_TENANCY == "shared" and collection_name != QDRANT_SHARED_COLLECTION \
+            and await asyncio.to_thread(resolve_collection, client, collection_name) is None:
+        raise HTTPException(status_code=400, detail=f"'{collection_name}' is stored in the shared collection: "
+                                                    f"set the profile of '{QDRANT_SHARED_COLLECTION}' instead")
+    try:
+        version = await asyncio.to_thread(apply_profile, client, collection_name, PROFILES[req.profile])
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        print(f"Error changing profile of {collection_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"name": collection_name, "version": version, "profile": req.profile}
+
+@app.get('/cache/stats')
+async def cache_stats():
+    """Hit/miss counters of the embedding and answer caches."""
+    cache = get_embedding_cache()
+    queries = get_query_embedding_cache()
+    answers = get_answer_cache()
+    return {
+        "embedding_cache": cache.stats() if cache is not None else {"enabled": False},
+        "query_embedding_cache": queries.stats() if queries is not None else {"enabled": False},
+        "answer_cache": answers.stats() if answers is not None else {"enabled": False},
+    }
+
 @app.get('/health')
 @app.head('/health')
 async def health():
@@ -0,0 +1,103 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable
+
+PAGE_STATE_PATH = os.getenv("PAGE_STATE_PATH", "/app/data/page_state.sqlite3")
+
+
+class PageStateStore:
+    """Per-collection record of what was indexed for each page.
+
+    Stores the HTTP validators (ETag / Last-Modified) and a hash of the
+    extracted text, so incremental re-ingests can send conditional requests
+    and skip pages whose content did not change. Outgoing links are kept too:
+    a 304 response has no body, but the crawler still needs to follow them.
+    """
+
+    def __init__(self, path: str = PAGE_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS page_state ("
+            " collection TEXT NOT NULL, url TEXT NOT NULL,"
+            " etag TEXT, last_modified TEXT, content_hash TEXT,"
+            " links TEXT NOT NULL DEFAULT '[]', chunk_count INTEGER NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (collection, url))"
+        )
+
+    def load(self, collection: str) -> Dict[str, Dict[str, Any]]:
+        """Return {url: record} for every page known in the collection."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, etag, last_modified, content_hash, links, chunk_count"
+                " FROM page_state WHERE collection = ?",
+                (collection,),
+            ).fetchall()
+        return {
+            url: {
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_hash": content_hash,
+                "links": json.loads(links or "[]"),
+                "chunk_count": chunk_count,
+            }
+            for url, etag, last_modified, content_hash, links, chunk_count in rows
+        }
+
+    def save(self, collection: str, records: Dict[str, Dict[str, Any]]) -> None:
+        now = time.time()
+        rows = [
+            (
+                collection, url, r.get("etag"), r.get("last_modified"), r.get("content_hash"),
+                json.dumps(r.get("links") or []), int(r.get("chunk_count") or 0), now,
+            )
+            for url, r in records.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO page_state"
+                " (collection, url, etag, last_modified, content_hash, links, chunk_count, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete(self, collection: str, urls: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM page_state WHERE collection = ? AND url = ?",
+                [(collection, u) for u in urls],
+            )
+
+
+_store = None
+
+
+def get_page_state_store() -> PageStateStore:
+    global _store
+    if _store is None:
+        _store = PageStateStore(PAGE_STATE_PATH)
+    return _store
+
+
+def conditional_headers(record: Dict[str, Any] | None) -> Dict[str, str]:
+    """Headers for a conditional GET based on the validators we stored last time."""
+    headers = {}
+    if record:
+        if record.get("etag"):
+            headers["If-None-Match"] = record["etag"]
+        if record.get("last_modified"):
+            headers["If-Modified-Since"] = record["last_modified"]
+    return headers
+
+
+def response_validators(headers: Any) -> Dict[str, str | None]:
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
@@ -0,0 +1,564 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from qdrant_client import models
+
+from .budget import Budget, ChunkScheduler, url_depth
+from .dedup import DEDUP_ENABLED, Deduplicator
+from .embeddings import aembed_texts
+from .lexical import RAG_HYBRID, bm25_vector
+from .page_state import get_page_state_store
+from .processing import Document, get_page_processor
+from .profiles import get_profile, profile_of
+from .qdrant_client import (
+    DENSE_VECTOR, QDRANT_SHADOW_REINDEX, QDRANT_SHARED_COLLECTION, QDRANT_TENANCY, QDRANT_UPSERT_BATCH_SIZE,
+    SPARSE_VECTOR, TENANT_FIELD, BulkUpserter, apply_profile, collection_schema, drop_collection, ensure_collection,
+    get_qdrant_client, resolve_collection, retire_collection_versions, shadow_collection_name, swap_alias,
+    tenant_filter,
+)
+
+PIPELINE_PAGE_QUEUE_SIZE = int(os.getenv("PIPELINE_PAGE_QUEUE_SIZE", 8))  # raw HTML pages waiting for extraction
+PIPELINE_EXTRACT_WINDOW = int(os.getenv("PIPELINE_EXTRACT_WINDOW", 16))  # pages being parsed in worker processes at once
+PIPELINE_CHUNK_QUEUE_SIZE = int(os.getenv("PIPELINE_CHUNK_QUEUE_SIZE", 256))  # chunks waiting for embedding
+PIPELINE_POINT_QUEUE_SIZE = int(os.getenv("PIPELINE_POINT_QUEUE_SIZE", 512))  # points waiting for upsert
+PIPELINE_EMBED_BATCH_SIZE = int(os.getenv("PIPELINE_EMBED_BATCH_SIZE", 64))
+PIPELINE_EMBED_WORKERS = int(os.getenv("PIPELINE_EMBED_WORKERS", 2))
+PIPELINE_FLUSH_INTERVAL = float(os.getenv("PIPELINE_FLUSH_INTERVAL", 1.0))  # seconds before a partial batch is flushed
+
+MIN_PAGE_WORDS = 10  # skip nearly empty pages
+
+_DONE = object()  # end-of-stream marker passed between stages
+
+PageSource = Callable[[Callable[..., Awaitable[None]]], Awaitable[None]]
+
+
+class IngestPipeline:
+    """Streaming crawl -> extract -> embed -> upsert pipeline.
+
+    Stages are connected by bounded asyncio queues, so memory stays flat
+    regardless of site size: a slow stage makes the crawler wait instead of
+    piling up HTML. Extraction starts on the first page while the next ones
+    are still downloading, and embeddings and upserts are flushed in batches
+    as chunks arrive, so the first pages become searchable early.
+
+    `report` is the crawl report shared with `crawl_site` (validators, links,
+    depth, not modified / gone URLs) and is used for incremental ingests.
+    With a limited `budget`, a ChunkScheduler decides which chunks are worth
+    embedding; chunks it holds back are embedded once the crawl is over.
+
+    `collection_name` is an alias. Incremental runs patch the live version
+    in place; other runs (and the first ingest of a collection) build a new
+    version next to it, and the alias is switched to that version once it is
+    complete, so chat keeps answering from the previous one meanwhile.
+    New versions are hybrid (dense + BM25 sparse vectors) with RAG_HYBRID;
+    in-place runs keep the schema of the live version. New versions use
+    `profile` (see profiles.py), by default the profile of the live version.
+
+    With QDRANT_TENANCY=shared, `collection_name` is a tenant of the shared
+    collection instead: its points carry payload.tenant, every run updates
+    them in place, and a collection of its own left from before is moved
+    into the shared one by its next ingest.
+    """
+
+    def __init__(self, collection_name: str, progress: Callable[..., None] | None = None,
+                 incremental: bool = False, report: Dict[str, Any] | None = None,
+                 budget: Optional[Budget] = None, max_pages: Optional[int] = None, profile: Optional[str] = None):
+        self.collection_name = collection_name
+        self.progress = progress or (lambda **fields: None)
+        self.incremental = incremental
+        self.report = report if report is not None else {}
+        self.scheduler = ChunkScheduler(budget)
+        self.max_pages = max_pages
+
+        self.page_state: Dict[str, Dict[str, Any]] = {}
+        self.page_records: Dict[str, Dict[str, Any]] = {}  # page state to persist once points are written
+        self.changed_pages: Dict[str, int] = {}  # url -> number of chunks now indexed
+        self.unchanged_pages: List[str] = []
+        self.gone_pages: List[str] = []
+        self.partial_pages: Dict[str, int] = {}  # changed pages cut short by the budget -> chunks indexed
+
+        self.pages_fetched = 0
+        self.pages_processed = 0
+        self.chunks_extracted = 0
+        self.embeddings_created = 0
+        self.points_upserted = 0
+        self.points_carried_over = 0
+        self.vector_size: Optional[int] = None
+        self.hybrid = RAG_HYBRID
+        self.profile = get_profile(profile) if profile else None
+        self.write_collection = collection_name  # the version points are written to
+        self.shadow = False
+        self.tenant: Optional[str] = None  # set in shared tenancy
+        self._legacy: Optional[str] = None  # collection of the tenant to move into the shared one
+        self._published = False
+        self.dedup = Deduplicator() if DEDUP_ENABLED else None
+
+        self._pages: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_PAGE_QUEUE_SIZE)
+        self._chunks: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_CHUNK_QUEUE_SIZE)
+        self._points: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_POINT_QUEUE_SIZE)
+        self._client = None
+        self._upserter: Optional[BulkUpserter] = None
+
+    async def run(self, source: PageSource) -> None:
+        """Run `source(add_page)` and all stages until every page is indexed."""
+        if self.incremental:
+            self.page_state = await asyncio.to_thread(get_page_state_store().load, self.collection_name)
+            print(f"Incremental ingest: {len(self.page_state)} page(s) known for '{self.collection_name}'")
+        self._client = get_qdrant_client()
+        if QDRANT_TENANCY == "shared" and self.collection_name != QDRANT_SHARED_COLLECTION:
+            await self._use_shared_collection()
+        else:
+            await self._use_own_collection()
+
+        embed_workers = max(1, PIPELINE_EMBED_WORKERS)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(self._produce(source))
+                tg.create_task(self._extract_stage(embed_workers))
+                for _ in range(embed_workers):
+                    tg.create_task(self._embed_stage())
+                tg.create_task(self._upsert_stage(embed_workers))
+
+            await self._finalize()
+        except Exception:
+            if self.shadow:
+                await asyncio.to_thread(self._drop_shadow)
+            raise
+
+    async def _use_own_collection(self) -> None:
+        """Write to a new version of the collection, or to the live one for incremental runs."""
+        try:
+            live = await asyncio.to_thread(resolve_collection, self._client, self.collection_name)
+        except Exception as e:
+            print(f"Warning: could not resolve collection '{self.collection_name}': {e}")
+            live = None
+        info = await asyncio.to_thread(self._client.get_collection, live) if live else None
+        if QDRANT_SHADOW_REINDEX and not (self.incremental and live):
+            self.write_collection = shadow_collection_name(self.collection_name)
+            self.shadow = True
+            print(f"Building '{self.collection_name}' in shadow collection '{self.write_collection}'")
+        elif live:
+            self.write_collection = live
+            self.hybrid = collection_schema(info)[1]
+            current = profile_of(info)
+            if self.profile is not None and (current is None or current.name != self.profile.name):
+                await asyncio.to_thread(apply_profile, self._client, self.collection_name, self.profile)
+        if self.profile is None:
+            self.profile = (profile_of(info) if info is not None else None) or get_profile()
+
+    async def _use_shared_collection(self) -> None:
+        """Write to the tenant's points in the shared collection, which keeps its schema and profile."""
+        self.tenant = self.collection_name
+        self.write_collection = QDRANT_SHARED_COLLECTION
+        try:
+            self._legacy = await asyncio.to_thread(resolve_collection, self._client, self.collection_name)
+            shared = await asyncio.to_thread(resolve_collection, self._client, QDRANT_SHARED_COLLECTION)
+            info = await asyncio.to_thread(self._client.get_collection, shared) if shared else None
+        except Exception as e:
+            print(f"Warning: could not look up collection '{QDRANT_SHARED_COLLECTION}': {e}")
+            info = None
+        if info is not None:
+            self.hybrid = collection_schema(info)[1]
+            current = profile_of(info)
+            if self.profile is not None and current is not None and current.name != self.profile.name:
+                print(f"Warning: '{QDRANT_SHARED_COLLECTION}' keeps its profile '{current.name}' "
+                      f"(requested '{self.profile.name}' for tenant '{self.tenant}')")
+            self.profile = current or self.profile
+        self.profile = self.profile or get_profile()
+        print(f"Indexing '{self.tenant}' as a tenant of shared collection '{self.write_collection}'"
+              + (f" (moving its points over from '{self._legacy}')" if self._legacy else ""))
+
+    async def add_page(self, url: str, html: str, doc: Optional[Document] = None) -> None:
+        """Hand a fetched page to the pipeline; waits while the extraction queue is full.
+
+        `doc` is the already processed page (see processing.process_document),
+        when the caller parsed the page anyway.
+        """
+        self.pages_fetched += 1
+        await self._pages.put((url, html, doc))
+
+    # -- stages -----------------------------------------------------------
+
+    async def _produce(self, source: PageSource) -> None:
+        try:
+            await source(self.add_page)
+        finally:
+            await self._pages.put(_DONE)
+
+    async def _extract_stage(self, embed_workers: int) -> None:
+        """Parse pages in the process pool, several at a time, and emit their chunks in page order."""
+        processor = get_page_processor()
+        in_order: asyncio.Queue = asyncio.Queue(maxsize=max(1, PIPELINE_EXTRACT_WINDOW))
+
+        async def _submit():
+            while True:
+                item = await self._pages.get()
+                if item is _DONE:
+                    await in_order.put(_DONE)
+                    return
+                page_url, html_content, doc = item
+                if doc is None:
+                    doc = asyncio.ensure_future(processor.process(html_content, page_url))
+                await in_order.put((page_url, doc))
+
+        submitter = asyncio.create_task(_submit())
+        try:
+            while True:
+                item = await in_order.get()
+                if item is _DONE:
+                    break
+                page_url, doc = item
+                try:
+                    if isinstance(doc, asyncio.Future):
+                        doc = await doc
+                    for chunk in await self._process_page(processor, page_url, doc):
+                        await self._chunks.put(chunk)
+                except Exception as e:
+                    print(f"Warning: Failed to process {page_url}: {e}")
+                self.pages_processed += 1
+                max_chunks = self.scheduler.budget.max_chunks
+                message = f"Extracting chunks... ({self.chunks_extracted}"
+                message += f"/{max_chunks})" if max_chunks else ")"
+                self.progress(chunks_extracted=self.chunks_extracted, message=message)
+            await submitter
+        finally:
+            submitter.cancel()
+        # Leftover budget goes to the best chunks held back across the whole crawl
+        for page_url, chunk in self.scheduler.drain(self._accept):
+            await self._chunks.put(self._admit(page_url, [chunk])[0])
+        for _ in range(embed_workers):
+            await self._chunks.put(_DONE)
+
+    async def _process_page(self, processor, page_url: str, doc: Document) -> List[Dict[str, Any]]:
+        """Turn a processed page into chunk payloads to embed (empty if unchanged or skipped)."""
+        if self.scheduler.exhausted():
+            return []  # budget used up
+
+        text = doc["text"]
+        blocks = doc["blocks"]
+        if self.dedup is not None:
+            # Recorded for unchanged pages too: their navigation still counts as seen
+            blocks = self.dedup.strip_boilerplate(blocks)
+        record = {
+            **self.report.get("validators", {}).get(page_url, {}),
+            "content_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            "links": self.report.get("links", {}).get(page_url, []),
+        }
+        previous = self.page_state.get(page_url)
+        if previous and previous.get("content_hash") == record["content_hash"]:
+            # Same text as last time: keep its points, just refresh the validators
+            self.page_records[page_url] = {**record, "chunk_count": previous.get("chunk_count", 0)}
+            self.unchanged_pages.append(page_url)
+            return []
+
+        chunks = []
+        if doc["word_count"] >= MIN_PAGE_WORDS:
+            # Pages that lost boilerplate blocks are chunked again, in the worker processes as well
+            candidates = doc["chunks"] if len(blocks) == len(doc["blocks"]) else await processor.chunk(blocks)
+            # Where each chunk sits in the page: the budget admits them out of order and dedup leaves gaps
+            candidates = [{**chunk, "position": i} for i, chunk in enumerate(candidates)]
+            depth = self.report.get("depth", {}).get(page_url)
+            chunks = self.scheduler.select(page_url, candidates, url_depth(page_url) if depth is None else depth,
+                                           self._expected_pages(), self._accept)
+
+        self.page_records[page_url] = {**record, "chunk_count": 0}
+        self.changed_pages[page_url] = 0
+        return self._admit(page_url, chunks)
+
+    def _accept(self, chunk: Dict[str, Any]) -> bool:
+        # Called only for chunks the budget admits, so held-back chunks are not remembered as indexed
+        return self.dedup is None or not self.dedup.is_duplicate(chunk["text"])
+
+    def _admit(self, page_url: str, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Number admitted chunks per page (chunk_id stays contiguous for stale point cleanup).
+
+        chunk_id follows admission order; payload.position is the chunk's place in the page.
+        """
+        first = self.changed_pages[page_url]
+        self.changed_pages[page_url] += len(chunks)
+        self.page_records[page_url]["chunk_count"] = self.changed_pages[page_url]
+        self.chunks_extracted += len(chunks)
+        tenant = {TENANT_FIELD: self.tenant} if self.tenant else {}
+        return [
+            {"text": chunk["text"], "section": chunk["section"], "url": page_url, "chunk_id": first + i,
+             "position": chunk["position"], **tenant}
+            for i, chunk in enumerate(chunks)
+        ]
+
+    def _expected_pages(self) -> int:
+        """This page plus those known but not processed yet: queued for extraction or still in the crawl frontier."""
+        expected = 1 + self._pages.qsize() + self.report.get("pending", 0)
+        if self.max_pages:
+            expected = min(expected, max(1, self.max_pages - self.pages_processed))
+        return expected
+
+    async def _embed_stage(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        while True:
+            try:
+                item = await asyncio.wait_for(self._chunks.get(), timeout=PIPELINE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                item = None  # nothing new for a while: flush what we have
+            if item is not None and item is not _DONE:
+                batch.append(item)
+            if batch and (item is None or item is _DONE or len(batch) >= PIPELINE_EMBED_BATCH_SIZE):
+                await self._embed_batch(batch)
+                batch = []
+            if item is _DONE:
+                await self._points.put(_DONE)
+                return
+
+    async def _embed_batch(self, batch: List[Dict[str, Any]]) -> None:
+        vectors = await aembed_texts([c["text"] for c in batch])
+        if vectors and self.vector_size is None:
+            self.vector_size = len(vectors[0])
+        self.embeddings_created += len(vectors)
+        self.progress(embeddings_created=self.embeddings_created, message="Creating embeddings...")
+        for payload, vec in zip(batch, vectors):
+            await self._points.put(models.PointStruct(
+                id=self._point_id(payload["url"], payload["chunk_id"]),
+                vector=self._vector(vec, payload["text"]),
+                payload=payload,
+            ))
+
+    def _point_id(self, url: str, chunk_id: Any) -> str:
+        """Stable id of a chunk, so re-ingests overwrite it; tenants of the shared collection may share URLs."""
+        key = f"{url}-{chunk_id}"
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{self.tenant}/{key}" if self.tenant else key))
+
+    def _vector(self, dense: List[float], text: str) -> Any:
+        """Point vector(s) in the schema of the write collection: the dense vector, plus BM25 if hybrid."""
+        if self.hybrid:
+            return {DENSE_VECTOR: dense, SPARSE_VECTOR: bm25_vector(text)}
+        return dense
+
+    async def _upsert_stage(self, producers: int) -> None:
+        """Feed points to the bulk upserter; partial batches are flushed when producers go idle."""
+        self._upserter = BulkUpserter(self._client, self.write_collection, on_progress=self._upserted)
+        finished = 0
+        created = False
+        while finished < producers:
+            try:
+                item = await asyncio.wait_for(self._points.get(), timeout=PIPELINE_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                await self._upserter.flush()
+                continue
+            if item is _DONE:
+                finished += 1
+                continue
+            if not created:
+                created = True
+                await asyncio.to_thread(ensure_collection, self._client, self.write_collection, self.vector_size,
+                                        self.hybrid, self.profile, self.tenant is not None)
+            await self._upserter.add([item])
+        await self._upserter.close()
+
+    def _upserted(self, count: int) -> None:
+        self.points_upserted = count
+        self.progress(points_upserted=count, message=f"Upserted {count} points to Qdrant...")
+
+    # -- bookkeeping ------------------------------------------------------
+
+    async def _finalize(self) -> None:
+        """Delete stale points of re-indexed and removed pages (or publish the new version), then persist page state."""
+        report = self.report
+        for u in report.get("not_modified", []):
+            self.page_records[u] = {**self.page_state.get(u, {}), **report.get("validators", {}).get(u, {})}
+            self.unchanged_pages.append(u)
+
+        # Pages that disappeared: 404/410 now, or no longer linked after a complete crawl
+        gone = list(report.get("gone", []))
+        if self.incremental and report.get("exhausted"):
+            reached = set(report.get("validators", {})) | set(report.get("failed", []))
+            gone += [u for u in self.page_state if u not in reached and u not in gone]
+        self.gone_pages = [u for u in gone if u in self.page_state]
+
+        if self.incremental:
+            print(f"Incremental ingest: {len(self.unchanged_pages)} unchanged, {len(self.changed_pages)} changed, "
+                  f"{len(self.gone_pages)} removed page(s)")
+
+        if self.dedup is not None and any(self.dedup.stats().values()):
+            print(f"Deduplication: {self.dedup.stats()}")
+        if self.scheduler.budget.limited:
+            print(f"Budget: {self.scheduler.stats()}")
+        self._mark_partial_pages()
+
+        if self.shadow:
+            await self._publish()
+        elif self.points_upserted or self.incremental:
+            await self._apply_page_changes()
+        if self._legacy:
+            await self._move_to_shared()
+        if self.incremental:
+            store = get_page_state_store()
+            await asyncio.to_thread(store.save, self.collection_name, self.page_records)
+            if self.gone_pages:
+                await asyncio.to_thread(store.delete, self.collection_name, self.gone_pages)
+
+    def _mark_partial_pages(self) -> None:
+        """Keep changed pages that the budget cut short from looking indexed.
+
+        Their old points above the new chunks are kept, and their page state
+        is saved without content hash and validators, so the next incremental
+        run fetches and processes them again instead of taking them as unchanged.
+        """
+        for url in self.scheduler.incomplete_pages() & set(self.changed_pages):
+            self.partial_pages[url] = self.changed_pages[url]
+            record = self.page_records[url]
+            chunk_count = max(record["chunk_count"], self.page_state.get(url, {}).get("chunk_count") or 0)
+            self.page_records[url] = {"links": record.get("links", []), "chunk_count": chunk_count}
+        if self.partial_pages:
+            print(f"Budget: {len(self.partial_pages)} page(s) only partly re-indexed, their older chunks are kept")
+
+    async def _publish(self) -> None:
+        """Complete the shadow collection with the live pages this run did not index, then swap the alias to it."""
+        if not self.points_upserted:
+            # Nothing new to serve: the live version stays
+            await asyncio.to_thread(self._drop_shadow)
+            return
+        live = await asyncio.to_thread(resolve_collection, self._client, self.collection_name)
+        if live:
+            await self._carry_over(live)
+        retired = await asyncio.to_thread(swap_alias, self._client, self.collection_name, self.write_collection)
+        self._published = True
+        print(f"Collection '{self.collection_name}' is now served by '{self.write_collection}'")
+        dropped = await asyncio.to_thread(
+            retire_collection_versions, self._client, self.collection_name, self.write_collection, retired
+        )
+        if dropped:
+            print(f"Dropped old version(s) of '{self.collection_name}': {', '.join(dropped)}")
+
+    async def _move_to_shared(self) -> None:
+        """Copy the tenant's own collection into the shared one, then drop it; kept if anything fails."""
+        if not await self._carry_over(self._legacy):
+            return
+        try:
+            await asyncio.to_thread(drop_collection, self._client, self.collection_name)
+            print(f"Moved '{self.collection_name}' into shared collection '{self.write_collection}'")
+        except Exception as e:
+            print(f"Warning: could not drop collection '{self._legacy}' after moving it: {e}")
+
+    async def _carry_over(self, live: str) -> bool:
+        """Copy the points of pages not indexed (or removed) by this run from the live version.
+
+        Ingests add and update pages but only incremental ones remove pages,
+        so the new version keeps what the old one had about other pages. In
+        shared tenancy the points get the tenant's payload and ids.
+        Returns False if the points could not be copied.
+        """
+        try:
+            vector_size, _ = collection_schema(await asyncio.to_thread(self._client.get_collection, live))
+            if self.tenant and self.vector_size is None:
+                # Nothing embedded by this run: the shared collection may not exist yet
+                self.vector_size = vector_size
+                await asyncio.to_thread(ensure_collection, self._client, self.write_collection, vector_size,
+                                        self.hybrid, self.profile, True)
+        except Exception as e:
+            print(f"Warning: could not read collection '{live}', not carrying its points over: {e}")
+            return False
+        if vector_size != self.vector_size:
+            print(f"Warning: '{live}' has other vectors than '{self.write_collection}', not carrying its points over")
+            return False
+
+        # Partly re-indexed pages keep the old chunks past their new ones
+        indexed = [u for u in self.changed_pages if u not in self.partial_pages] + self.gone_pages
+        scroll_filter = models.Filter(must_not=[
+            models.FieldCondition(key="url", match=models.MatchAny(any=indexed))
+        ]) if indexed else None
+        upserter = BulkUpserter(self._client, self.write_collection)
+        offset = None
+        while True:
+            records, offset = await asyncio.to_thread(
+                self._client.scroll, collection_name=live, scroll_filter=scroll_filter,
+                limit=QDRANT_UPSERT_BATCH_SIZE, offset=offset, with_vectors=True,
+            )
+            # Converted to the new schema: a dense-only version gets its sparse vectors here
+            points = []
+            for r in records:
+                payload = r.payload or {}
+                if (payload.get("chunk_id") or 0) < self.partial_pages.get(payload.get("url"), 0):
+                    continue  # replaced by this run
+                if self.tenant:
+                    payload = {**payload, TENANT_FIELD: self.tenant}
+                points.append(models.PointStruct(
+                    id=self._point_id(payload.get("url"), payload.get("chunk_id")) if self.tenant else r.id,
+                    # Hybrid points come back as {"": dense, "bm25": sparse}
+                    vector=self._vector(r.vector[DENSE_VECTOR] if isinstance(r.vector, dict) else r.vector,
+                                        payload.get("text") or ""),
+                    payload=payload,
+                ))
+            await upserter.add(points)
+            if offset is None:
+                break
+        await upserter.close()
+        self.points_carried_over = upserter.points_upserted
+        if self.points_carried_over:
+            print(f"Carried {self.points_carried_over} point(s) of other pages over from '{live}'")
+        return True
+
+    def _drop_shadow(self) -> None:
+        if self._published:
+            return  # it is the live version now
+        try:
+            if self._client.collection_exists(self.write_collection):
+                self._client.delete_collection(self.write_collection)
+        except Exception as e:
+            print(f"Warning: could not drop shadow collection '{self.write_collection}': {e}")
+
+    async def _apply_page_changes(self) -> None:
+        """Delete stale points of re-indexed pages (chunk_id >= new chunk count) and all points of removed pages."""
+        def _delete(page_url: str, from_chunk: int):
+            conditions = [models.FieldCondition(key="url", match=models.MatchValue(value=page_url))]
+            if self.tenant:
+                conditions += tenant_filter(self.tenant).must
+            if from_chunk:
+                conditions.append(models.FieldCondition(key="chunk_id", range=models.Range(gte=from_chunk)))
+            self._client.delete(
+                collection_name=self.write_collection,
+                points_selector=models.FilterSelector(filter=models.Filter(must=conditions)),
+            )
+
+        deletions = [(u, n) for u, n in self.changed_pages.items() if u not in self.partial_pages]
+        deletions += [(u, 0) for u in self.gone_pages]
+        for page_url, from_chunk in deletions:
+            try:
+                await asyncio.to_thread(_delete, page_url, from_chunk)
+            except Exception as e:
+                print(f"Warning: failed to delete stale points for {page_url}: {e}")
+
+    def result(self) -> Dict[str, Any]:
+        try:
+            if self.tenant:
+                points_count = self._client.count(self.write_collection, count_filter=tenant_filter(self.tenant),
+                                                  exact=True).count
+            else:
+                points_count = self._client.get_collection(self.write_collection).points_count
+        except Exception:
+            points_count = None
+        result = {
+            "status": "ok",
+            "chunks_indexed": self.points_upserted,
+            "total_points_in_collection": points_count,
+            "collection": self.collection_name,
+            "profile": self.profile.name if self.profile else None,
+        }
+        if self.shadow:
+            result.update({"collection_version": self.write_collection, "points_carried_over": self.points_carried_over})
+        if self.tenant:
+            result.update({"shared_collection": self.write_collection, "points_carried_over": self.points_carried_over})
+        if self.dedup is not None:
+            result.update(self.dedup.stats())
+        if self.scheduler.budget.limited:
+            result.update(self.scheduler.stats())
+        if self.incremental:
+            result.update({
+                "pages_unchanged": len(self.unchanged_pages),
+                "pages_changed": len(self.changed_pages),
+                "pages_removed": len(self.gone_pages),
+            })
+        if self.partial_pages:
+            result["pages_partly_indexed"] = len(self.partial_pages)
+        return result
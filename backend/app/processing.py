@@ -0,0 +1,141 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from .chunking import chunk_blocks, truncate_blocks
+from .utils import extract_page
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", os.cpu_count() or 1))  # 0 = process on the event loop
+EXTRACT_BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", 8))  # pages per round trip to a worker process
+EXTRACT_BATCH_WAIT = float(os.getenv("EXTRACT_BATCH_WAIT", 0.02))  # seconds to wait for a batch to fill up
+
+MAX_PAGE_WORDS = 5000  # only the first part of very long pages is indexed
+
+Document = Dict[str, Any]
+
+
+def process_document(html: str, base_url: Optional[str] = None, text: Optional[str] = None) -> Document:
+    """Parse and chunk one page (CPU bound, runs in a worker process).
+
+    Returns {"text", "links", "word_count", "blocks", "chunks"}, where blocks
+    are the (section, paragraph) pairs of the first MAX_PAGE_WORDS words and
+    chunks the {"text", "section"} dicts built from them. If `text` is given
+    the HTML is not parsed again and the text is chunked as a single section.
+    """
+    links: List[str] = []
+    if text is None:
+        text, links, blocks = extract_page(html, base_url)
+    else:
+        blocks = [("", text)]
+    blocks = truncate_blocks(blocks, MAX_PAGE_WORDS)
+    return {
+        "text": text,
+        "links": links,
+        "word_count": len(text.split()),
+        "blocks": blocks,
+        "chunks": chunk_blocks(blocks),
+    }
+
+
+def _process_batch(items: List[Tuple[str, Optional[str], Optional[str]]]) -> List[Document]:
+    """Worker entry point: one pickled round trip for a whole batch of pages."""
+    return [process_document(*item) for item in items]
+
+
+class PageProcessor:
+    """Offloads HTML parsing and chunking to a process pool.
+
+    Calls are micro-batched: pages submitted within EXTRACT_BATCH_WAIT of each
+    other (up to EXTRACT_BATCH_SIZE) travel to a worker together, which keeps
+    pickling overhead low. Each caller gets its own result back, so callers
+    that await in submission order see pages in order. With workers=0, or if
+    the pool breaks, documents are processed on the event loop as before.
+    """
+
+    def __init__(self, executor: Optional[ProcessPoolExecutor], batch_size: int = EXTRACT_BATCH_SIZE,
+                 batch_wait: float = EXTRACT_BATCH_WAIT):
+        self.executor = executor
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self._pending: List[Tuple[Tuple[str, Optional[str], Optional[str]], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()  # batches in flight (keeps the tasks referenced)
+
+    async def process(self, html: str, base_url: Optional[str] = None, text: Optional[str] = None) -> Document:
+        if self.executor is None:
+            return process_document(html, base_url, text)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((html, base_url, text), future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_wait, self._flush)
+        return await future
+
+    async def chunk(self, blocks: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+        """Chunk already extracted blocks in a worker (pages whose boilerplate was stripped afterwards)."""
+        if self.executor is not None:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, chunk_blocks, blocks)
+            except BrokenProcessPool as e:
+                print(f"Warning: extraction pool is broken ({e}), processing on the event loop")
+                self.executor = None
+        return chunk_blocks(blocks)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch) -> None:
+        items = [item for item, _ in batch]
+        try:
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(self.executor, _process_batch, items)
+            except BrokenProcessPool as e:
+                print(f"Warning: extraction pool is broken ({e}), processing on the event loop")
+                self.executor = None
+                results = _process_batch(items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+_executor = None
+_processor = None
+_processor_loop = None
+
+
+def get_page_processor() -> PageProcessor:
+    """Shared page processor (the process pool is started on first use)."""
+    global _executor, _processor, _processor_loop
+    loop = asyncio.get_running_loop()
+    if _processor is None or _processor_loop is not loop:
+        if _executor is None and EXTRACT_WORKERS > 0:
+            # spawn: workers must not inherit the server's threads, sockets and SQLite handles
+            _executor = ProcessPoolExecutor(EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        _processor = PageProcessor(_executor)
+        _processor_loop = loop
+    return _processor
+
+
+def close_page_processor() -> None:
+    global _executor, _processor, _processor_loop
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _processor = None
+    _processor_loop = None
@@ -0,0 +1,135 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+from qdrant_client import models
+
+QDRANT_COLLECTION_PROFILE = os.getenv("QDRANT_COLLECTION_PROFILE", "default")  # profile of new collections
+# Extra or overridden profiles as JSON, e.g. {"large": {"quantization": "binary", "hnsw_m": 32, "oversampling": 4}}
+QDRANT_COLLECTION_PROFILES = os.getenv("QDRANT_COLLECTION_PROFILES", "")
+
+
+class CollectionProfile:
+    """Storage and search settings of a collection's dense vectors.
+
+    - quantization: None, "scalar" (int8, ~4x less vector memory) or "binary"
+      (1 bit per dimension, ~32x less); the quantized vectors stay in RAM
+      and the original ones are read only to rescore the best candidates.
+    - on_disk: keep the original vectors and the payload on disk (memmapped).
+    - hnsw_m / hnsw_ef_construct: graph density and build effort (None = Qdrant default).
+    - hnsw_ef / oversampling: search-time beam width and how many extra
+      quantized candidates are fetched for rescoring.
+    """
+
+    def __init__(self, name: str, quantization: Optional[str] = None, on_disk: bool = False,
+                 hnsw_m: Optional[int] = None, hnsw_ef_construct: Optional[int] = None,
+                 hnsw_ef: Optional[int] = None, oversampling: Optional[float] = None):
+        if quantization not in (None, "scalar", "binary"):
+            raise ValueError(f"Unknown quantization '{quantization}' in profile '{name}'")
+        self.name = name
+        self.quantization = quantization
+        self.on_disk = on_disk
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+        self.oversampling = oversampling
+
+    def vector_params(self, size: int) -> models.VectorParams:
+        return models.VectorParams(size=size, distance=models.Distance.COSINE, on_disk=self.on_disk or None)
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, quantile=0.99, always_ram=True,
+            ))
+        if self.quantization == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def hnsw_config(self, shared: bool = False) -> Optional[models.HnswConfigDiff]:
+        """HNSW settings; in a `shared` (multi-tenant) collection hnsw_m is the density of
+        each tenant's graph (payload_m) and m=0 leaves out the graph over all tenants."""
+        if shared:
+            return models.HnswConfigDiff(m=0, payload_m=self.hnsw_m or 16, ef_construct=self.hnsw_ef_construct)
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return models.HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def create_kwargs(self, shared: bool = False) -> Dict[str, Any]:
+        """create_collection arguments besides the vectors."""
+        return {
+            "on_disk_payload": self.on_disk or None,
+            "hnsw_config": self.hnsw_config(shared),
+            "quantization_config": self.quantization_config(),
+            "metadata": {"profile": self.name},
+        }
+
+    def update_kwargs(self, shared: bool = False) -> Dict[str, Any]:
+        """update_collection arguments that move an existing collection to this profile.
+
+        Qdrant re-quantizes and rebuilds the index in the background; the
+        collection stays searchable meanwhile. A `shared` collection keeps
+        its per-tenant graphs.
+        """
+        hnsw = self.hnsw_config(shared) or models.HnswConfigDiff()
+        return {
+            "vectors_config": {"": models.VectorParamsDiff(on_disk=self.on_disk)},  # the unnamed dense vector
+            "collection_params": models.CollectionParamsDiff(on_disk_payload=self.on_disk),
+            # Unset values go back to Qdrant's defaults
+            "hnsw_config": hnsw.model_copy(update={"m": 16 if hnsw.m is None else hnsw.m,
+                                                   "ef_construct": hnsw.ef_construct or 100}),
+            "quantization_config": self.quantization_config() or models.Disabled.DISABLED,
+            "metadata": {"profile": self.name},
+        }
+
+    def search_params(self) -> Optional[models.SearchParams]:
+        if self.hnsw_ef is None and self.quantization is None:
+            return None
+        quantization = None
+        if self.quantization is not None:
+            quantization = models.QuantizationSearchParams(rescore=True, oversampling=self.oversampling)
+        return models.SearchParams(hnsw_ef=self.hnsw_ef, quantization=quantization)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "quantization": self.quantization,
+            "on_disk": self.on_disk,
+            "hnsw_m": self.hnsw_m,
+            "hnsw_ef_construct": self.hnsw_ef_construct,
+            "hnsw_ef": self.hnsw_ef,
+            "oversampling": self.oversampling,
+        }
+
+
+PROFILES: Dict[str, CollectionProfile] = {
+    # float32 vectors and payload in RAM, Qdrant's default HNSW
+    "default": CollectionProfile("default"),
+    # int8 vectors in RAM, originals on disk for rescoring: ~4x less vector memory, recall barely changes
+    "scalar": CollectionProfile("scalar", quantization="scalar", on_disk=True, hnsw_ef_construct=128,
+                                hnsw_ef=128, oversampling=2.0),
+    # 1-bit vectors in RAM: ~30x less vector memory; more oversampling makes up for the coarser first pass
+    "binary": CollectionProfile("binary", quantization="binary", on_disk=True, hnsw_ef_construct=128,
+                                hnsw_ef=128, oversampling=3.0),
+}
+
+if QDRANT_COLLECTION_PROFILES:
+    try:
+        for _name, _settings in json.loads(QDRANT_COLLECTION_PROFILES).items():
+            PROFILES[_name] = CollectionProfile(_name, **_settings)
+    except Exception as e:
+        print(f"Warning: ignoring invalid QDRANT_COLLECTION_PROFILES: {e}")
+
+
+def get_profile(name: Optional[str] = None) -> CollectionProfile:
+    """Profile by name (None = QDRANT_COLLECTION_PROFILE); raises KeyError for unknown names."""
+    name = name or QDRANT_COLLECTION_PROFILE
+    if name not in PROFILES:
+        raise KeyError(f"Unknown collection profile '{name}' (available: {', '.join(PROFILES)})")
+    return PROFILES[name]
+
+
+def profile_of(info) -> Optional[CollectionProfile]:
+    """Profile recorded in a collection's metadata (None for collections created before profiles)."""
+    name = (getattr(info.config, "metadata", None) or {}).get("profile")
+    return PROFILES.get(name) if name else None
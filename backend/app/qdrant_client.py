@@ -1,8 +1,28 @@
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+import asyncio
 import os
+import re
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+from .profiles import CollectionProfile, get_profile
 
 QDRANT_HOST = os.getenv('QDRANT_HOST', 'qdrant')
 QDRANT_PORT = int(os.getenv('QDRANT_PORT', 6333))
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv('QDRANT_UPSERT_BATCH_SIZE', 128))  # points per upsert request
+QDRANT_UPSERT_CONCURRENCY = int(os.getenv('QDRANT_UPSERT_CONCURRENCY', 4))  # upsert requests in flight
+QDRANT_UPSERT_WAIT = os.getenv('QDRANT_UPSERT_WAIT', 'false').lower() == 'true'  # wait for each batch to be applied
+QDRANT_SHADOW_REINDEX = os.getenv('QDRANT_SHADOW_REINDEX', 'true').lower() == 'true'  # build re-indexes aside, then swap the alias
+QDRANT_ORPHAN_MAX_AGE = float(os.getenv('QDRANT_ORPHAN_MAX_AGE', 3600))  # seconds before an unpublished version is dropped
+QDRANT_TENANCY = os.getenv('QDRANT_TENANCY', 'collection').lower()  # "collection" (one per site) or "shared"
+QDRANT_SHARED_COLLECTION = os.getenv('QDRANT_SHARED_COLLECTION', 'sites')  # holds every site in shared tenancy
+QDRANT_MAX_TENANTS = int(os.getenv('QDRANT_MAX_TENANTS', 100000))  # sites listed by /collections in shared tenancy
+
+TENANT_FIELD = "tenant"  # payload field naming the site (logical collection) of a point in the shared collection
+DENSE_VECTOR = ""  # points keep one unnamed dense vector; "" is its key next to the sparse one
+SPARSE_VECTOR = "bm25"  # named sparse vector of hybrid collections
+
+_VERSION_NAME = re.compile(r"^(?P<alias>.+)__v(?P<created>\d{13})$")
 
 _client = None
 
@@ -14,3 +34,299 @@ def get_qdrant_client():
         _client = QdrantClient(url=f'http://{QDRANT_HOST}:{QDRANT_PORT}')
     return _client
 
+
+_async_client = None
+_async_client_loop = None
+
+
+def get_async_qdrant_client() -> AsyncQdrantClient:
+    """Shared async client for the request path (/chat never blocks the event loop on Qdrant).
+
+    Like the HTTP client, it is bound to the event loop it was created on.
+    """
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        _async_client = AsyncQdrantClient(url=f'http://{QDRANT_HOST}:{QDRANT_PORT}')
+        _async_client_loop = loop
+    return _async_client
+
+
+async def close_async_qdrant_client() -> None:
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        try:
+            await _async_client.close()
+        except Exception:
+            pass
+    _async_client = None
+    _async_client_loop = None
+
+
+
+def ensure_collection(client, collection_name: str, vector_size: int, hybrid: bool = False,
+                      profile: Optional[CollectionProfile] = None, shared: bool = False) -> None:
+    """Create the collection if it doesn't exist (never recreate) and index payload.url.
+
+    Hybrid collections add a BM25 sparse vector, whose IDF Qdrant maintains,
+    next to the unnamed dense vector. `profile` sets quantization, on-disk storage
+    and HNSW parameters (default: QDRANT_COLLECTION_PROFILE). A `shared`
+    collection holds many sites: payload.tenant is indexed as the tenant
+    key and HNSW graphs are built per tenant instead of over all points.
+    """
+    profile = profile or get_profile()
+    try:
+        if not client.collection_exists(collection_name):
+            print(f"Creating new {'hybrid ' if hybrid else ''}{'shared ' if shared else ''}collection "
+                  f"'{collection_name}' (profile '{profile.name}')...")
+            dense = profile.vector_params(vector_size)
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=dense,
+                sparse_vectors_config={
+                    SPARSE_VECTOR: models.SparseVectorParams(modifier=models.Modifier.IDF)
+                } if hybrid else None,
+                **profile.create_kwargs(shared),
+            )
+        else:
+            print(f"Collection '{collection_name}' exists, will add/update points")
+    except Exception as e:
+        # Collection might already exist or creation is in progress, upsert will work either way
+        print(f"Warning: Collection check/create failed ({e}), attempting upsert anyway")
+    if shared:
+        ensure_tenant_index(client, collection_name)
+    ensure_url_index(client, collection_name)
+
+
+def collection_schema(info) -> Tuple[Optional[int], bool]:
+    """(dense vector size, hybrid) of a collection, from its CollectionInfo."""
+    params = info.config.params
+    return getattr(params.vectors, "size", None), SPARSE_VECTOR in (params.sparse_vectors or {})
+
+
+def apply_profile(client, collection_name: str, profile: CollectionProfile) -> str:
+    """Move the live version of a collection to `profile` in place; returns the version updated.
+
+    Qdrant re-quantizes and re-indexes in the background while searches go on.
+    The shared collection keeps its per-tenant HNSW graphs.
+    """
+    version = resolve_collection(client, collection_name)
+    if version is None:
+        raise ValueError(f"Collection {collection_name} not found")
+    shared = version == QDRANT_SHARED_COLLECTION
+    client.update_collection(collection_name=version, **profile.update_kwargs(shared))
+    print(f"Collection '{collection_name}' ({version}) moved to profile '{profile.name}'")
+    return version
+
+
+def shadow_collection_name(collection_name: str) -> str:
+    """Name of a new version of a collection; the alias `collection_name` points at the live version."""
+    return f"{collection_name}__v{int(time.time() * 1000)}"
+
+
+def resolve_collection(client, collection_name: str) -> Optional[str]:
+    """Collection serving `collection_name`: the alias target, the collection itself (created before aliases) or None."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == collection_name:
+            return alias.collection_name
+    return collection_name if client.collection_exists(collection_name) else None
+
+
+def swap_alias(client, collection_name: str, target: str) -> Optional[str]:
+    """Point the alias `collection_name` at `target` in one atomic update.
+
+    Returns the version that served before, for the caller to drop. A
+    collection created before aliases holds the name itself, so it is deleted
+    right before the alias takes the name over.
+    """
+    previous = resolve_collection(client, collection_name)
+    operations = []
+    if previous == collection_name:
+        client.delete_collection(collection_name)
+        previous = None
+    elif previous is not None:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=collection_name)))
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=target, alias_name=collection_name)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def retire_collection_versions(client, collection_name: str, live: str, retired: Optional[str] = None) -> List[str]:
+    """Drop the version the alias just left and versions of failed builds older than QDRANT_ORPHAN_MAX_AGE.
+
+    Returns the names of the dropped collections.
+    """
+    now_ms = time.time() * 1000
+    doomed = {retired} if retired and retired != live else set()
+    for collection in client.get_collections().collections:
+        match = _VERSION_NAME.match(collection.name)
+        if (match and match["alias"] == collection_name and collection.name != live
+                and now_ms - int(match["created"]) > QDRANT_ORPHAN_MAX_AGE * 1000):
+            doomed.add(collection.name)
+    dropped = []
+    for name in sorted(doomed):
+        try:
+            client.delete_collection(name)
+            dropped.append(name)
+        except Exception as e:
+            print(f"Warning: could not drop collection '{name}': {e}")
+    return dropped
+
+
+def drop_collection(client, collection_name: str) -> None:
+    """Delete a collection, or an alias and the version it points at."""
+    version = resolve_collection(client, collection_name)
+    if version is None:
+        return
+    if version != collection_name:
+        client.update_collection_aliases(change_aliases_operations=[
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=collection_name))
+        ])
+    client.delete_collection(version)
+
+
+def list_tenants(client) -> List[str]:
+    """Sites stored in the shared collection."""
+    if not client.collection_exists(QDRANT_SHARED_COLLECTION):
+        return []
+    hits = client.facet(QDRANT_SHARED_COLLECTION, key=TENANT_FIELD, limit=QDRANT_MAX_TENANTS).hits
+    return [str(hit.value) for hit in hits]
+
+
+def list_collections(client) -> List[str]:
+    """Names chat can be asked about: aliases and collections created before aliases (versions are hidden).
+
+    In shared tenancy, the sites of the shared collection are listed instead of the collection itself.
+    """
+    names = {alias.alias_name for alias in client.get_aliases().aliases}
+    names.update(c.name for c in client.get_collections().collections if not _VERSION_NAME.match(c.name))
+    if QDRANT_TENANCY == "shared":
+        names.discard(QDRANT_SHARED_COLLECTION)
+        names.update(list_tenants(client))
+    return sorted(names)
+
+
+def ensure_tenant_index(client, collection_name: str) -> None:
+    """Keyword index on payload.tenant, flagged as the tenant key so Qdrant co-locates each site's points."""
+    try:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=TENANT_FIELD,
+            field_schema=models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True),
+        )
+    except Exception as e:
+        print(f"Warning: could not create tenant index on '{collection_name}': {e}")
+
+
+def tenant_filter(tenant: str) -> models.Filter:
+    return models.Filter(must=[models.FieldCondition(key=TENANT_FIELD, match=models.MatchValue(value=tenant))])
+
+
+def ensure_url_index(client, collection_name: str) -> None:
+    """Keyword index on payload.url so per-page deletes do not scan the collection."""
+    try:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name="url",
+            field_schema=models.PayloadSchemaType.KEYWORD,
+        )
+    except Exception as e:
+        print(f"Warning: could not create url index on '{collection_name}': {e}")
+
+
+class BulkUpserter:
+    """Upsert points in batches with a bounded number of requests in flight.
+
+    `add` waits for a free slot once `concurrency` batches are in flight, so a
+    slow Qdrant pushes back on the producer instead of queueing payloads in
+    memory. With wait=False, batches are acknowledged once Qdrant has logged
+    them, not applied. `close` therefore acts as a consistency barrier: it
+    sends the final batch with wait=True after all earlier batches were
+    acknowledged. Qdrant applies a collection's updates in order, so when that
+    call returns every point is searchable.
+    """
+
+    def __init__(self, client, collection_name: str, batch_size: int = QDRANT_UPSERT_BATCH_SIZE,
+                 concurrency: int = QDRANT_UPSERT_CONCURRENCY, wait: bool = QDRANT_UPSERT_WAIT,
+                 on_progress: Callable[[int], None] | None = None):
+        self.client = client
+        self.collection_name = collection_name
+        self.batch_size = max(1, batch_size)
+        self.wait = wait
+        self.on_progress = on_progress
+        self.points_upserted = 0
+        self._buffer: List[Any] = []
+        self._last_batch: List[Any] = []
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._in_flight: set = set()
+        self._error: Exception | None = None
+
+    async def add(self, points: List[Any]) -> None:
+        self._buffer.extend(points)
+        while len(self._buffer) >= self.batch_size:
+            batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+            await self._submit(batch)
+
+    async def flush(self) -> None:
+        """Send a partial batch now (e.g. when the producer is idle)."""
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            await self._submit(batch)
+
+    async def close(self) -> None:
+        """Wait for every in-flight batch, then apply the barrier."""
+        final, self._buffer = self._buffer, []
+        await self._drain()
+        if not final and not self.wait and self.points_upserted:
+            # Nothing left to send: re-send the last batch (idempotent) as the barrier
+            final, counted = self._last_batch, False
+        else:
+            counted = True
+        if final:
+            await asyncio.to_thread(self._upsert, final, True)
+            if counted:
+                self._acknowledge(len(final))
+
+    async def _submit(self, batch: List[Any]) -> None:
+        self._raise_if_failed()
+        await self._slots.acquire()
+        self._last_batch = batch
+        task = asyncio.create_task(self._send(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, batch: List[Any]) -> None:
+        try:
+            await asyncio.to_thread(self._upsert, batch, self.wait)
+            self._acknowledge(len(batch))
+        except Exception as e:
+            self._error = self._error or e
+        finally:
+            self._slots.release()
+
+    def _upsert(self, batch: List[Any], wait: bool) -> None:
+        self.client.upsert(collection_name=self.collection_name, points=batch, wait=wait)
+
+    def _acknowledge(self, count: int) -> None:
+        self.points_upserted += count
+        if self.on_progress:
+            self.on_progress(self.points_upserted)
+
+    async def _drain(self) -> None:
+        if self._in_flight:
+            await asyncio.gather(*list(self._in_flight))
+        self._raise_if_failed()
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+
+async def upsert_points(client, collection_name: str, points: List[Any], **kwargs) -> int:
+    """Bulk-upsert a list of points in batches; returns the number of points upserted."""
+    upserter = BulkUpserter(client, collection_name, **kwargs)
+    await upserter.add(points)
+    await upserter.close()
+    return upserter.points_upserted
@@ -1,30 +1,56 @@
-﻿from .qdrant_client import get_qdrant_client
-from openai import OpenAI
+﻿from .context import build_context
+from .lexical import RAG_HYBRID, bm25_query, rerank
+from .profiles import profile_of
+from .qdrant_client import (
+    QDRANT_SHARED_COLLECTION, QDRANT_TENANCY, SPARSE_VECTOR, collection_schema, get_qdrant_client,
+    get_async_qdrant_client, tenant_filter,
+)
+from openai import AsyncOpenAI, OpenAI
+from qdrant_client import models
+import asyncio
 import os
+import time
+from typing import Dict, Optional, Tuple
 
 TOP_K = int(os.getenv("RAG_TOP_K", 3))
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", 20))  # results per retriever before fusion and reranking
+RAG_RERANK = os.getenv("RAG_RERANK", "true").lower() == "true"  # reorder candidates by query term coverage
+RAG_SCHEMA_TTL = 60  # seconds a collection's schema (hybrid or dense only, where it is stored) is cached
+LLM_MODEL = "deepseek-chat"
+LLM_BASE_URL = "https://api.deepseek.com/v1"
 
 # DeepSeek API client for LLM
 client_llm = OpenAI(
     api_key=os.getenv("DEEPSEEK_API_KEY"),
-    base_url="https://api.deepseek.com/v1"
+    base_url=LLM_BASE_URL
 )
 
+_async_llm = None
+_async_llm_loop = None
+
+
+def get_async_llm_client() -> AsyncOpenAI:
+    """Shared async DeepSeek client, bound to the running event loop."""
+    global _async_llm, _async_llm_loop
+    loop = asyncio.get_running_loop()
+    if _async_llm is None or _async_llm_loop is not loop:
+        _async_llm = AsyncOpenAI(api_key=os.getenv("DEEPSEEK_API_KEY"), base_url=LLM_BASE_URL)
+        _async_llm_loop = loop
+    return _async_llm
 
-def query_and_build_context(query_embedding, collection_name="site_collection"):
-    client_qdrant = get_qdrant_client()
 
-    # Use query_points for qdrant-client 1.x
-    try:
-        res = client_qdrant.query_points(
-            collection_name=collection_name,
-            query=query_embedding,
-            limit=TOP_K
-        ).points
-    except Exception as e:
-        print(f"Search failed: {e}")
-        return []
+async def close_async_llm_client() -> None:
+    global _async_llm, _async_llm_loop
+    if _async_llm is not None:
+        try:
+            await _async_llm.close()
+        except Exception:
+            pass
+    _async_llm = None
+    _async_llm_loop = None
 
+
+def _to_snippets(res) -> list:
     snippets = []
     if res:
         for r in res:
@@ -36,6 +62,9 @@ def query_and_build_context(query_embedding, collection_name="site_collection"):
                 {
                     "text": payload.get("text") if isinstance(payload, dict) else str(payload),
                     "url": payload.get("url") if isinstance(payload, dict) else "",
+                    "section": payload.get("section", "") if isinstance(payload, dict) else "",
+                    "chunk_id": payload.get("chunk_id") if isinstance(payload, dict) else None,
+                    "position": payload.get("position") if isinstance(payload, dict) else None,
                     "score": score
                 }
             )
@@ -43,24 +72,182 @@ def query_and_build_context(query_embedding, collection_name="site_collection"):
     return snippets
 
 
-def call_llm_with_context(user_question: str, context_snippets: list):
+# collection -> (hybrid, params, collection to query, tenant filter, looked up at)
+_schemas: Dict[str, Tuple[bool, Optional[models.SearchParams], str, Optional[models.Filter], float]] = {}
+
+Schema = Tuple[bool, Optional[models.SearchParams], str, Optional[models.Filter]]
+
+
+def _cached_schema(collection_name: str) -> Optional[Schema]:
+    entry = _schemas.get(collection_name)
+    return entry[:4] if entry and time.monotonic() - entry[4] < RAG_SCHEMA_TTL else None
+
+
+def _remember_schema(collection_name: str, info, target: str, query_filter: Optional[models.Filter] = None) -> Schema:
+    """Whether the collection is hybrid, the dense search params of its profile (hnsw_ef, oversampling),
+    and where its points are: its own collection, or its tenant in the shared collection."""
+    _, hybrid = collection_schema(info)
+    profile = profile_of(info)
+    params = profile.search_params() if profile is not None else None
+    _schemas[collection_name] = (hybrid, params, target, query_filter, time.monotonic())
+    return hybrid, params, target, query_filter
+
+
+def _is_tenant(collection_name: str, alias_target: Optional[str], exists: bool) -> bool:
+    """In shared tenancy, sites without a collection of their own (not migrated yet) live in the shared one."""
+    return QDRANT_TENANCY == "shared" and alias_target is None and not exists
+
+
+def _schema(client_qdrant, collection_name: str) -> Schema:
+    schema = _cached_schema(collection_name)
+    if schema is None:
+        target = next((a.collection_name for a in client_qdrant.get_aliases().aliases
+                       if a.alias_name == collection_name), None)
+        if _is_tenant(collection_name, target, target is None and client_qdrant.collection_exists(collection_name)):
+            return _remember_schema(collection_name, client_qdrant.get_collection(QDRANT_SHARED_COLLECTION),
+                                    QDRANT_SHARED_COLLECTION, tenant_filter(collection_name))
+        schema = _remember_schema(collection_name, client_qdrant.get_collection(target or collection_name),
+                                  collection_name)
+    return schema
+
+
+async def _aschema(client_qdrant, collection_name: str) -> Schema:
+    schema = _cached_schema(collection_name)
+    if schema is None:
+        target = next((a.collection_name for a in (await client_qdrant.get_aliases()).aliases
+                       if a.alias_name == collection_name), None)
+        exists = target is None and await client_qdrant.collection_exists(collection_name)
+        if _is_tenant(collection_name, target, exists):
+            return _remember_schema(collection_name, await client_qdrant.get_collection(QDRANT_SHARED_COLLECTION),
+                                    QDRANT_SHARED_COLLECTION, tenant_filter(collection_name))
+        schema = _remember_schema(collection_name, await client_qdrant.get_collection(target or collection_name),
+                                  collection_name)
+    return schema
+
+
+def _search_request(query_embedding, question, hybrid: bool, params: Optional[models.SearchParams],
+                    query_filter: Optional[models.Filter] = None) -> dict:
+    """query_points arguments: dense and BM25 results fused by RRF on hybrid collections, dense search otherwise.
+
+    With reranking, RAG_CANDIDATES results are fetched and cut down to TOP_K
+    afterwards. `params` tunes the dense search for the collection's profile;
+    `query_filter` restricts every search to one tenant of the shared collection.
+    """
+    limit = max(TOP_K, RAG_CANDIDATES) if RAG_RERANK and question else TOP_K
+    if not (hybrid and RAG_HYBRID and question):
+        return {"query": query_embedding, "limit": limit, "search_params": params, "query_filter": query_filter}
+    return {
+        "prefetch": [
+            models.Prefetch(query=query_embedding, limit=max(limit, RAG_CANDIDATES), params=params,
+                            filter=query_filter),
+            models.Prefetch(query=bm25_query(question), using=SPARSE_VECTOR, limit=max(limit, RAG_CANDIDATES),
+                            filter=query_filter),
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "query_filter": query_filter,
+        "limit": limit,
+    }
+
+
+def _select(question, snippets: list) -> list:
+    if RAG_RERANK and question:
+        return rerank(question, snippets, TOP_K)
+    return snippets[:TOP_K]
+
+
+def query_and_build_context(query_embedding, collection_name="site_collection", question=None):
+    """Retrieve the TOP_K snippets for a question; `question` enables BM25 matching and reranking."""
+    client_qdrant = get_qdrant_client()
+
+    for attempt in (1, 2):
+        try:
+            hybrid, params, target, query_filter = _schema(client_qdrant, collection_name)
+            res = client_qdrant.query_points(
+                collection_name=target,
+                **_search_request(query_embedding, question, hybrid, params, query_filter)
+            ).points
+            break
+        except Exception as e:
+            # The alias may have moved to a version with another schema (or the site to the shared
+            # collection): look it up again once
+            if attempt == 1 and _schemas.pop(collection_name, None) is not None:
+                continue
+            print(f"Search failed: {e}")
+            return []
+
+    return _select(question, _to_snippets(res))
+
+
+async def aquery_and_build_context(query_embedding, collection_name="site_collection", question=None):
+    """Async variant of query_and_build_context used by /chat."""
+    client_qdrant = get_async_qdrant_client()
+
+    for attempt in (1, 2):
+        try:
+            hybrid, params, target, query_filter = await _aschema(client_qdrant, collection_name)
+            res = (await client_qdrant.query_points(
+                collection_name=target,
+                **_search_request(query_embedding, question, hybrid, params, query_filter)
+            )).points
+            break
+        except Exception as e:
+            if attempt == 1 and _schemas.pop(collection_name, None) is not None:
+                continue
+            print(f"Search failed: {e}")
+            return []
+
+    return _select(question, _to_snippets(res))
+
+
+def _build_messages(user_question: str, context_snippets: list) -> list:
     prompt_parts = ["You are a website assistant. Use only the provided context:"]
-    for s in context_snippets:
+    # Neighbouring chunks merged into passages, repeats dropped, within RAG_CONTEXT_MAX_TOKENS
+    for passage in build_context(context_snippets):
         prompt_parts.append("---")
-        prompt_parts.append(s["text"])
+        prompt_parts.append(passage["text"])
     prompt_parts.append(f"---\nQuestion: {user_question}")
 
     prompt = "\n".join(prompt_parts)
 
+    return [
+        {"role": "system", "content": "You are a helpful website assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def call_llm_with_context(user_question: str, context_snippets: list):
     response = client_llm.chat.completions.create(
-        model="deepseek-chat",
-        messages=[
-            {"role": "system", "content": "You are a helpful website assistant."},
-            {"role": "user", "content": prompt}
-        ],
+        model=LLM_MODEL,
+        messages=_build_messages(user_question, context_snippets),
+        temperature=0.2
+    )
+
+    answer = response.choices[0].message.content
+
+    return {"answer": answer}
+
+
+async def acall_llm_with_context(user_question: str, context_snippets: list):
+    """Async variant of call_llm_with_context used by /chat."""
+    response = await get_async_llm_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=_build_messages(user_question, context_snippets),
         temperature=0.2
     )
 
     answer = response.choices[0].message.content
 
     return {"answer": answer}
+
+
+async def astream_llm_with_context(user_question: str, context_snippets: list):
+    """Yield answer text deltas as soon as DeepSeek produces them."""
+    stream = await get_async_llm_client().chat.completions.create(
+        model=LLM_MODEL,
+        messages=_build_messages(user_question, context_snippets),
+        temperature=0.2,
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
@@ -1,10 +1,85 @@
+import importlib.util
 import re
+from typing import List, Tuple
+from urllib.parse import urljoin
+
 from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString
 
-def html_to_text(html: str) -> str:
+# lxml's C parser is much faster than the pure-Python html.parser; use it when installed
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "body", "br", "dd", "details", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "header", "hr", "li", "main", "nav", "ol",
+    "p", "pre", "section", "summary", "table", "td", "th", "tr", "ul",
+}
+
+Block = Tuple[str, str]  # (section title, paragraph text)
+
+
+def page_blocks(root) -> List[Block]:
+    """Split a parsed page into paragraphs, each tagged with the heading it falls under.
+
+    Headings start a new section and are kept as a paragraph of their own.
+    Inline markup (links, bold, spans) stays inside its paragraph.
+    """
+    blocks: List[Block] = []
+    section = ""
+    buffer: List[str] = []
+
+    def flush():
+        text = " ".join(" ".join(buffer).split())
+        buffer.clear()
+        if text:
+            blocks.append((section, text))
+
+    # Iterative walk: deeply nested markup must not hit the recursion limit
+    stack = [(iter(root.children), False)]
+    while stack:
+        children, is_block = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if is_block:
+                flush()
+            continue
+        if isinstance(child, NavigableString):
+            if not isinstance(child, PreformattedString):  # comments, doctype, CDATA
+                buffer.append(child)
+        elif child.name in HEADING_TAGS:
+            flush()
+            title = " ".join(child.get_text(" ", strip=True).split())
+            if title:
+                section = title
+                blocks.append((section, title))
+        elif child.name in BLOCK_TAGS:
+            flush()
+            stack.append((iter(child.children), True))
+        else:
+            stack.append((iter(child.children), False))
+    flush()
+    return blocks
+
+
+def extract_page(html: str, base_url: str | None = None) -> Tuple[str, List[str], List[Block]]:
+    """Parse a page once and return (clean text, outgoing links, paragraph blocks).
+
+    Links are absolute (resolved against base_url) and stripped of fragments;
+    filtering by domain is left to the caller. script/style/noscript content is
+    dropped from the text. Blocks are (section title, paragraph) pairs in page
+    order, for structure-aware chunking.
+    """
     print(f"🌐 Processing HTML content, length: {len(html)}")
 
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    links = []
+    for a in soup.find_all('a', href=True):
+        href = a['href'].strip()
+        if href:
+            links.append((urljoin(base_url, href) if base_url else href).split('#')[0])
 
     # Log what we're removing
     scripts = soup.find_all(['script', 'style', 'noscript'])
@@ -32,14 +107,17 @@ def html_to_text(html: str) -> str:
     if words_after < 10:
         print(f"⚠️ Very few words extracted! HTML might be mostly images/videos or protected content")
 
-    return text
-
-def chunk_text(text: str, chunk_size: int = 50, overlap: int = 10):
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = ' '.join(words[i:i+chunk_size])
-        chunks.append(chunk)
-        i += chunk_size - overlap
-    return chunks
+    return text, links, page_blocks(soup.body or soup)
+
+def html_to_text(html: str) -> str:
+    return extract_page(html)[0]
+
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for batching and budgets."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def normalize_question(question: str) -> str:
+    """Cache key for a chat question: case, extra whitespace and trailing punctuation are ignored."""
+    return re.sub(r"[\s?!.]+$", "", " ".join(question.lower().split()))
@@ -0,0 +1,134 @@
+"""
+Ingest worker: runs queued ingest jobs outside the web process.
+
+With INGEST_MODE=queue the API only enqueues jobs; start one or more workers
+(on any host sharing the queue database) with:
+
+    python -m app.worker
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Any, Dict, Optional
+
+from .browser_pool import close_browser_pool
+from .budget import Budget
+from .http_client import close_http_client
+from .ingest import ingest_background
+from .job_queue import JobQueue, get_job_queue
+from .job_store import get_job_store
+from .processing import close_page_processor
+from .qdrant_client import close_async_qdrant_client
+
+INGEST_WORKER_CONCURRENCY = int(os.getenv("INGEST_WORKER_CONCURRENCY", 2))  # jobs one worker process runs at once
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", 1.0))  # seconds between queue polls when idle
+
+
+class IngestWorker:
+    """Claims jobs from the queue and runs them, renewing their leases meanwhile.
+
+    The queue enforces the global and per-collection limits; `concurrency`
+    only caps what this process takes on. On stop, running jobs are cancelled
+    and handed back to the queue so another worker picks them up.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = INGEST_WORKER_CONCURRENCY,
+                 poll_interval: float = INGEST_POLL_INTERVAL, owner: Optional[str] = None):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def run(self) -> None:
+        """Poll the queue until stop() is called."""
+        self._stopping = asyncio.Event()
+        print(f"Ingest worker {self.owner} started (concurrency={self.concurrency})")
+        try:
+            while not self._stopping.is_set():
+                job = None
+                if len(self._running) < self.concurrency:
+                    job = await asyncio.to_thread(self.queue.claim, self.owner)
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task = asyncio.create_task(self._run_job(job))
+                self._running[job["job_id"]] = task
+                task.add_done_callback(lambda _, job_id=job["job_id"]: self._running.pop(job_id, None))
+        finally:
+            await self._shutdown()
+        print(f"Ingest worker {self.owner} stopped")
+
+    def stop(self) -> None:
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        store = get_job_store()
+        if job["exhausted"]:
+            msg = f"Ingest job {job_id} given up after {self.queue.max_attempts} attempt(s)"
+            print(msg)
+            store.set_status(job_id, "failed", error=msg, message=msg)
+            return
+        if job["attempts"] > 1:
+            print(f"Retrying ingest job {job_id} (attempt {job['attempts']}/{self.queue.max_attempts})")
+            store.update_progress(job_id, {"message": f"Retrying (attempt {job['attempts']})..."})
+
+        params = dict(job["params"])
+        budget = params.pop("budget", None)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, asyncio.current_task()))
+        try:
+            await ingest_background(job_id, budget=Budget(**budget) if budget else None, **params)
+        finally:
+            heartbeat.cancel()
+        await asyncio.to_thread(self.queue.complete, job_id, self.owner)
+
+    async def _heartbeat(self, job_id: str, job_task: asyncio.Task) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                renewed = await asyncio.to_thread(self.queue.renew, job_id, self.owner)
+            except Exception as e:
+                print(f"Warning: failed to renew lease of job {job_id}: {e}")
+                continue
+            if not renewed:
+                # Another worker took the job over (our lease expired): do not run it twice
+                print(f"Warning: lost lease of job {job_id}, stopping it")
+                job_task.cancel()
+                return
+
+    async def _shutdown(self) -> None:
+        tasks = dict(self._running)
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        store = get_job_store()
+        for job_id in tasks:
+            self.queue.release(job_id, self.owner)
+            store.set_status(job_id, "pending", message="Re-queued: worker stopped", expect="running")
+
+
+async def run_worker() -> None:
+    worker = IngestWorker(get_job_queue())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await close_browser_pool()
+        close_page_processor()
+        await close_async_qdrant_client()
+        await close_http_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -0,0 +1,123 @@
+"""
+Benchmark: chunking strategies on a fixture corpus.
+
+For every strategy it reports the number of chunks, the estimated embedding
+tokens and the retrieval hit rate: the share of fixture questions whose
+expected answer appears in one of the top-k retrieved chunks.
+
+Retrieval uses a local TF-IDF model by default, so the benchmark runs offline;
+pass --jina to embed with the real Jina model (needs JINA_API_KEY).
+
+Run from backend/: python -m benchmarks.bench_chunking [--top-k 3] [--budgets 100,300,600] [--jina]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.chunking import chunk_blocks
+from app.utils import estimate_tokens, extract_page
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 50, overlap: int = 10) -> List[str]:
+    """The previous chunker: fixed word windows with overlap."""
+    words = text.split()
+    chunks = []
+    i = 0
+    while i < len(words):
+        chunks.append(' '.join(words[i:i + chunk_size]))
+        i += chunk_size - overlap
+    return chunks
+
+
+def load_corpus():
+    pages = []
+    with contextlib.redirect_stdout(io.StringIO()):  # extract_page logs every page
+        for path in sorted((FIXTURES / "site").glob("*.html")):
+            text, _, blocks = extract_page(path.read_text(encoding="utf-8"))
+            pages.append({"name": path.name, "text": text, "blocks": blocks})
+    questions = json.loads((FIXTURES / "questions.json").read_text(encoding="utf-8"))
+    return pages, questions
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def tfidf_embedder(chunks: List[str]) -> Callable[[List[str]], np.ndarray]:
+    """Offline stand-in for the embedding model, fitted on the chunks being compared."""
+    df = Counter(term for chunk in chunks for term in set(_terms(chunk)))
+    vocab = {term: i for i, term in enumerate(df)}
+    idf = np.array([math.log((len(chunks) + 1) / (df[t] + 1)) + 1 for t in vocab])
+
+    def embed(texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(vocab)))
+        for row, text in enumerate(texts):
+            for term, count in Counter(_terms(text)).items():
+                if term in vocab:
+                    matrix[row, vocab[term]] = count
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    return embed
+
+
+def jina_embedder(chunks: List[str]) -> Callable[[List[str]], np.ndarray]:
+    from app.embeddings import embed_texts
+
+    def embed(texts: List[str]) -> np.ndarray:
+        matrix = np.array(embed_texts(texts), dtype=float)
+        return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    return embed
+
+
+def hit_rate(chunks: List[str], questions: List[Dict[str, str]], top_k: int, make_embedder) -> float:
+    embed = make_embedder(chunks)
+    chunk_vectors = embed(chunks)
+    question_vectors = embed([q["question"] for q in questions])
+    hits = 0
+    for q, vector in zip(questions, question_vectors):
+        top = np.argsort(-(chunk_vectors @ vector))[:top_k]
+        if any(q["answer"].lower() in chunks[i].lower() for i in top):
+            hits += 1
+    return hits / len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--budgets", default="100,300,600", help="token budgets for the structure-aware chunker")
+    parser.add_argument("--jina", action="store_true", help="embed with Jina instead of the offline TF-IDF model")
+    args = parser.parse_args()
+
+    pages, questions = load_corpus()
+    make_embedder = jina_embedder if args.jina else tfidf_embedder
+    strategies = {"chunk_text 50w/10 overlap": [c for p in pages for c in legacy_chunk_text(p["text"])]}
+    for budget in (int(b) for b in args.budgets.split(",")):
+        strategies[f"structure-aware {budget} tok"] = [
+            c["text"] for p in pages for c in chunk_blocks(p["blocks"], max_tokens=budget)
+        ]
+
+    print(f"{len(pages)} page(s), {len(questions)} question(s), top_k={args.top_k}, "
+          f"{'Jina' if args.jina else 'TF-IDF'} retrieval\n")
+    print(f"{'strategy':<28} {'chunks':>7} {'embed tokens':>13} {'hit rate':>9}")
+    for name, chunks in strategies.items():
+        tokens = sum(estimate_tokens(c) for c in chunks)
+        rate = hit_rate(chunks, questions, args.top_k, make_embedder)
+        print(f"{name:<28} {len(chunks):>7} {tokens:>13} {rate:>9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Micro-benchmark: HTML parsing throughput on large pages.
+
+Compares the old two-pass extraction (html.parser for links, then a second
+html.parser tree in html_to_text) with the single-pass extract_page, for every
+parser backend installed.
+
+Run from backend/: python -m benchmarks.bench_extract [--pages 20] [--paragraphs 2000]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from app import utils
+
+
+def make_page(paragraphs: int, seed: int) -> str:
+    """A large, link-heavy page with scripts and styles to strip."""
+    parts = ["<html><head><title>Page</title><style>body { margin: 0 }</style>",
+             "<script>window.dataLayer = [];</script></head><body><nav>"]
+    parts += [f'<a href="/section/{i}">Section {i}</a>' for i in range(50)]
+    parts.append("</nav><main>")
+    for i in range(paragraphs):
+        parts.append(
+            f"<div class='block'><h2>Heading {seed}-{i}</h2>"
+            f"<p>Paragraph {i} with <b>bold</b>, <i>italic</i> and a "
+            f"<a href='/article/{seed}/{i}#top'>link {i}</a> to another article.</p></div>"
+        )
+        if i % 100 == 0:
+            parts.append(f"<script>track({i});</script><noscript>enable js</noscript>")
+    parts.append("</main></body></html>")
+    return "".join(parts)
+
+
+def two_pass(html: str, url: str):
+    """Baseline: the crawler's link discovery followed by the old html_to_text."""
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(url, a["href"]).split("#")[0] for a in soup.find_all("a", href=True)]
+    soup = BeautifulSoup(html, "html.parser")
+    for s in soup.find_all(["script", "style", "noscript"]):
+        s.decompose()
+    text = " ".join(soup.get_text(separator=" ", strip=True).split())
+    return text, links
+
+
+def single_pass(parser: str):
+    def run(html: str, url: str):
+        utils.HTML_PARSER = parser
+        return utils.extract_page(html, url)[:2]
+    return run
+
+
+def measure(name: str, fn, pages, repeat: int):
+    total_bytes = sum(len(p) for p in pages) * repeat
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # extract_page logs every page
+        for _ in range(repeat):
+            for i, page in enumerate(pages):
+                fn(page, f"https://example.com/{i}")
+    elapsed = time.perf_counter() - start
+    count = len(pages) * repeat
+    print(f"{name:<28} {count / elapsed:8.1f} pages/s {total_bytes / elapsed / 1e6:8.2f} MB/s")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    pages = [make_page(args.paragraphs, seed) for seed in range(args.pages)]
+    print(f"{len(pages)} page(s), {sum(len(p) for p in pages) / len(pages) / 1024:.0f} KiB each on average\n")
+
+    # Same output from every variant before timing anything
+    reference = two_pass(pages[0], "https://example.com/0")
+    backends = ["html.parser"]
+    if importlib.util.find_spec("lxml"):
+        backends.append("lxml")
+    else:
+        print("lxml not installed: only html.parser is measured\n")
+    original = utils.HTML_PARSER
+    try:
+        for backend in backends:
+            with contextlib.redirect_stdout(io.StringIO()):
+                assert single_pass(backend)(pages[0], "https://example.com/0") == reference, backend
+
+        baseline = measure("two-pass html.parser", two_pass, pages, args.repeat)
+        for backend in backends:
+            elapsed = measure(f"single-pass {backend}", single_pass(backend), pages, args.repeat)
+            print(f"{'':<28} {baseline / elapsed:8.2f}x vs two-pass")
+    finally:
+        utils.HTML_PARSER = original
+
+
+if __name__ == "__main__":
+    main()
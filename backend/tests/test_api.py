@@ -4,6 +4,8 @@ Run with: pytest backend/tests/test_api.py -v
 Or inside container: docker compose exec backend pytest tests/test_api.py -v
 """
 
+import asyncio
+import json
 import os
 import pytest
 from fastapi.testclient import TestClient
@@ -59,6 +61,279 @@ class TestChatEndpoint:
         assert response.status_code in [200, 500]
 
 
+class TestChatAsyncPath:
+    """Test /chat end to end with in-process stand-ins for Jina, Qdrant and DeepSeek."""
+
+    @pytest.fixture
+    def offline_chat(self, monkeypatch):
+        from types import SimpleNamespace
+
+        from qdrant_client import AsyncQdrantClient, models
+
+        import app.embeddings as embeddings_module
+        import app.main as main_module
+        import app.rag as rag_module
+        from app.answer_cache import AnswerCache
+        from app.embedding_cache import QueryEmbeddingCache
+
+        qdrant = AsyncQdrantClient(":memory:")
+        prompts = []
+
+        async def fake_embed(texts, on_progress=None):
+            return [[1.0, 0.0] for _ in texts]
+
+        async def fake_completion(**kwargs):
+            prompts.append(kwargs["messages"][-1]["content"])
+            if kwargs.get("stream"):
+                async def deltas():
+                    for piece in ["It sells ", "moose milk."]:
+                        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+                return deltas()
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="It sells moose milk."))])
+
+        async def setup():
+            await qdrant.create_collection("offline", vectors_config=models.VectorParams(size=2, distance="Cosine"))
+            await qdrant.upsert("offline", points=[models.PointStruct(
+                id=1, vector=[1.0, 0.0], payload={"text": "The farm sells moose milk.", "url": "https://f/", "chunk_id": 0}
+            )])
+
+        fake_llm = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_completion)))
+        monkeypatch.setattr(embeddings_module, "aembed_texts", fake_embed)
+        queries = QueryEmbeddingCache(max_entries=10)
+        monkeypatch.setattr(embeddings_module, "get_query_embedding_cache", lambda: queries)
+        answers = AnswerCache(max_distance=0.05, ttl=60, max_entries=10)
+        monkeypatch.setattr(main_module, "get_answer_cache", lambda: answers)
+        monkeypatch.setattr(rag_module, "get_async_qdrant_client", lambda: qdrant)
+        monkeypatch.setattr(rag_module, "get_async_llm_client", lambda: fake_llm)
+        return setup, prompts
+
+    def test_chat_answers_from_context(self, client, offline_chat):
+        setup, prompts = offline_chat
+        asyncio.run(setup())
+        response = client.post("/chat", json={"question": "What do they sell?", "collection": "offline"})
+
+        assert response.status_code == 200
+        assert response.json() == {"answer": "It sells moose milk.", "status": "ready"}
+        assert "The farm sells moose milk." in prompts[0]
+
+    def test_chat_stream_sends_tokens_then_sources(self, client, offline_chat):
+        setup, _ = offline_chat
+        asyncio.run(setup())
+
+        response = client.post("/chat/stream", json={"question": "What do they sell?", "collection": "offline"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [
+            (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in response.text.strip().split("\n\n")
+        ]
+        assert events == [
+            ("token", {"delta": "It sells "}),
+            ("token", {"delta": "moose milk."}),
+            ("sources", {"sources": ["https://f/"]}),
+            ("done", {"status": "ready"}),
+        ]
+
+    def test_repeated_question_is_answered_from_cache(self, client, offline_chat):
+        import app.main as main_module
+
+        setup, prompts = offline_chat
+        asyncio.run(setup())
+        first = client.post("/chat", json={"question": "What do they sell?", "collection": "offline"})
+        # Same embedding from the fake embedder: a near-identical question hits the cache
+        second = client.post("/chat", json={"question": "what do they SELL", "collection": "offline"})
+
+        assert second.json() == first.json()
+        assert len(prompts) == 1
+        assert main_module.get_answer_cache().stats()["hits"] == 1
+
+        main_module.get_answer_cache().invalidate("offline")
+        client.post("/chat", json={"question": "What do they sell?", "collection": "offline"})
+        assert len(prompts) == 2
+
+    def test_chat_keeps_answering_while_the_collection_is_reingested(self, client, offline_chat, monkeypatch):
+        import app.ingest as ingest_module
+        from app.job_store import MemoryJobStore
+
+        store = MemoryJobStore()
+        monkeypatch.setattr(ingest_module, "get_job_store", lambda: store)
+        for collection in ("offline", "new_site"):
+            store.create(f"job-{collection}", "crawl", "https://f/", collection)
+            store.set_status(f"job-{collection}", "running")
+        setup, _ = offline_chat
+        asyncio.run(setup())
+
+        answer = client.post("/chat", json={"question": "What do they sell?", "collection": "offline"}).json()
+        assert answer == {"answer": "It sells moose milk.", "status": "ready"}
+        # Nothing indexed yet: the first ingest of the collection is still running
+        first = client.post("/chat", json={"question": "What do they sell?", "collection": "new_site"}).json()
+        assert first["status"] == "processing"
+
+
+class TestIngestEvents:
+    """Test the /ingest/events progress stream."""
+
+    @pytest.fixture
+    def store(self, monkeypatch):
+        import app.ingest as ingest_module
+        import app.main as main_module
+        from app.job_store import MemoryJobStore
+
+        store = MemoryJobStore()
+        monkeypatch.setattr(main_module, "get_job_store", lambda: store)
+        monkeypatch.setattr(ingest_module, "get_job_store", lambda: store)
+        return store
+
+    def test_job_stream_pushes_progress_until_done(self, store):
+        # TestClient buffers streaming bodies, so the event stream is consumed directly
+        import app.main as main_module
+
+        class _Request:
+            async def is_disconnected(self):
+                return False
+
+        store.create("j1", "url", "https://f/", "col")
+        store.set_status("j1", "running")
+
+        async def consume():
+            response = await main_module.ingest_events(_Request(), job_id="j1")
+            assert response.media_type == "text/event-stream"
+            events = []
+            async for block in response.body_iterator:
+                event, data = block.strip().split("\n")
+                events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+                # Written while the stream waits, as a running ingest would
+                if len(events) == 1:
+                    store.update_progress("j1", {"pages_fetched": 2})
+                elif len(events) == 2:
+                    store.set_status("j1", "completed", result={"chunks_indexed": 4})
+            return events
+
+        events = asyncio.run(asyncio.wait_for(consume(), timeout=10))
+
+        assert [(e, d["status"], d["progress"]["pages_fetched"]) for e, d in events] == [
+            ("progress", "running", 0),
+            ("progress", "running", 2),
+            ("done", "completed", 2),
+        ]
+        assert events[-1][1]["result"] == {"chunks_indexed": 4}
+
+    def test_job_whose_worker_died_times_out_on_the_stream(self, store, monkeypatch):
+        import app.ingest as ingest_module
+        import app.main as main_module
+
+        class _Request:
+            async def is_disconnected(self):
+                return False
+
+        monkeypatch.setattr(ingest_module, "INGEST_TIMEOUT_SECONDS", 0.3)
+        monkeypatch.setattr(main_module, "INGEST_EVENTS_POLL_INTERVAL", 0.05)
+        # Running, and never written again
+        store.create("j1", "url", "https://f/", "col")
+        store.set_status("j1", "running")
+
+        async def consume():
+            response = await main_module.ingest_events(_Request(), job_id="j1")
+            return [block.split("\n")[0] async for block in response.body_iterator]
+
+        events = asyncio.run(asyncio.wait_for(consume(), timeout=10))
+
+        assert events == ["event: progress", "event: done"]
+        assert store.get("j1")["status"] == "failed"
+
+    def test_unknown_job_gets_an_error_event(self, client, store):
+        response = client.get("/ingest/events", params={"job_id": "missing"})
+        assert response.text.startswith("event: error\n")
+
+
+class TestAnswerCache:
+    """Semantic matching, TTL and LRU eviction of the answer cache."""
+
+    def test_matches_by_cosine_distance_within_collection(self):
+        from app.answer_cache import AnswerCache
+
+        cache = AnswerCache(max_distance=0.05, ttl=60, max_entries=10)
+        cache.store("a", "opening hours?", [1.0, 0.0], "9 to 5", ["https://a/"])
+
+        assert cache.lookup("a", "when are you open?", [0.99, 0.05])["answer"] == "9 to 5"
+        assert cache.lookup("a", "where are you?", [0.0, 1.0]) is None
+        assert cache.lookup("b", "opening hours?", [1.0, 0.0]) is None
+
+    def test_expired_and_least_recently_used_entries_are_dropped(self, monkeypatch):
+        import app.answer_cache as answer_cache
+
+        now = [1000.0]
+        monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+        cache = answer_cache.AnswerCache(max_distance=0.01, ttl=60, max_entries=2)
+        cache.store("a", "q1", [1.0, 0.0], "a1")
+        cache.store("a", "q2", [0.0, 1.0], "a2")
+        cache.lookup("a", "q1", [1.0, 0.0])
+        cache.store("a", "q3", [-1.0, 0.0], "a3")  # evicts q2, the least recently used
+
+        assert cache.lookup("a", "q2", [0.0, 1.0]) is None
+        assert cache.lookup("a", "q1", [1.0, 0.0])["answer"] == "a1"
+        now[0] += 61
+        assert cache.lookup("a", "q1", [1.0, 0.0]) is None
+
+    def test_answers_older_than_an_ingest_in_another_process_are_dropped(self, monkeypatch):
+        import app.answer_cache as answer_cache
+
+        now = [1000.0]
+        updated = {}
+        monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+        cache = answer_cache.AnswerCache(max_distance=0.01, ttl=60, max_entries=10, updated_at=updated.get)
+        cache.store("a", "q1", [1.0, 0.0], "old answer")
+        assert cache.lookup("a", "q1", [1.0, 0.0])["answer"] == "old answer"
+
+        now[0] += 1
+        updated["a"] = now[0]  # a queue worker re-indexed the collection
+        assert cache.lookup("a", "q1", [1.0, 0.0]) is None
+        cache.store("a", "q1", [1.0, 0.0], "new answer")
+        assert cache.lookup("a", "q1", [1.0, 0.0])["answer"] == "new answer"
+
+
+class TestContextBuilder:
+    """Merging of retrieved chunks into passages and the context token budget."""
+
+    def test_neighbouring_chunks_are_merged_and_repeats_dropped(self):
+        from app.context import build_context
+
+        snippets = [
+            {"text": "one two three four five", "url": "https://a/", "chunk_id": 3, "position": 1, "score": 0.6},
+            # Admitted before chunk 1 (chunk_id follows admission order) but next to it in the page
+            {"text": "four five six seven", "url": "https://a/", "chunk_id": 0, "position": 2, "score": 0.9},
+            {"text": "far away chunk", "url": "https://a/", "chunk_id": 2, "position": 7, "score": 0.5},
+            {"text": "other page", "url": "https://b/", "chunk_id": 2, "position": 2, "score": 0.7},
+            {"text": "Other  page", "url": "https://c/", "chunk_id": 0, "position": 0, "score": 0.4},  # same text
+            {"text": "indexed before positions", "url": "https://b/", "chunk_id": 3, "score": 0.3},
+        ]
+
+        context = build_context(snippets, max_tokens=0)
+
+        assert [(p["text"], p["positions"]) for p in context] == [
+            ("one two three four five six seven", [1, 2]),
+            ("other page", [2]),
+            ("far away chunk", [7]),
+            ("indexed before positions", []),
+        ]
+
+    def test_passages_fill_the_budget_in_score_order(self):
+        from app.context import build_context
+
+        snippets = [
+            {"text": "word " * 256, "url": "https://a/", "position": 0, "score": 0.9},  # 320 tokens
+            {"text": "filler " * 115, "url": "https://b/", "position": 0, "score": 0.8},  # 200 tokens
+            {"text": "short answer " * 6, "url": "https://c/", "position": 0, "score": 0.1},  # 19 tokens
+        ]
+
+        # 30 tokens left after the best passage: too little for a cut, the short one still fits
+        assert [p["url"] for p in build_context(snippets, max_tokens=350)] == ["https://a/", "https://c/"]
+        context = build_context(snippets, max_tokens=420)
+        assert [(p["url"], p.get("truncated", False)) for p in context] == [("https://a/", False), ("https://b/", True)]
+        assert sum(len(p["text"]) // 4 for p in context) <= 420
+
+
 class TestQdrantConnection:
     """Test Qdrant client connection and collection discovery."""
 
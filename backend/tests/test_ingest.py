@@ -0,0 +1,956 @@
+"""
+Tests for the ingest pipeline building blocks (no network, no Qdrant).
+Run with: pytest backend/tests/test_ingest.py -v
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from app import ingest, pipeline
+
+
+def _site(pages: dict, delay: float = 0.0, stats: dict | None = None):
+    """Mock transport serving a static site from a {path: html} mapping."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if stats is not None:
+            stats["in_flight"] = stats.get("in_flight", 0) + 1
+            stats["max_in_flight"] = max(stats.get("max_in_flight", 0), stats["in_flight"])
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            body = pages.get(request.url.path)
+            if body is None:
+                return httpx.Response(404, text="not found")
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/html"})
+        finally:
+            if stats is not None:
+                stats["in_flight"] -= 1
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.fixture
+def mock_site(monkeypatch):
+    """Point the shared HTTP client at a mock transport."""
+
+    def install(transport):
+        monkeypatch.setattr(ingest, "get_http_client", lambda: httpx.AsyncClient(transport=transport))
+
+    return install
+
+
+class TestCrawlSite:
+    """Test the concurrent static crawler."""
+
+    def test_follows_same_domain_links(self, mock_site):
+        links = "".join(f'<a href="/p{i}">p{i}</a>' for i in range(5))
+        pages = {"/": f'<html><body>{links}<a href="https://other.org/x">x</a></body></html>'}
+        pages.update({f"/p{i}": "<html><body>page</body></html>" for i in range(5)})
+        mock_site(_site(pages))
+
+        result = asyncio.run(ingest.crawl_site("https://example.com/", max_pages=50))
+
+        urls = {url for url, _ in result}
+        assert urls == {"https://example.com/"} | {f"https://example.com/p{i}" for i in range(5)}
+
+    def test_respects_max_pages_and_concurrency(self, mock_site):
+        links = "".join(f'<a href="/p{i}">p{i}</a>' for i in range(20))
+        pages = {"/": f"<html><body>{links}</body></html>"}
+        pages.update({f"/p{i}": "<html><body>page</body></html>" for i in range(20)})
+        stats = {}
+        mock_site(_site(pages, delay=0.05, stats=stats))
+
+        result = asyncio.run(
+            ingest.crawl_site("https://example.com/", max_pages=8, concurrency=6, per_host_concurrency=3)
+        )
+
+        assert len(result) == 8
+        assert 1 < stats["max_in_flight"] <= 3
+
+
+    def test_conditional_requests_reuse_stored_links(self, mock_site):
+        requests_seen = []
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            requests_seen.append((request.url.path, request.headers.get("If-None-Match")))
+            if request.url.path == "/" and request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304, headers={"ETag": '"v1"'})
+            return httpx.Response(200, text="<html><body>about</body></html>")
+
+        mock_site(httpx.MockTransport(handler))
+        validators = {"https://example.com/": {"etag": '"v1"', "links": ["https://example.com/about"]}}
+        report = {}
+
+        result = asyncio.run(ingest.crawl_site("https://example.com/", validators=validators, report=report))
+
+        assert [url for url, _ in result] == ["https://example.com/about"]
+        assert report["not_modified"] == ["https://example.com/"]
+        assert report["exhausted"] is True
+        assert ("/", '"v1"') in requests_seen
+
+
+class TestExtractPage:
+    """Test single-pass text and link extraction."""
+
+    def test_returns_clean_text_and_absolute_links(self):
+        from app.utils import extract_page
+
+        html = (
+            "<html><head><style>p {color: red}</style><script>var x = 1;</script></head>"
+            '<body><p>Hello   <b>world</b></p><a href="/about#team">About</a>'
+            '<a href="https://other.org/">Other</a><noscript>enable js</noscript></body></html>'
+        )
+
+        text, links, blocks = extract_page(html, "https://example.com/docs/")
+
+        assert text == "Hello world About Other"
+        assert links == ["https://example.com/about", "https://other.org/"]
+        assert blocks == [("", "Hello world"), ("", "About Other")]
+
+
+class TestDeduplicator:
+    """Test exact and near-duplicate chunk detection."""
+
+    def test_exact_and_near_duplicates(self):
+        from app.dedup import Deduplicator
+
+        dedup = Deduplicator(threshold=0.8)
+        text = " ".join(f"word{i}" for i in range(60))
+
+        assert not dedup.is_duplicate(text)
+        assert dedup.is_duplicate(text.upper() + " !")  # same words after normalization
+        assert dedup.is_duplicate(text.replace("word30", "changed"))  # one word differs
+        assert not dedup.is_duplicate(" ".join(f"other{i}" for i in range(60)))
+        assert dedup.stats()["duplicate_chunks_removed"] == 1
+        assert dedup.stats()["near_duplicate_chunks_removed"] == 1
+
+
+class TestLexical:
+    """Test BM25 sparse vectors and the lexical reranker."""
+
+    def test_codes_are_indexed_whole_and_in_parts(self):
+        from app.lexical import bm25_vector, tokenize
+
+        assert tokenize("Error E-1042 on the X5 model") == ["error", "e-1042", "1042", "x5", "model"]
+        vector = bm25_vector("pump pump pump valve")
+        assert len(vector.indices) == 2 and max(vector.values) < 2.2  # saturated term frequency
+
+    def test_rerank_prefers_chunks_with_the_asked_code(self):
+        from app.lexical import rerank
+
+        snippets = [
+            {"text": "Our pumps are reliable and quiet.", "url": "u1", "score": 0.9},
+            {"text": "Part ZX-9 fits the pool pump.", "url": "u2", "score": 0.7},
+            {"text": "Shipping takes two days.", "url": "u3", "score": 0.5},
+        ]
+        assert [s["url"] for s in rerank("Which pump does ZX-9 fit?", snippets, 2)] == ["u2", "u1"]
+
+
+class TestChunkScheduler:
+    """Test how the embedding budget is spread over pages and chunks."""
+
+    def _chunk(self, words):
+        return {"text": " ".join(words), "section": ""}
+
+    def test_budget_goes_to_long_pages_and_new_content(self):
+        from app.budget import Budget, ChunkScheduler
+
+        scheduler = ChunkScheduler(Budget(max_chunks=4), eager_share=0.5)
+        long_page = [self._chunk(f"long{i}w{j}" for j in range(20)) for i in range(5)]
+        repeat = self._chunk(f"long0w{j}" for j in range(20))  # same terms as the first chunk
+        short_page = [self._chunk(f"short{j}" for j in range(20))]
+
+        first = scheduler.select("/long", long_page + [repeat], depth=0, expected_pages=2, accept=lambda c: True)
+        second = scheduler.select("/short", short_page, depth=1, expected_pages=1, accept=lambda c: True)
+        drained = scheduler.drain(lambda c: True)
+
+        assert first == long_page[:1]  # eager share: half of 4 chunks over 2 pages
+        assert second == short_page
+        assert [url for url, _ in drained] == ["/long", "/long"]  # leftover budget goes to the long page
+        assert all(chunk is not repeat for _, chunk in drained)
+        assert scheduler.stats()["budget_chunks_used"] == 4
+        assert scheduler.stats()["chunks_over_budget"] == 3
+
+    def test_cost_budget_is_converted_to_tokens(self, monkeypatch):
+        from app import budget
+
+        monkeypatch.setattr(budget, "EMBED_COST_PER_MILLION_TOKENS", 0.05)
+        assert budget.Budget.from_limits(max_cost=0.01).max_tokens == 200_000
+        assert budget.Budget.from_limits(max_tokens=1000, max_cost=0.01).max_tokens == 1000
+        assert not budget.Budget.from_limits(0, 0, 0).limited
+
+
+class TestChunking:
+    """Test the structure-aware chunker."""
+
+    def test_chunks_follow_sections_and_budget(self):
+        from app.chunking import chunk_blocks
+        from app.utils import extract_page
+
+        long_paragraph = " ".join(f"Sentence number {i} about shipping." for i in range(40))
+        html = (
+            "<body><h1>Pricing</h1><p>Plans start at 10 dollars.</p><p>Enterprise is custom.</p>"
+            f"<h2>Shipping</h2><p>{long_paragraph}</p><h2>Contact</h2><p>Call 555.</p></body>"
+        )
+        _, _, blocks = extract_page(html)
+
+        chunks = chunk_blocks(blocks, max_tokens=60, min_tokens=5)
+
+        assert chunks[0] == {"section": "Pricing", "text": "Pricing Plans start at 10 dollars. Enterprise is custom."}
+        shipping = [c for c in chunks if c["section"] == "Shipping"]
+        assert len(shipping) > 1
+        assert all(c["text"].endswith("shipping.") for c in shipping)  # split between sentences
+        assert all(len(c["text"]) // 4 <= 60 for c in chunks)
+        assert chunks[-1] == {"section": "Contact", "text": "Contact Call 555."}
+        # No overlap: every sentence is embedded exactly once
+        assert sum(c["text"].count("Sentence number") for c in chunks) == 40
+
+    def test_small_sections_are_merged(self):
+        from app.chunking import chunk_blocks
+
+        blocks = [("A", "A"), ("A", "short"), ("B", "B"), ("B", "also short")]
+
+        assert chunk_blocks(blocks, max_tokens=100, min_tokens=20) == [{"section": "A", "text": "A short B also short"}]
+
+
+class TestPageProcessor:
+    """Test micro-batched extraction in worker processes."""
+
+    def test_batches_keep_each_page_result(self, monkeypatch):
+        from concurrent.futures import ProcessPoolExecutor
+
+        from app import processing
+
+        batches = []
+        pages = [f"<html><body><p>{'word ' * 20}page{i}</p><a href='/p{i}'>x</a></body></html>" for i in range(10)]
+
+        async def main():
+            with ProcessPoolExecutor(2) as pool:
+                processor = processing.PageProcessor(pool, batch_size=4, batch_wait=0.05)
+                monkeypatch.setattr(processor, "_run", _counting(processor._run))
+                docs = await asyncio.gather(*(processor.process(p, "https://example.com/") for p in pages))
+                return docs, await processor.chunk(docs[1]["blocks"][:1])
+
+        def _counting(run):
+            async def wrapped(batch):
+                batches.append(len(batch))
+                await run(batch)
+            return wrapped
+
+        docs, rechunked = asyncio.run(main())
+
+        assert [d["text"].split()[-2] for d in docs] == [f"page{i}" for i in range(10)]
+        assert docs[3]["links"] == ["https://example.com/p3"]
+        assert docs[0]["chunks"] == processing.process_document(pages[0], "https://example.com/")["chunks"]
+        assert sorted(batches) == [2, 4, 4]
+        assert rechunked == [{"section": "", "text": docs[1]["blocks"][0][1]}]
+
+
+@pytest.mark.filterwarnings("ignore:Payload indexes have no effect")
+class TestIngestPipeline:
+    """Test the streaming ingest pipeline against an in-memory Qdrant."""
+
+    @pytest.fixture
+    def env(self, monkeypatch, tmp_path):
+        from qdrant_client import QdrantClient
+
+        from app.page_state import PageStateStore
+
+        site = {
+            "/": '<html><body><a href="/a">a</a><a href="/b">b</a>' + " home" * 20 + "</body></html>",
+            "/a": "<html><body>" + " alpha" * 20 + "</body></html>",
+            "/b": "<html><body>" + " beta" * 20 + "</body></html>",
+        }
+        embedded = []
+
+        async def fake_embed(texts, on_progress=None):
+            embedded.extend(texts)
+            return [[float(len(t)), 1.0] for t in texts]
+
+        qdrant = QdrantClient(":memory:")
+        store = PageStateStore(str(tmp_path / "state.sqlite3"))
+        monkeypatch.setattr(ingest, "get_http_client", lambda: httpx.AsyncClient(transport=_site(site)))
+        monkeypatch.setattr(pipeline, "aembed_texts", fake_embed)
+        monkeypatch.setattr(pipeline, "get_qdrant_client", lambda: qdrant)
+        monkeypatch.setattr(pipeline, "get_page_state_store", lambda: store)
+        return site, embedded, qdrant
+
+    def _urls(self, qdrant):
+        points, _ = qdrant.scroll("col", limit=100)
+        return sorted({p.payload["url"] for p in points})
+
+    def test_pages_are_indexed_while_crawl_is_running(self, env, monkeypatch):
+        monkeypatch.setattr(pipeline, "PIPELINE_FLUSH_INTERVAL", 0.05)
+        run = pipeline.IngestPipeline("col")
+        upserted_before_page = []
+
+        async def source(add_page):
+            for i in range(3):
+                upserted_before_page.append(run.points_upserted)
+                await add_page(f"https://example.com/{i}", "<p>" + f" word{i}" * 30 + "</p>")
+                await asyncio.sleep(0.3)
+
+        asyncio.run(run.run(source))
+
+        assert upserted_before_page[0] == 0
+        assert upserted_before_page[-1] > 0
+        assert run.points_upserted == run.chunks_extracted
+
+    def test_shared_boilerplate_is_embedded_once(self, env):
+        _, embedded, _ = env
+        nav = "<nav><p>" + " ".join(f"menu{i}" for i in range(12)) + "</p></nav>"
+        footer = "<footer><p>We use cookies to improve your experience on this website, accept them all.</p></footer>"
+        run = pipeline.IngestPipeline("col")
+
+        async def source(add_page):
+            for name in ("goats", "moose", "cheese"):
+                body = "<h1>" + name + "</h1><p>" + " ".join(f"{name}{i}" for i in range(40)) + "</p>"
+                await add_page(f"https://example.com/{name}", f"<html><body>{nav}{body}{footer}</body></html>")
+
+        asyncio.run(run.run(source))
+
+        assert sum("menu0" in t for t in embedded) == 1
+        assert sum("cookies" in t for t in embedded) == 1
+        assert all(any(f"{name}0" in t for t in embedded) for name in ("goats", "moose", "cheese"))
+        assert run.result()["boilerplate_blocks_removed"] == 4
+
+    def test_held_back_chunks_are_indexed_after_the_crawl(self, env):
+        from app.budget import Budget
+
+        _, _, qdrant = env
+        sections = "".join(
+            f"<h2>Part {i}</h2><p>" + " ".join(f"part{i}word{j}" for j in range(80)) + "</p>" for i in range(4)
+        )
+        run = pipeline.IngestPipeline("col", budget=Budget(max_chunks=4))
+
+        async def source(add_page):
+            await add_page("https://example.com/long", f"<html><body>{sections}</body></html>")
+            await add_page("https://example.com/short", "<p>" + " short" * 20 + "</p>")
+
+        asyncio.run(run.run(source))
+
+        points, _ = qdrant.scroll("col", limit=100)
+        ids = sorted((p.payload["url"], p.payload["chunk_id"]) for p in points)
+        assert ids == [("https://example.com/long", i) for i in range(3)] + [("https://example.com/short", 0)]
+        # Positions follow the page, whatever order the budget admitted the chunks in
+        assert all(p.payload["text"].startswith(f"Part {p.payload['position']}")
+                   for p in points if p.payload["url"].endswith("/long"))
+        assert run.result()["budget_chunks_used"] == 4
+
+    def test_only_changed_pages_are_reindexed(self, env):
+        site, embedded, qdrant = env
+        first = asyncio.run(ingest.ingest_url("https://example.com/", "col", incremental=True))
+        assert first["pages_changed"] == 3
+        assert self._urls(qdrant) == ["https://example.com/", "https://example.com/a", "https://example.com/b"]
+
+        embedded.clear()
+        site["/a"] = "<html><body>" + " changed" * 20 + "</body></html>"
+        del site["/b"]
+        second = asyncio.run(ingest.ingest_url("https://example.com/", "col", incremental=True))
+
+        assert (second["pages_unchanged"], second["pages_changed"], second["pages_removed"]) == (1, 1, 1)
+        assert all("changed" in t for t in embedded)
+        assert self._urls(qdrant) == ["https://example.com/", "https://example.com/a"]
+
+    def test_page_cut_short_by_the_budget_is_indexed_again_later(self, env):
+        from app.budget import Budget
+
+        site, _, qdrant = env
+
+        def sections(word):
+            return "<html><body>" + "".join(
+                f"<h2>Part {i}</h2><p>" + " ".join(f"{word}{i}w{j}" for j in range(80)) + "</p>" for i in range(4)
+            ) + "</body></html>"
+
+        def page_chunks():
+            points, _ = qdrant.scroll("col", limit=100)
+            return sorted((p.payload["chunk_id"], p.payload["text"].split()[2][:3])
+                          for p in points if p.payload["url"] == "https://example.com/a")
+
+        site["/a"] = sections("old")
+        asyncio.run(ingest.ingest_url("https://example.com/", "col", incremental=True))
+        assert [c for c, _ in page_chunks()] == [0, 1, 2, 3]
+
+        site["/a"] = sections("new")
+        cut = asyncio.run(ingest.ingest_url("https://example.com/", "col", incremental=True,
+                                            budget=Budget(max_chunks=3)))
+        assert cut["pages_partly_indexed"] == 1
+        # Chunks the budget left out keep their old text instead of disappearing
+        assert len(page_chunks()) == 4 and {w for _, w in page_chunks()} == {"old", "new"}
+
+        again = asyncio.run(ingest.ingest_url("https://example.com/", "col", incremental=True))
+        assert again["pages_changed"] == 1  # not taken as unchanged
+        assert {w for _, w in page_chunks()} == {"new"} and len(page_chunks()) == 4
+
+    def test_reingest_is_built_aside_and_swapped_in(self, env):
+        _, _, qdrant = env
+        asyncio.run(ingest.ingest_url("https://example.com/", "col"))
+        first = qdrant.get_aliases().aliases[0].collection_name
+        run = pipeline.IngestPipeline("col")
+        live_during_run = []
+
+        async def source(add_page):
+            await add_page("https://example.com/a", "<html><body>" + " changed" * 20 + "</body></html>")
+            live_during_run.append(qdrant.get_aliases().aliases[0].collection_name)
+
+        asyncio.run(run.run(source))
+
+        assert live_during_run == [first]
+        assert [(a.alias_name, a.collection_name) for a in qdrant.get_aliases().aliases] == [("col", run.write_collection)]
+        assert [c.name for c in qdrant.get_collections().collections] == [run.write_collection]  # old version dropped
+        # Pages the re-ingest did not visit are carried over, the re-indexed one is replaced
+        assert self._urls(qdrant) == ["https://example.com/", "https://example.com/a", "https://example.com/b"]
+        points, _ = qdrant.scroll("col", limit=100)
+        assert "changed" in next(p.payload["text"] for p in points if p.payload["url"] == "https://example.com/a")
+        assert run.result()["points_carried_over"] == 2
+
+    def test_hybrid_search_finds_exact_codes(self, env, monkeypatch):
+        import app.rag as rag
+        from app.qdrant_client import collection_schema
+
+        _, _, qdrant = env
+        monkeypatch.setattr(rag, "get_qdrant_client", lambda: qdrant)
+        monkeypatch.setattr(rag, "_schemas", {})
+        monkeypatch.setattr(rag, "TOP_K", 1)
+        run = pipeline.IngestPipeline("col")
+
+        async def source(add_page):
+            for code, place in (("XR-7", "garden"), ("ZX-9", "pool"), ("QT-3", "fountain")):
+                await add_page(f"https://example.com/{place}",
+                               f"<p>Spare part {code} fits the {place} pump. It is sold with seals and a manual.</p>")
+
+        asyncio.run(run.run(source))
+
+        assert collection_schema(qdrant.get_collection(run.write_collection)) == (2, True)
+        # The fake embeddings cannot tell the pages apart; BM25 and the reranker can
+        snippets = rag.query_and_build_context([50.0, 1.0], "col", question="Which pump does part ZX-9 fit?")
+        assert [s["url"] for s in snippets] == ["https://example.com/pool"]
+
+    def test_collection_profile_is_kept_and_can_be_migrated(self, env, monkeypatch):
+        import app.rag as rag
+        from app.profiles import PROFILES, profile_of
+        from app.qdrant_client import apply_profile, resolve_collection
+
+        _, _, qdrant = env
+        monkeypatch.setattr(rag, "get_qdrant_client", lambda: qdrant)
+        monkeypatch.setattr(rag, "_schemas", {})
+
+        def live_profile():
+            return profile_of(qdrant.get_collection(resolve_collection(qdrant, "col"))).name
+
+        asyncio.run(ingest.ingest_url("https://example.com/", "col", profile="binary"))
+        assert live_profile() == "binary"
+        asyncio.run(ingest.ingest_url("https://example.com/", "col"))  # new version, same profile
+        assert live_profile() == "binary"
+        assert rag._schema(qdrant, "col")[1].quantization.oversampling == 3.0
+
+        apply_profile(qdrant, "col", PROFILES["scalar"])
+        assert live_profile() == "scalar"
+        kwargs = PROFILES["scalar"].update_kwargs()
+        assert kwargs["vectors_config"][""].on_disk and kwargs["quantization_config"].scalar.always_ram
+
+    def test_sites_share_one_collection_in_shared_tenancy(self, env, monkeypatch):
+        import app.qdrant_client as qdrant_client
+        import app.rag as rag
+
+        _, _, qdrant = env
+        monkeypatch.setattr(rag, "get_qdrant_client", lambda: qdrant)
+        monkeypatch.setattr(rag, "_schemas", {})
+        asyncio.run(ingest.ingest_url("https://example.com/", "old"))  # a collection of its own, from before
+        for module in (pipeline, rag, qdrant_client):
+            monkeypatch.setattr(module, "QDRANT_TENANCY", "shared")
+
+        def pages(*names):
+            async def source(add_page):
+                for name in names:
+                    await add_page(f"https://example.com/{name}", "<p>" + f" {name}" * 20 + "</p>")
+            return source
+
+        for tenant, names in (("red", ["apple", "cherry"]), ("green", ["apple", "lime"])):
+            asyncio.run(pipeline.IngestPipeline(tenant).run(pages(*names)))
+        run = pipeline.IngestPipeline("old")
+        asyncio.run(run.run(pages("a")))
+
+        assert [c.name for c in qdrant.get_collections().collections] == ["sites"]
+        assert qdrant.get_aliases().aliases == []
+        assert qdrant_client.list_collections(qdrant) == ["green", "old", "red"]
+        # The migrated site keeps the pages this run did not visit
+        assert run.result()["points_carried_over"] == 2
+        assert run.result()["total_points_in_collection"] == 3
+        # Same URL in two sites: two points, and each site only finds its own
+        for tenant, urls in (("red", {"apple", "cherry"}), ("green", {"apple", "lime"})):
+            snippets = rag.query_and_build_context([20.0, 1.0], tenant, question=tenant)
+            assert {s["url"].rsplit("/", 1)[1] for s in snippets} == urls
+
+    def test_profiles_keep_the_tenant_graphs_of_the_shared_collection(self, env, monkeypatch):
+        from app.profiles import PROFILES
+        from app.qdrant_client import QDRANT_SHARED_COLLECTION, apply_profile, ensure_collection
+
+        _, _, qdrant = env
+        updates = {}
+        monkeypatch.setattr(qdrant, "update_collection", lambda collection_name, **kwargs:
+                            updates.__setitem__(collection_name, kwargs["hnsw_config"]))
+        ensure_collection(qdrant, QDRANT_SHARED_COLLECTION, 2, shared=True)
+        ensure_collection(qdrant, "col", 2)
+
+        apply_profile(qdrant, QDRANT_SHARED_COLLECTION, PROFILES["scalar"])
+        apply_profile(qdrant, "col", PROFILES["scalar"])
+
+        shared = updates[QDRANT_SHARED_COLLECTION]
+        assert (shared.m, shared.payload_m, shared.ef_construct) == (0, 16, 128)
+        assert (updates["col"].m, updates["col"].payload_m) == (16, None)
+
+
+class TestJobStore:
+    """Test both job store backends."""
+
+    @pytest.fixture(params=["memory", "sqlite"])
+    def store(self, request, tmp_path):
+        from app.job_store import MemoryJobStore, SQLiteJobStore
+
+        if request.param == "memory":
+            return MemoryJobStore(retention=3600, max_finished=2)
+        return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), retention=3600, max_finished=2)
+
+    def test_lifecycle_and_listings(self, store):
+        store.create("a", "url", "https://a.example", "col_a")
+        store.create("b", "url", "https://b.example", "col_b")
+        store.update_progress("a", {"pages_fetched": 3})
+        store.update_progress("a", {"message": "Crawling", "budget": {"chunks": 1}})
+
+        job = store.get("a")
+        assert job["progress"]["pages_fetched"] == 3  # earlier fields survive later updates
+        assert job["progress"]["budget"] == {"chunks": 1}
+        assert [j["job_id"] for j in store.active("col_a")] == ["a"]
+        assert [j["job_id"] for j in store.active()] == ["a", "b"]
+
+        assert store.set_status("a", "running")
+        assert store.set_status("a", "completed", result={"chunks_indexed": 5})
+        assert not store.set_status("a", "failed", expect="running")
+        assert store.get("a")["result"] == {"chunks_indexed": 5}
+        assert store.active("col_a") == []
+        assert [j["job_id"] for j in store.recent(1)] == ["b"]
+        assert store.get("missing") is None
+
+    def test_finished_jobs_are_evicted(self, store, monkeypatch):
+        from app import job_store
+
+        now = [1000.0]
+        monkeypatch.setattr(job_store.time, "time", lambda: now[0])
+        for job_id in ("old", "f1", "f2", "f3", "running"):
+            store.create(job_id, "url", job_id, "col")
+            if job_id != "running":
+                store.set_status(job_id, "completed")
+            now[0] += 4000 if job_id == "old" else 1
+
+        store.evict()  # "old" is past retention (evicted on create already), then only 2 finished jobs are kept
+        assert [j["job_id"] for j in store.recent(10)] == ["running", "f3", "f2"]
+        assert store.get("old") is None
+
+    def test_timeout_counts_from_start_and_is_final(self, store, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+        monkeypatch.setattr(ingest, "get_job_store", lambda: store)
+        monkeypatch.setattr(ingest, "INGEST_TIMEOUT_SECONDS", 100)
+        store.create("a", "url", "https://a.example", "col")
+        now[0] += 500  # waited in the queue
+        store.set_status("a", "running")
+        now[0] += 50
+
+        assert ingest._check_timeout(store.get("a"))["status"] == "running"
+        now[0] += 60
+        assert ingest._check_timeout(store.get("a"))["status"] == "failed"
+        assert not store.set_status("a", "completed", expect="running")  # a late finish does not revive it
+        assert store.get("a")["status"] == "failed"
+
+        assert store.collection_updated_at("col") is None
+        store.mark_collection_updated("col")
+        assert store.collection_updated_at("col") == now[0]
+
+
+class TestJobQueue:
+    """Test the SQLite ingest queue and the worker that drains it."""
+
+    @pytest.fixture
+    def queue(self, tmp_path):
+        from app.job_queue import JobQueue
+
+        return JobQueue(str(tmp_path / "queue.sqlite3"), max_running=2, max_per_collection=1,
+                        lease_seconds=30, max_attempts=2)
+
+    def test_limits_and_expired_leases(self, queue, monkeypatch):
+        from app import job_queue
+
+        now = [1000.0]
+        monkeypatch.setattr(job_queue.time, "time", lambda: now[0])
+        for job_id, collection in (("a1", "a"), ("a2", "a"), ("b1", "b"), ("c1", "c")):
+            queue.enqueue(job_id, collection, {"url": job_id})
+            now[0] += 1
+
+        assert queue.claim("w1")["job_id"] == "a1"
+        assert queue.claim("w1")["job_id"] == "b1"  # a2 waits for a1 (one job per collection)
+        assert queue.claim("w2") is None  # two jobs running overall
+        queue.complete("b1", "w1")
+        assert queue.claim("w2")["job_id"] == "c1"
+
+        now[0] += 31  # w1 died: its lease on a1 expires and another worker retries it
+        retry = queue.claim("w2")
+        assert (retry["job_id"], retry["attempts"], retry["exhausted"]) == ("a1", 2, False)
+        assert not queue.renew("a1", "w1")
+        now[0] += 31  # the retry died too: a1 is given up and removed, a2 can start
+        assert queue.claim("w3") == {"job_id": "a1", "collection": "a", "params": {"url": "a1"},
+                                     "attempts": 3, "exhausted": True}
+        assert queue.claim("w3")["job_id"] == "a2"
+
+    def test_worker_runs_queued_jobs(self, queue, monkeypatch):
+        from app import worker
+        from app.job_store import MemoryJobStore
+
+        store = MemoryJobStore()
+        monkeypatch.setattr(worker, "get_job_store", lambda: store)
+        ran = []
+
+        async def fake_ingest(job_id, url=None, collection_name=None, budget=None, **kwargs):
+            ran.append((job_id, url, budget.max_chunks if budget else None))
+            await asyncio.sleep(0.05)
+
+        monkeypatch.setattr(worker, "ingest_background", fake_ingest)
+        for job_id in ("j1", "j2"):
+            store.create(job_id, "url", job_id, "col")
+            queue.enqueue(job_id, "col", {"url": job_id, "collection_name": "col", "budget": {"max_chunks": 7}})
+
+        async def main():
+            w = worker.IngestWorker(queue, concurrency=2, poll_interval=0.01)
+            runner = asyncio.create_task(w.run())
+            while queue.stats() != {"queued": 0, "running": 0}:
+                await asyncio.sleep(0.01)
+            w.stop()
+            await runner
+
+        asyncio.run(asyncio.wait_for(main(), timeout=10))
+        assert ran == [("j1", "j1", 7), ("j2", "j2", 7)]
+
+
+class TestEmbeddings:
+    """Test the batched embedding client."""
+
+    @pytest.fixture
+    def jina(self, monkeypatch, tmp_path):
+        from app import embeddings
+        from app.embedding_cache import EmbeddingCache
+
+        calls = []
+        failures = {"left": 2}
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            batch = json.loads(request.content)["input"]
+            calls.append(batch)
+            if failures["left"]:
+                failures["left"] -= 1
+                return httpx.Response(429, json={"detail": "rate limited"})
+            # Answer out of order: the client must restore input order from "index"
+            data = [{"index": i, "embedding": [float(len(t))]} for i, t in enumerate(batch)]
+            return httpx.Response(200, json={"data": list(reversed(data))})
+
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+        monkeypatch.setattr(embeddings, "get_embedding_cache", lambda: cache)
+        monkeypatch.setattr(embeddings, "JINA_API_KEY", "test")
+        monkeypatch.setattr(embeddings, "_backoff_delay", lambda attempt, retry_after=None: 0)
+        monkeypatch.setattr(
+            embeddings, "get_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        return embeddings, calls
+
+    def test_make_batches_respects_size_and_tokens(self):
+        from app.embeddings import make_batches
+
+        texts = ["a" * 40] * 10  # ~10 tokens each
+        assert make_batches(texts, batch_size=4, max_tokens=1000) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        assert make_batches(texts, batch_size=100, max_tokens=25) == [[i, i + 1] for i in range(0, 10, 2)]
+
+    def test_retries_and_keeps_input_order(self, jina, monkeypatch):
+        embeddings, calls = jina
+        monkeypatch.setattr(embeddings, "EMBED_BATCH_SIZE", 3)
+        texts = ["x" * n for n in range(1, 11)]
+
+        vectors = asyncio.run(embeddings.aembed_texts(texts))
+
+        assert vectors == [[float(n)] for n in range(1, 11)]
+        assert len(calls) == 4 + 2  # four batches plus two rate-limited attempts
+
+    def test_cached_texts_are_not_sent_again(self, jina):
+        embeddings, calls = jina
+        first = asyncio.run(embeddings.aembed_texts(["alpha", "beta"]))
+        sent = len(calls)
+
+        second = asyncio.run(embeddings.aembed_texts(["beta", "gamma", "alpha"]))
+
+        assert second == [first[1], [5.0], first[0]]
+        assert calls[sent:] == [["gamma"]]
+
+    def test_repeated_queries_skip_the_embedding_request(self, jina, monkeypatch):
+        from app.embedding_cache import QueryEmbeddingCache
+
+        embeddings, calls = jina
+        queries = QueryEmbeddingCache(max_entries=2)
+        monkeypatch.setattr(embeddings, "get_query_embedding_cache", lambda: queries)
+        monkeypatch.setattr(embeddings, "get_embedding_cache", lambda: None)
+
+        first = asyncio.run(embeddings.aembed_query("Opening hours?"))
+        sent = len(calls)
+        again = asyncio.run(embeddings.aembed_query("  opening   HOURS "))
+
+        assert again == first
+        assert len(calls) == sent
+        assert queries.stats()["hits"] == 1 and queries.stats()["misses"] == 1
+
+
+class TestEmbeddingCache:
+    """Test the persistent embedding cache."""
+
+    def test_roundtrip_counters_and_lru_eviction(self, tmp_path):
+        from app.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        cache.put_many("m", ["a", "b"], [[1.0, 2.0], [3.0, 4.0]])
+        assert cache.get_many("m", ["a", "x"]) == [[1.0, 2.0], None]
+        assert cache.get_many("other-model", ["a"]) == [None]
+
+        cache.put_many("m", ["c"], [[5.0, 6.0]])  # "b" is least recently used
+
+        assert cache.get_many("m", ["a", "b", "c"]) == [[1.0, 2.0], None, [5.0, 6.0]]
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert (stats["hits"], stats["misses"]) == (3, 3)
+
+    def test_full_cache_is_counted_once_per_headroom(self, tmp_path):
+        from app.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=100)
+        counts = []
+        evict = cache._evict
+        cache._evict = lambda: counts.append(1) or evict()
+        for i in range(120):
+            cache.put_many("m", [f"t{i}"], [[float(i)]])
+
+        assert cache.stats()["entries"] <= 100
+        assert len(counts) == 4  # counted at inserts 101, 107, 113 and 119: each time it drops to 95 entries
+
+
+class TestBulkUpserter:
+    """Test batched, concurrent Qdrant upserts."""
+
+    class FakeClient:
+        def __init__(self):
+            self.calls = []
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self._lock = threading.Lock()
+
+        def upsert(self, collection_name, points, wait=True):
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            time.sleep(0.05)
+            with self._lock:
+                self.in_flight -= 1
+                self.calls.append((len(points), wait))
+
+    def test_batches_concurrency_and_final_barrier(self):
+        from app.qdrant_client import upsert_points
+
+        client = self.FakeClient()
+        progress = []
+
+        count = asyncio.run(upsert_points(
+            client, "col", list(range(25)), batch_size=4, concurrency=3, wait=False, on_progress=progress.append,
+        ))
+
+        assert count == 25
+        assert progress[-1] == 25
+        assert 1 < client.max_in_flight <= 3
+        assert sorted(n for n, _ in client.calls) == [1] + [4] * 6
+        assert client.calls[-1] == (1, True)  # remainder sent last, as the barrier
+        assert all(not wait for _, wait in client.calls[:-1])
+
+
+class TestBrowserPool:
+    """Test page caps, context reuse and recycling of the shared browser (fake Chromium)."""
+
+    class FakeBrowser:
+        def __init__(self, stats):
+            self.stats = stats
+            self.closed = False
+
+        async def new_context(self):
+            self.stats["contexts"] += 1
+            browser = self
+
+            class Context:
+                async def new_page(self):
+                    browser.stats["open"] += 1
+                    browser.stats["max_open"] = max(browser.stats["max_open"], browser.stats["open"])
+
+                    class Page:
+                        def __init__(self):
+                            self.handlers = []
+
+                        def on(self, event, handler):
+                            self.handlers.append(handler)
+
+                        async def goto(self, url, **kwargs):
+                            from types import SimpleNamespace
+
+                            for handler in self.handlers:
+                                handler(SimpleNamespace(parent_frame=None))
+
+                        async def close(self):
+                            browser.stats["open"] -= 1
+
+                    return Page()
+
+                async def close(self):
+                    pass
+
+            return Context()
+
+        async def close(self):
+            self.closed = True
+
+    @pytest.fixture
+    def browsers(self, monkeypatch):
+        from app.browser_pool import BrowserPool, _Browser
+
+        browsers = []
+
+        async def fake_launch(pool):
+            pool.launches += 1
+            browsers.append(self.FakeBrowser(self.stats))
+            return _Browser(browsers[-1])
+
+        self.stats = {"contexts": 0, "open": 0, "max_open": 0}
+        monkeypatch.setattr(BrowserPool, "_launch", fake_launch)
+        return browsers
+
+    def test_pages_share_browsers_and_recycle(self, browsers):
+        from app.browser_pool import BrowserPool
+
+        stats = self.stats
+
+        async def main():
+            pool = BrowserPool(max_pages=2, recycle_after=5)
+
+            async def visit():
+                async with pool.page() as page:
+                    await page.goto("https://example.com/")
+                    await asyncio.sleep(0.01)
+
+            await asyncio.gather(*(visit() for _ in range(8)))
+            await pool.close()
+            return pool
+
+        pool = asyncio.run(main())
+
+        assert pool.launches == 2  # 8 navigations, recycled after 5
+        assert stats["max_open"] == 2
+        assert stats["contexts"] == 4  # two reusable contexts per browser
+        assert all(b.closed for b in browsers)
+
+    def test_navigations_in_a_long_lived_tab_are_counted(self, browsers):
+        from app.browser_pool import BrowserPool
+
+        async def main():
+            pool = BrowserPool(max_pages=2, recycle_after=5)
+            async with pool.page() as page:
+                for i in range(6):
+                    await page.goto(f"https://example.com/{i}")
+            async with pool.page():
+                pass
+            await pool.close()
+            return pool
+
+        assert asyncio.run(main()).launches == 2
+        assert browsers[0].closed
+
+
+class TestRuntimeCrawl:
+    """Test the multi-tab Playwright crawler against fake pages."""
+
+    class FakePage:
+        def __init__(self, site, stats):
+            self.site = site
+            self.stats = stats
+            self.url = "about:blank"
+
+        async def route(self, pattern, handler):
+            self.stats["routed"] += 1
+
+        async def goto(self, url, **kwargs):
+            self.stats["open"] += 1
+            self.stats["max_open"] = max(self.stats["max_open"], self.stats["open"])
+            await asyncio.sleep(0.05)
+            self.stats["open"] -= 1
+            self.url = url
+
+        async def wait_for_load_state(self, *args, **kwargs):
+            pass
+
+        async def content(self):
+            return f"<html><body>{self.url}</body></html>"
+
+        async def eval_on_selector_all(self, selector, script):
+            return self.site.get(self.url, [])
+
+        async def query_selector_all(self, selector):
+            return []
+
+    def test_tabs_share_one_frontier(self, monkeypatch):
+        from contextlib import asynccontextmanager
+
+        site = {"https://spa.test/": [f"https://spa.test/p{i}" for i in range(7)] + ["https://other.test/x"]}
+        stats = {"open": 0, "max_open": 0, "routed": 0}
+
+        class FakePool:
+            @asynccontextmanager
+            async def page(pool):
+                yield self.FakePage(site, stats)
+
+        monkeypatch.setattr(ingest, "get_browser_pool", lambda: FakePool())
+        pages = []
+
+        async def on_page(url, html):
+            pages.append(url)
+
+        result = asyncio.run(ingest.runtime_crawl("https://spa.test/", max_pages=6, tabs=3, on_page=on_page))
+
+        assert result == []
+        assert len(pages) == 6 and "https://other.test/x" not in pages
+        assert stats["max_open"] == 3
+        assert stats["routed"] == 3
+
+    def test_blocks_heavy_and_third_party_requests(self):
+        from types import SimpleNamespace
+
+        async def decide(url, resource_type):
+            calls = []
+            route = SimpleNamespace(
+                request=SimpleNamespace(url=url, resource_type=resource_type),
+                abort=lambda: asyncio.sleep(0, calls.append("abort")),
+                continue_=lambda: asyncio.sleep(0, calls.append("continue")),
+            )
+            await ingest._block_resources(route, "spa.test")
+            return calls[0]
+
+        assert asyncio.run(decide("https://spa.test/app.js", "script")) == "continue"
+        assert asyncio.run(decide("https://spa.test/logo.png", "image")) == "abort"
+        assert asyncio.run(decide("https://cdn.example/vendor.js", "script")) == "continue"
+        assert asyncio.run(decide("https://api.example/items", "fetch")) == "continue"
+        assert asyncio.run(decide("https://widgets.example/beacon", "ping")) == "abort"
+        assert asyncio.run(decide("https://www.google-analytics.com/ga.js", "script")) == "abort"
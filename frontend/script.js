@@ -27,6 +27,8 @@ class RAGFrontend {
         this.apiBase = 'http://localhost:8000';
         this.currentJobId = null;
         this.statusCheckInterval = null;
+        this.jobEvents = null;
+        this.reloadingProcesses = null;
         this.init();
     }
 
@@ -38,8 +40,8 @@ class RAGFrontend {
         this.restoreJobFromStorage();
         this.addLogEntry('System initialized. Ready for content ingestion.');
 
-        // Auto-refresh active processes every 30 seconds
-        setInterval(() => this.loadActiveProcesses(), 30000);
+        // Job progress is pushed over server-sent events
+        this.watchActiveProcesses();
     }
 
     restoreJobFromStorage() {
@@ -164,10 +166,42 @@ class RAGFrontend {
     }
 
     startStatusChecking() {
+        this.stopStatusChecking();
+
+        // Progress is pushed by the server; polling is only the fallback for browsers without EventSource
+        if (typeof EventSource === 'undefined') {
+            this.startStatusPolling();
+            return;
+        }
+
+        const source = new EventSource(`${this.apiBase}/ingest/events?job_id=${encodeURIComponent(this.currentJobId)}`);
+        this.jobEvents = source;
+        source.addEventListener('progress', (e) => this.updateStatusDisplay(JSON.parse(e.data)));
+        source.addEventListener('done', (e) => {
+            this.stopStatusChecking();
+            this.handleJobFinished(JSON.parse(e.data));
+        });
+        source.addEventListener('error', (e) => {
+            // "error" events sent by the server carry data; dropped connections do not and are retried by EventSource
+            if (e.data) {
+                this.stopStatusChecking();
+                this.addLogEntry(`⚠️ Status check failed: ${JSON.parse(e.data).detail}`, 'warning');
+            }
+        });
+    }
+
+    stopStatusChecking() {
+        if (this.jobEvents) {
+            this.jobEvents.close();
+            this.jobEvents = null;
+        }
         if (this.statusCheckInterval) {
             clearInterval(this.statusCheckInterval);
+            this.statusCheckInterval = null;
         }
+    }
 
+    startStatusPolling() {
         this.statusCheckInterval = setInterval(async () => {
             try {
                 const response = await fetch(`${this.apiBase}/ingest/status/${this.currentJobId}`);
@@ -177,24 +211,8 @@ class RAGFrontend {
                 this.updateStatusDisplay(data);
 
                 if (data.status === 'completed' || data.status === 'failed') {
-                    clearInterval(this.statusCheckInterval);
-                    this.statusCheckInterval = null;
-
-                    // clear stored job id when job finishes
-                    try {
-                        localStorage.removeItem('rag_current_job_id');
-                    } catch (e) {
-                        console.error('Failed to clear job id from storage:', e);
-                    }
-
-                    if (data.status === 'completed') {
-                        const pages = data.result.pages_indexed ?? data.result.pages_crawled ?? 0;
-                        const chunks = data.result.chunks_indexed ?? 0;
-                        this.addLogEntry(`🎉 Ingestion completed! ${pages} pages, ${chunks} chunks indexed.`, 'success');
-                        this.loadCollections(); // Refresh collections list
-                    } else {
-                        this.addLogEntry(`❌ Ingestion failed: ${data.error}`, 'error');
-                    }
+                    this.stopStatusChecking();
+                    this.handleJobFinished(data);
                 }
             } catch (error) {
                 console.error('Status check error:', error);
@@ -203,6 +221,26 @@ class RAGFrontend {
         }, 60000); // Check every 60 seconds
     }
 
+    handleJobFinished(data) {
+        this.updateStatusDisplay(data);
+
+        // clear stored job id when job finishes
+        try {
+            localStorage.removeItem('rag_current_job_id');
+        } catch (e) {
+            console.error('Failed to clear job id from storage:', e);
+        }
+
+        if (data.status === 'completed') {
+            const pages = data.result.pages_indexed ?? data.result.pages_crawled ?? 0;
+            const chunks = data.result.chunks_indexed ?? 0;
+            this.addLogEntry(`🎉 Ingestion completed! ${pages} pages, ${chunks} chunks indexed.`, 'success');
+            this.loadCollections(); // Refresh collections list
+        } else {
+            this.addLogEntry(`❌ Ingestion failed: ${data.error}`, 'error');
+        }
+    }
+
     updateStatusDisplay(data) {
         const statusText = document.getElementById('status-text');
         const jobIdText = document.getElementById('job-id');
@@ -370,11 +408,41 @@ class RAGFrontend {
         this.loadCollectionStats(collectionName, card);
     }
 
+    watchActiveProcesses() {
+        if (typeof EventSource === 'undefined') {
+            // Auto-refresh active processes every 30 seconds
+            setInterval(() => this.loadActiveProcesses(), 30000);
+            return;
+        }
+
+        // One stream for all jobs: cards are updated in place as progress arrives
+        const source = new EventSource(`${this.apiBase}/ingest/events`);
+        const onEvent = (e) => this.updateActiveProcess(JSON.parse(e.data));
+        source.addEventListener('progress', onEvent);
+        source.addEventListener('done', onEvent);
+    }
+
+    updateActiveProcess(process) {
+        const card = document.querySelector(`.process-card[data-job-id="${process.job_id}"]`);
+        if (card) {
+            card.replaceWith(this.createActiveProcessCard(process));
+        } else if (!this.reloadingProcesses) {
+            // A job that is not listed yet (e.g. started from another tab): reload the list once
+            this.reloadingProcesses = this.loadActiveProcesses().finally(() => {
+                this.reloadingProcesses = null;
+            });
+        }
+    }
+
     addActiveProcessCard(process) {
         const activeProcessesList = document.getElementById('active-processes-list');
+        activeProcessesList.appendChild(this.createActiveProcessCard(process));
+    }
 
+    createActiveProcessCard(process) {
         const card = document.createElement('div');
         card.className = 'process-card';
+        card.dataset.jobId = process.job_id || '';
         card.innerHTML = `
             <div class="process-header">
                 <div class="process-collection">${process.collection}</div>
@@ -391,7 +459,7 @@ class RAGFrontend {
             </div>
         `;
 
-        activeProcessesList.appendChild(card);
+        return card;
     }
 
     async loadCollectionStats(collectionName, cardElement) {
@@ -442,7 +510,8 @@ window.AIWidgetConfig = {
   welcomeMessage: '${message}',
   color: '${color}',
   sendButtonText: '${sendText}',
-  inputPlaceholder: '${placeholder}'
+  inputPlaceholder: '${placeholder}',
+  stream: true
 };
 </script>
 <script src="http://localhost:8000/widget/widget.js"></script>`;
@@ -459,7 +528,8 @@ window.AIWidgetConfig = {
                 welcomeMessage: message,
                 color,
                 sendText,
-                placeholder
+                placeholder,
+                stream: true // answers render incrementally from /chat/stream
             });
         }
     }
@@ -9,7 +9,9 @@
         color: window.AIWidgetConfig?.color || '#667eea',
         title: window.AIWidgetConfig?.title || 'AI Assistant',
         placeholder: window.AIWidgetConfig?.placeholder || 'Ask me anything...',
-        sendText: window.AIWidgetConfig?.sendText || 'Send'
+        sendText: window.AIWidgetConfig?.sendText || 'Send',
+        // Render answers token by token from /chat/stream (falls back to /chat)
+        stream: window.AIWidgetConfig?.stream ?? true
     };
 
     let button, chat, input, sendButton, closeButton, titleEl, messagesDiv;
@@ -29,6 +31,95 @@
         msgDiv.innerText = text;
         messagesDiv.appendChild(msgDiv);
         messagesDiv.scrollTop = messagesDiv.scrollHeight;
+        return msgDiv;
+    }
+
+    function appendSources(msgDiv, sources) {
+        if (!sources || !sources.length) return;
+        const list = document.createElement('div');
+        list.style.cssText = 'margin-top: 6px; font-size: 12px; opacity: 0.8;';
+        sources.forEach((url) => {
+            const link = document.createElement('a');
+            link.href = url;
+            link.target = '_blank';
+            link.rel = 'noopener';
+            link.innerText = url;
+            link.style.cssText = 'display: block; color: inherit; word-break: break-all;';
+            list.appendChild(link);
+        });
+        msgDiv.appendChild(list);
+        messagesDiv.scrollTop = messagesDiv.scrollHeight;
+    }
+
+    async function fetchAnswer(q) {
+        const response = await fetch(config.apiBase + '/chat', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({question: q, collection: config.collection})
+        });
+        const data = await response.json();
+        appendMessage(data.answer || 'Error', 'bot');
+    }
+
+    // Parse one server-sent event block ("event: x\ndata: {...}")
+    function parseEvent(block) {
+        let event = 'message';
+        let data = '';
+        block.split('\n').forEach((line) => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+        });
+        try {
+            return {event, data: data ? JSON.parse(data) : {}};
+        } catch (e) {
+            return {event, data: {}};
+        }
+    }
+
+    async function streamAnswer(q) {
+        const response = await fetch(config.apiBase + '/chat/stream', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'Accept': 'text/event-stream'},
+            body: JSON.stringify({question: q, collection: config.collection})
+        });
+        if (!response.ok || !response.body) {
+            return fetchAnswer(q);
+        }
+
+        const msgDiv = appendMessage('…', 'bot');
+        const entry = messages[messages.length - 1];
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+
+        const render = (value) => {
+            text = value;
+            entry.text = text;
+            msgDiv.innerText = text;
+            messagesDiv.scrollTop = messagesDiv.scrollHeight;
+        };
+
+        while (true) {
+            const {value, done} = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, {stream: true});
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) !== -1) {
+                const {event, data} = parseEvent(buffer.slice(0, sep));
+                buffer = buffer.slice(sep + 2);
+                if (event === 'token') {
+                    render(text + (data.delta || ''));
+                } else if (event === 'sources') {
+                    appendSources(msgDiv, data.sources);
+                } else if (event === 'done' && data.answer) {
+                    render(data.answer);
+                } else if (event === 'error') {
+                    render(text || 'Error');
+                }
+            }
+        }
+        if (!text) render('Error');
     }
 
     async function sendMessage() {
@@ -41,13 +132,11 @@
         sendButton.innerText = 'Sending...';
 
         try {
-            const response = await fetch(config.apiBase + '/chat', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({question: q, collection: config.collection})
-            });
-            const data = await response.json();
-            appendMessage(data.answer || 'Error', 'bot');
+            if (config.stream && window.ReadableStream && window.TextDecoder) {
+                await streamAnswer(q);
+            } else {
+                await fetchAnswer(q);
+            }
         } catch (error) {
             appendMessage('Network error', 'bot');
         } finally {